@@ -0,0 +1,93 @@
+"""Benchmark the database value codecs.
+
+Reports encode and decode time and the stored size for each available codec,
+on a few payload shapes.
+
+Usage: python benchmarks/bench_codecs.py [--number N]
+"""
+
+import argparse
+import random
+import timeit
+from typing import Any, Dict, List
+import urllib.parse
+
+from replit.database.codecs import (
+    Codec,
+    decode_value,
+    encode_value,
+    FastJSONCodec,
+    JSONCodec,
+    msgpack,
+    MsgpackCodec,
+    orjson,
+)
+
+
+def make_payloads() -> Dict[str, Any]:
+    """Build the payloads to encode."""
+    rng = random.Random(0)  # noqa: S311
+    return {
+        "small dict": {"name": "user1", "score": 42, "active": True},
+        "records": [
+            {
+                "id": i,
+                "name": f"user{i}",
+                "tags": ["a", "b", "c"],
+                "score": rng.random(),
+                "meta": {"created": 1700000000 + i, "ok": i % 2 == 0},
+            }
+            for i in range(2_000)
+        ],
+        "numbers": [rng.randint(0, 1 << 30) for _ in range(20_000)],
+        "text": ["lorem ipsum dolor sit amet " * 4 for _ in range(1_000)],
+    }
+
+
+def available_codecs() -> Dict[str, Codec]:
+    """Return the codecs whose dependencies are installed."""
+    codecs: Dict[str, Codec] = {"json": JSONCodec()}
+    if orjson is not None:
+        codecs["fast json (orjson)"] = FastJSONCodec()
+    if msgpack is not None:
+        codecs["msgpack"] = MsgpackCodec()
+    return codecs
+
+
+def main() -> None:
+    """Run the benchmark and print a table per payload."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+
+    codecs = available_codecs()
+    for payload_name, payload in make_payloads().items():
+        print(f"\n{payload_name}")
+        rows: List[str] = []
+        for codec_name, codec in codecs.items():
+            encoded = encode_value(payload, codec)
+            encode_time = min(
+                timeit.repeat(
+                    lambda: encode_value(payload, codec),  # noqa: B023
+                    number=args.number,
+                    repeat=3,
+                )
+            )
+            decode_time = min(
+                timeit.repeat(
+                    lambda: decode_value(encoded, codec),  # noqa: B023
+                    number=args.number,
+                    repeat=3,
+                )
+            )
+            wire = len(urllib.parse.quote_plus(encoded))
+            rows.append(
+                f"  {codec_name:>20}: encode {encode_time / args.number * 1e6:9.1f} us"
+                f"  decode {decode_time / args.number * 1e6:9.1f} us"
+                f"  stored {len(encoded):>9} B  form-encoded {wire:>9} B"
+            )
+        print("\n".join(rows))
+
+
+if __name__ == "__main__":
+    main()
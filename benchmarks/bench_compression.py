@@ -0,0 +1,91 @@
+"""Benchmark value compression.
+
+Reports the bytes saved against the CPU time spent compressing and
+decompressing, for each algorithm and a few levels, on a few payload shapes.
+
+Usage: python benchmarks/bench_compression.py [--number N]
+"""
+
+import argparse
+import random
+import timeit
+from typing import Any, Dict, List, Optional
+import urllib.parse
+
+from replit.database.codecs import encode_value, JSONCodec
+from replit.database.compression import Compression, decompress
+
+
+def make_payloads() -> Dict[str, Any]:
+    """Build the payloads to compress."""
+    rng = random.Random(0)  # noqa: S311
+    return {
+        "records": [
+            {
+                "id": i,
+                "name": f"user{i}",
+                "tags": ["a", "b", "c"],
+                "score": rng.random(),
+                "meta": {"created": 1700000000 + i, "ok": i % 2 == 0},
+            }
+            for i in range(2_000)
+        ],
+        "numbers": [rng.randint(0, 1 << 30) for _ in range(20_000)],
+        "text": ["lorem ipsum dolor sit amet " * 4 for _ in range(1_000)],
+    }
+
+
+def settings() -> Dict[str, Optional[Compression]]:
+    """Return the compression settings to compare."""
+    return {
+        "none": None,
+        "zlib level 1": Compression("zlib", threshold=0, level=1),
+        "zlib default": Compression("zlib", threshold=0),
+        "zlib level 9": Compression("zlib", threshold=0, level=9),
+        "lzma preset 0": Compression("lzma", threshold=0, level=0),
+        "lzma default": Compression("lzma", threshold=0),
+    }
+
+
+def main() -> None:
+    """Run the benchmark and print a table per payload."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=5)
+    args = parser.parse_args()
+
+    for payload_name, payload in make_payloads().items():
+        encoded = encode_value(payload, JSONCodec())
+        base = len(urllib.parse.quote_plus(encoded))
+        print(f"\n{payload_name} ({len(encoded)} B encoded, {base} B form-encoded)")
+        rows: List[str] = []
+        for name, compression in settings().items():
+            if compression is None:
+                stored = encoded
+                compress_time = decompress_time = 0.0
+            else:
+                stored = compression.compress(encoded)
+                compress_time = min(
+                    timeit.repeat(
+                        lambda: compression.compress(encoded),  # noqa: B023
+                        number=args.number,
+                        repeat=3,
+                    )
+                )
+                decompress_time = min(
+                    timeit.repeat(
+                        lambda: decompress(stored),  # noqa: B023
+                        number=args.number,
+                        repeat=3,
+                    )
+                )
+            wire = len(urllib.parse.quote_plus(stored))
+            rows.append(
+                f"  {name:>14}: compress {compress_time / args.number * 1e3:8.2f} ms"
+                f"  decompress {decompress_time / args.number * 1e3:7.2f} ms"
+                f"  form-encoded {wire:>9} B  saved {1 - wire / base:6.1%}"
+            )
+        print("\n".join(rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""Benchmark the database clients' hot paths.
+
+Runs get, set, set_bulk, prefix listing, delete, to_dict, observed-value
+mutation and dumps against a database, for both the sync and the async client.
+Each benchmark reports p50/p95/p99 latency, operations per second and the peak
+memory traced during one pass.
+
+By default the benchmarks run against a local database server in a child
+process, so results don't depend on the network and the server's work isn't
+measured. Results can be written as JSON and compared
+with an earlier run to catch regressions:
+
+    python benchmarks/bench_database.py --json before.json
+    python benchmarks/bench_database.py --compare before.json
+
+Usage: python benchmarks/bench_database.py [--url URL] [--ops N] [--keys N]
+    [--value-size N] [--latency S] [--json PATH] [--compare PATH]
+    [--threshold FRACTION]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import platform
+import subprocess  # noqa: S404
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from replit.database import (
+    AsyncDatabase,
+    Database,
+    dumps,
+    Faults,
+    LocalDatabaseServer,
+)
+
+Result = Dict[str, float]
+
+# Metrics where a larger value is better, for comparisons.
+HIGHER_IS_BETTER = {"ops_per_sec"}
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """Return the p-th percentile of samples, by the nearest-rank method.
+
+    Args:
+        samples (List[float]): The samples, in any order.
+        p (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The percentile.
+    """
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies: List[float], elapsed: float, peak: int) -> Result:
+    """Turn per-operation latencies into a result.
+
+    Args:
+        latencies (List[float]): The latency of each operation, in seconds.
+        elapsed (float): The wall-clock time of all operations, in seconds.
+        peak (int): The peak traced memory of one pass, in bytes.
+
+    Returns:
+        Result: Latencies in milliseconds, throughput and memory.
+    """
+    return {
+        "ops": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1e3,
+        "p95_ms": percentile(latencies, 95) * 1e3,
+        "p99_ms": percentile(latencies, 99) * 1e3,
+        "mean_ms": sum(latencies) / len(latencies) * 1e3,
+        "ops_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "peak_kb": peak / 1024,
+    }
+
+
+def run_sync(op: Callable[[int], Any], ops: int) -> Result:
+    """Time ops calls of op, then trace the memory of 20 more calls.
+
+    Args:
+        op (Callable[[int], Any]): The operation, called with the iteration.
+        ops (int): The number of operations to time.
+
+    Returns:
+        Result: The summarized measurements.
+    """
+    latencies = []
+    start = time.perf_counter()
+    for i in range(ops):
+        t = time.perf_counter()
+        op(i)
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for i in range(ops, ops + 20):
+        op(i)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return summarize(latencies, elapsed, peak)
+
+
+async def run_async(op: Callable[[int], Awaitable[Any]], ops: int) -> Result:
+    """Time ops awaited calls of op, then trace the memory of 20 more calls.
+
+    Args:
+        op (Callable[[int], Awaitable[Any]]): The operation, called with the
+            iteration.
+        ops (int): The number of operations to time.
+
+    Returns:
+        Result: The summarized measurements.
+    """
+    latencies = []
+    start = time.perf_counter()
+    for i in range(ops):
+        t = time.perf_counter()
+        await op(i)
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for i in range(ops, ops + 20):
+        await op(i)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return summarize(latencies, elapsed, peak)
+
+
+def serve(latency: float, urls: Any) -> None:
+    """Serve a local database until the process is terminated.
+
+    Args:
+        latency (float): The latency of every request, in seconds.
+        urls (Any): A multiprocessing queue that receives the URL of the database.
+    """
+    server = LocalDatabaseServer(faults=Faults(latency=latency))
+    urls.put(server.start())
+    threading.Event().wait()
+
+
+def make_value(size: int) -> Dict[str, Any]:
+    """Build a JSON document of roughly size bytes."""
+    return {"items": [{"id": i, "name": f"item{i}"} for i in range(size // 25 + 1)]}
+
+
+def sync_benchmarks(
+    url: str, ops: int, value: Dict[str, Any], keys: int
+) -> Dict[str, Result]:
+    """Run the benchmarks of the sync client.
+
+    Args:
+        url (str): The database URL.
+        ops (int): The number of operations per benchmark.
+        value (Dict[str, Any]): The value to store.
+        keys (int): The number of keys listed and read by bulk operations.
+
+    Returns:
+        Dict[str, Result]: The results, by benchmark name.
+    """
+    db = Database(url)
+    results: Dict[str, Result] = {}
+    try:
+        for key in db.prefix("bench/"):
+            del db[key]
+        db.set_bulk({f"bench/{i}": value for i in range(keys)})
+
+        results["sync.set"] = run_sync(lambda i: db.set(f"bench/set/{i}", value), ops)
+        results["sync.get"] = run_sync(lambda i: db[f"bench/{i % keys}"], ops)
+        results["sync.set_bulk"] = run_sync(
+            lambda i: db.set_bulk({f"bench/bulk/{j}": value for j in range(10)}),
+            ops,
+        )
+        results["sync.prefix"] = run_sync(lambda i: db.prefix("bench/"), ops)
+        results["sync.get_many"] = run_sync(
+            lambda i: db.get_many(f"bench/{j}" for j in range(keys)),
+            max(1, ops // 10),
+        )
+
+        db.set("bench/doc", value)
+
+        def mutate(i: int) -> None:
+            db["bench/doc"]["items"][0]["id"] = i
+
+        results["sync.observed_mutation"] = run_sync(mutate, ops)
+
+        db.set_bulk({f"bench/delete/{i}": value for i in range(ops + 20)})
+        results["sync.delete"] = run_sync(
+            lambda i: db.__delitem__(f"bench/delete/{i}"), ops
+        )
+        db.delete_prefix("bench/")
+    finally:
+        db.close()
+    return results
+
+
+async def async_benchmarks(
+    url: str, ops: int, value: Dict[str, Any], keys: int
+) -> Dict[str, Result]:
+    """Run the benchmarks of the async client.
+
+    Args:
+        url (str): The database URL.
+        ops (int): The number of operations per benchmark.
+        value (Dict[str, Any]): The value to store.
+        keys (int): The number of keys listed and read by bulk operations.
+
+    Returns:
+        Dict[str, Result]: The results, by benchmark name.
+    """
+    results: Dict[str, Result] = {}
+    async with AsyncDatabase(url) as db:
+        await db.delete_prefix("abench/")
+        await db.set_bulk({f"abench/{i}": value for i in range(keys)})
+
+        results["async.set"] = await run_async(
+            lambda i: db.set(f"abench/set/{i}", value), ops
+        )
+        results["async.get"] = await run_async(
+            lambda i: db.get(f"abench/{i % keys}"), ops
+        )
+        results["async.set_bulk"] = await run_async(
+            lambda i: db.set_bulk({f"abench/bulk/{j}": value for j in range(10)}),
+            ops,
+        )
+        results["async.list"] = await run_async(lambda i: db.list("abench/"), ops)
+        results["async.to_dict"] = await run_async(
+            lambda i: db.to_dict("abench/"), max(1, ops // 10)
+        )
+
+        await db.set_bulk({f"abench/delete/{i}": value for i in range(ops + 20)})
+        results["async.delete"] = await run_async(
+            lambda i: db.delete(f"abench/delete/{i}"), ops
+        )
+        await db.delete_prefix("abench/")
+    return results
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float
+) -> List[str]:
+    """Print how the current results differ from a baseline.
+
+    Args:
+        baseline (Dict[str, Any]): The results of an earlier run.
+        current (Dict[str, Any]): The results of this run.
+        threshold (float): The relative change counted as a regression.
+
+    Returns:
+        List[str]: The regressions found, as "benchmark metric" strings.
+    """
+    regressions = []
+    print(f"\ncompared with {baseline['meta'].get('commit') or 'baseline'}")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        changes = []
+        for metric in ("p50_ms", "p99_ms", "ops_per_sec"):
+            if not before[metric]:
+                continue
+            change = result[metric] / before[metric] - 1
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = ""
+            if worse > threshold:
+                flag = " !"
+                regressions.append(f"{name} {metric}")
+            changes.append(f"{metric} {change:+7.1%}{flag}")
+        print(f"  {name:>24}: " + "  ".join(changes))
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    """Return the current git commit, if run from a checkout."""
+    try:
+        out = subprocess.run(  # noqa: S603, S607
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def main() -> None:
+    """Run the benchmarks, print a table and optionally save or compare them."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Database URL, a local server by default.")
+    parser.add_argument("--ops", type=int, default=200)
+    parser.add_argument("--keys", type=int, default=100)
+    parser.add_argument("--value-size", type=int, default=1024)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Latency of the local server."
+    )
+    parser.add_argument("--json", help="Write the results to this file.")
+    parser.add_argument("--compare", help="Compare with results from this file.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Relative change reported as a regression.",
+    )
+    args = parser.parse_args()
+
+    value = make_value(args.value_size)
+    server: Optional[multiprocessing.Process] = None
+    url = args.url
+    if url is None:
+        urls: Any = multiprocessing.Queue()
+        server = multiprocessing.Process(
+            target=serve, args=(args.latency, urls), daemon=True
+        )
+        server.start()
+        url = urls.get(timeout=30)
+
+    results: Dict[str, Result] = {}
+    try:
+        results["dumps"] = run_sync(lambda i: dumps(value), args.ops)
+        results.update(sync_benchmarks(url, args.ops, value, args.keys))
+        results.update(asyncio.run(async_benchmarks(url, args.ops, value, args.keys)))
+    finally:
+        if server is not None:
+            server.terminate()
+
+    for name, r in results.items():
+        print(
+            f"{name:>24}: p50 {r['p50_ms']:8.3f} ms  p95 {r['p95_ms']:8.3f} ms"
+            f"  p99 {r['p99_ms']:8.3f} ms  {r['ops_per_sec']:9.1f} ops/s"
+            f"  peak {r['peak_kb']:9.1f} KiB"
+        )
+
+    current = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "url": args.url or "local",
+            "ops": args.ops,
+            "keys": args.keys,
+            "value_size": args.value_size,
+            "latency": args.latency,
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print("\nregressions: " + ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark wrapping large decoded documents in observed values.
+
+Compares the old eager wrapping, which walked the whole document on every read,
+with the current lazy wrapping that only wraps the containers that are accessed.
+Allocations are measured with tracemalloc.
+
+Usage: python benchmarks/bench_observed.py [--records N] [--repeat N]
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Tuple
+
+from replit.database.database import (
+    _get_on_mutate_cb,
+    item_to_observed,
+    ObservedDict,
+    ObservedList,
+)
+
+
+def eager_item_to_observed(on_mutate: Callable[[Any], None], item: Any) -> Any:
+    """The previous implementation of item_to_observed, which wraps everything."""
+    if isinstance(item, dict):
+        observed_dict = ObservedDict((lambda _: None), item)
+        cb = _get_on_mutate_cb(observed_dict)
+        for k, v in item.items():
+            observed_dict[k] = eager_item_to_observed(cb, v)
+        observed_dict._on_mutate_handler = on_mutate
+        return observed_dict
+    elif isinstance(item, list):
+        observed_list = ObservedList((lambda _: None), item)
+        cb = _get_on_mutate_cb(observed_list)
+        for i, v in enumerate(item):
+            observed_list[i] = eager_item_to_observed(cb, v)
+        observed_list._on_mutate_handler = on_mutate
+        return observed_list
+    return item
+
+
+def make_document(records: int) -> str:
+    """Build a JSON document with many nested containers."""
+    doc = {
+        "config": {"version": 3, "flags": ["a", "b"]},
+        "records": [
+            {
+                "id": i,
+                "tags": [f"tag{j}" for j in range(5)],
+                "meta": {"created": i * 10, "owner": {"name": f"user{i}"}},
+            }
+            for i in range(records)
+        ],
+    }
+    return json.dumps(doc)
+
+
+def measure(
+    wrap: Callable[[Callable[[Any], None], Any], Any], raw: str
+) -> Tuple[float, int, int]:
+    """Decode, wrap and read one field of raw.
+
+    Args:
+        wrap (Callable): The wrapping function to measure.
+        raw (str): The JSON document.
+
+    Returns:
+        Tuple[float, int, int]: Seconds taken, allocated blocks still alive after
+            wrapping, and peak traced memory in bytes.
+    """
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    start = time.perf_counter()
+    val = wrap(lambda _: None, json.loads(raw))
+    val["config"]["version"]
+    elapsed = time.perf_counter() - start
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return elapsed, blocks, peak
+
+
+def main() -> None:
+    """Run the benchmark and print a comparison."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    raw = make_document(args.records)
+    print(f"document: {len(raw) / 1e6:.1f} MB, {args.records} records")
+    results: Dict[str, Tuple[float, int, int]] = {}
+    for name, wrap in (
+        ("json.loads only", lambda _, v: v),
+        ("eager (before)", eager_item_to_observed),
+        ("lazy (after)", item_to_observed),
+    ):
+        runs = [measure(wrap, raw) for _ in range(args.repeat)]
+        results[name] = min(runs)
+        elapsed, blocks, peak = results[name]
+        print(
+            f"{name:>16}: {elapsed * 1000:8.1f} ms  {blocks:>9} blocks  "
+            f"{peak / 1e6:7.1f} MB peak"
+        )
+
+
+if __name__ == "__main__":
+    main()
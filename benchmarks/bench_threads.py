@@ -0,0 +1,103 @@
+"""Benchmark the throughput of one sync Database shared by many threads.
+
+Every thread reads keys through the same Database, as the workers of a threaded
+web app do. Throughput is reported per thread count, both for the default pool
+of 10 connections and for a pool sized to the thread count that makes threads
+wait for a connection. With server latency dominating, throughput should grow
+with the thread count until the pool is exhausted.
+
+Usage: python benchmarks/bench_threads.py [--url URL] [--ops N]
+    [--threads N [N ...]] [--latency S]
+"""
+
+import argparse
+import multiprocessing
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from bench_database import serve
+from replit.database import Database
+
+
+def run_threads(db: Database, threads: int, ops: int, keys: int) -> float:
+    """Read ops keys spread over threads threads, all sharing db.
+
+    Args:
+        db (Database): The shared database.
+        threads (int): The number of threads.
+        ops (int): The total number of reads.
+        keys (int): The number of keys read from.
+
+    Returns:
+        float: Reads per second.
+    """
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(n: int) -> None:
+        barrier.wait()
+        for i in range(n, ops, threads):
+            db[f"threads/{i % keys}"]
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for w in workers:
+        w.join()
+    return ops / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """Run the benchmark and print a table of reads per second."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Database URL, a local server by default.")
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--keys", type=int, default=100)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument(
+        "--latency", type=float, default=0.005, help="Latency of the local server."
+    )
+    args = parser.parse_args()
+
+    server: Optional[multiprocessing.Process] = None
+    url = args.url
+    if url is None:
+        urls: Any = multiprocessing.Queue()
+        server = multiprocessing.Process(
+            target=serve, args=(args.latency, urls), daemon=True
+        )
+        server.start()
+        url = urls.get(timeout=30)
+
+    results: Dict[str, List[float]] = {"default pool": [], "sized pool": []}
+    try:
+        db = Database(url)
+        db.set_bulk({f"threads/{i}": i for i in range(args.keys)})
+        for threads in args.threads:
+            results["default pool"].append(
+                run_threads(db, threads, args.ops, args.keys)
+            )
+        db.close()
+
+        for threads in args.threads:
+            db = Database(url, pool_size=threads, pool_block=True)
+            results["sized pool"].append(run_threads(db, threads, args.ops, args.keys))
+            db.close()
+
+        db = Database(url)
+        db.delete_prefix("threads/")
+        db.close()
+    finally:
+        if server is not None:
+            server.terminate()
+
+    print(f"{'threads':>14}: " + "".join(f"{t:>10}" for t in args.threads))
+    for name, rates in results.items():
+        print(f"{name:>14}: " + "".join(f"{r:>10.1f}" for r in rates))
+    print("(reads per second)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,13 @@
 """CLI for interacting with your Repl's DB. Written as top-level script."""
 
 import json
+from typing import Optional
 
 import click
 from replit import db as database
-
+from replit.database import Faults, start_local_database
+from replit.database.chunks import CHUNK_PREFIX
+from replit.database.profiler import format_report
 
 reset = "\u001b[0m"
 
@@ -65,12 +68,9 @@ def set_value(key: str, val: str) -> None:
 @click.argument("key")
 def del_value(key: str) -> None:
     """Delete the key-value pair located at the given key."""
-    try:
-        del database[key]
-    except KeyError:
+    if database.delete_many([key]).missing:
         click.echo(failure(f"The key {key!r} was not found in the DB."))
     else:
-        del database[key]
         click.echo(success(f"db[{key!r}] was successfully deleted."))
 
 
@@ -80,12 +80,16 @@ def nuke_db(i_am_sure: bool) -> None:
     """Wipe ALL key-value pairs in the DB."""
     if i_am_sure:
         click.echo(info("Beginning Nuke operation...\n"))
-        keys = list(database.keys())
+        # Chunk keys are hidden from listings of other prefixes. Delete them
+        # first, including chunks left behind by older clients.
+        keys = database.prefix(CHUNK_PREFIX) + database.prefix("")
 
-        for k in keys:
-            del database[k]
+        with click.progressbar(length=len(keys), label="Deleting keys") as bar:
+            summary = database.delete_many(keys, progress=lambda *_: bar.update(1))
 
-        click.echo(success("Nuke operation successful."))
+        click.echo(
+            success(f"Nuke operation successful. {summary.deleted} keys deleted.")
+        )
     else:
         click.echo(
             failure(
@@ -100,13 +104,54 @@ def nuke_db(i_am_sure: bool) -> None:
 def list_all(file_path: str) -> None:
     """Write all keys and values in the DB to a JSON file."""
     with open(file_path, "w") as f:
-        keys = list(database.keys())
-        binds = dict([(k, json.loads(database.get_raw(k))) for k in keys])
-
-        json.dump(binds, f)
+        # Write the items as they are streamed, rather than holding them all.
+        f.write("{")
+        for i, (key, value) in enumerate(database.iter_items()):
+            f.write(f"{', ' if i else ''}{json.dumps(key)}: {json.dumps(value)}")
+        f.write("}")
 
         click.echo(success(f"Output successfully dumped to {file_path!r}"))
 
 
+@cli.command(name="local-db")
+@click.option("--host", default="127.0.0.1", help="The interface to listen on.")
+@click.option("--port", default=8080, help="The port to listen on.")
+@click.option("--path", default=None, help="An SQLite file to keep the data in.")
+@click.option("--latency", default=0.0, help="Seconds to delay each request.")
+@click.option("--jitter", default=0.0, help="Random variation of the latency.")
+@click.option("--error-rate", default=0.0, help="Fraction of requests that 503.")
+@click.option("--throttle-rate", default=0.0, help="Fraction of requests that 429.")
+@click.option("--seed", default=None, type=int, help="Seed for injected faults.")
+def local_db(
+    host: str,
+    port: int,
+    path: Optional[str],
+    latency: float,
+    jitter: float,
+    error_rate: float,
+    throttle_rate: float,
+    seed: Optional[int],
+) -> None:
+    """Serve a local stand-in database, for offline testing and benchmarks."""
+    faults = Faults(
+        latency=latency,
+        jitter=jitter,
+        error_rate=error_rate,
+        throttle_rate=throttle_rate,
+        seed=seed,
+    )
+    click.echo(info(f"Serving a local database at http://{host}:{port}"))
+    start_local_database(path, faults=faults, host=host, port=port)
+
+
+@cli.command(name="profile-report")
+@click.argument("file_path")
+@click.option("--top", default=10, help="The number of keys per ranking.")
+def profile_report(file_path: str, top: int) -> None:
+    """Print a key profile saved with KeyProfiler.save."""
+    with open(file_path) as f:
+        click.echo(format_report(json.load(f), top))
+
+
 if __name__ == "__main__":
     cli(prog_name="repldb")
@@ -3,19 +3,71 @@
 from typing import Any
 
 from . import default_db
-from .database import AsyncDatabase, Database, DBJSONEncoder, dumps, to_primitive
+from .buffer import WriteBuffer
+from .cache import ReadCache
+from .chunks import Chunking
+from .codecs import Codec, FastJSONCodec, JSONCodec, MsgpackCodec, register_codec
+from .compression import Compression
+from .database import (
+    AsyncDatabase,
+    Database,
+    DBJSONEncoder,
+    DeleteSummary,
+    dumps,
+    KeyPage,
+    to_primitive,
+)
+from .deadline import DeadlineExceeded
+from .hedging import Hedging
+from .index import KeyIndex
+from .local_server import (
+    Faults,
+    LocalDatabaseServer,
+    MemoryStorage,
+    SQLiteStorage,
+    start_local_database,
+)
+from .metrics import Metrics
+from .namespace import Namespace
+from .pool import ConnectionPool
+from .profiler import KeyProfiler
+from .ratelimit import RateLimiter
 from .server import make_database_proxy_blueprint, start_database_proxy
 
 __all__ = [
     "AsyncDatabase",
+    "Chunking",
+    "Codec",
+    "Compression",
+    "ConnectionPool",
     "Database",
     "db",
     "DBJSONEncoder",
+    "DeadlineExceeded",
+    "DeleteSummary",
     "db_url",
     "dumps",
+    "FastJSONCodec",
+    "Faults",
+    "Hedging",
+    "JSONCodec",
+    "KeyIndex",
+    "KeyPage",
+    "KeyProfiler",
+    "LocalDatabaseServer",
     "make_database_proxy_blueprint",
+    "MemoryStorage",
+    "Metrics",
+    "MsgpackCodec",
+    "Namespace",
+    "RateLimiter",
+    "ReadCache",
+    "register_codec",
+    "SQLiteStorage",
     "start_database_proxy",
+    "start_local_database",
     "to_primitive",
+    "WriteBuffer",
 ]
 
 
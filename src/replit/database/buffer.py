@@ -0,0 +1,161 @@
+"""A buffer of pending writes for write-behind databases."""
+
+import threading
+from typing import Dict, Optional
+
+
+class WriteBuffer:
+    """Pending writes that are coalesced and sent to the database together.
+
+    Pass an instance to Database to enable write-behind mode. Writes are merged
+    into the buffer, so repeated writes to the same key only send the last value,
+    and the whole buffer is sent as a single bulk request once any threshold is
+    reached. Use `Database.flush` to send it explicitly; closing the database
+    flushes it too. Writes being flushed stay readable from the buffer until the
+    request that sends them returns.
+
+    Attributes:
+        max_keys (int): Flush once this many keys are pending.
+        max_bytes (int): Flush once the pending keys and values reach this size.
+        max_delay (float): Flush at most this many seconds after the first write.
+    """
+
+    __slots__ = (
+        "max_keys",
+        "max_bytes",
+        "max_delay",
+        "_pending",
+        "_in_flight",
+        "_size",
+        "_lock",
+    )
+
+    def __init__(
+        self, max_keys: int = 100, max_bytes: int = 1 << 20, max_delay: float = 0.5
+    ) -> None:
+        """Initialize the buffer.
+
+        Args:
+            max_keys (int): Flush once this many keys are pending.
+            max_bytes (int): Flush once the pending keys and values reach this many
+                characters.
+            max_delay (float): Flush at most this many seconds after the first
+                buffered write.
+        """
+        self.max_keys = max_keys
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self._pending: Dict[str, str] = {}
+        self._in_flight: Dict[str, str] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def add(self, values: Dict[str, str]) -> bool:
+        """Merge writes into the buffer, replacing pending writes of the same keys.
+
+        Args:
+            values (Dict[str, str]): The raw key-value pairs to write.
+
+        Returns:
+            bool: True if the buffer was empty before, meaning a delayed flush
+                should be scheduled.
+        """
+        with self._lock:
+            was_empty = not self._pending
+            for k, v in values.items():
+                old = self._pending.get(k)
+                if old is None:
+                    self._size += len(k) + len(v)
+                else:
+                    self._size += len(v) - len(old)
+                self._pending[k] = v
+            return was_empty
+
+    def full(self) -> bool:
+        """Whether the buffer has reached its key or size threshold."""
+        return len(self._pending) >= self.max_keys or self._size >= self.max_bytes
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the pending value of key, or None if it has no pending write.
+
+        Writes being flushed are still pending.
+
+        Args:
+            key (str): The key to look up.
+
+        Returns:
+            Optional[str]: The pending value.
+        """
+        value = self._pending.get(key)
+        if value is None:
+            value = self._in_flight.get(key)
+        return value
+
+    def discard(self, key: str) -> bool:
+        """Drop the pending write of key.
+
+        Args:
+            key (str): The key to drop.
+
+        Returns:
+            bool: Whether the key had a pending write.
+        """
+        with self._lock:
+            value = self._pending.pop(key, None)
+            if value is None:
+                return False
+            self._size -= len(key) + len(value)
+            return True
+
+    def drain(self) -> Dict[str, str]:
+        """Remove and return every pending write, to flush them.
+
+        The writes stay readable with `get` until `sent` or `restore` is called.
+
+        Returns:
+            Dict[str, str]: The writes to send.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._in_flight.update(pending)
+            self._size = 0
+            return pending
+
+    def sent(self, values: Dict[str, str]) -> None:
+        """Forget writes that were flushed.
+
+        Args:
+            values (Dict[str, str]): The writes returned by drain.
+        """
+        with self._lock:
+            for k in values:
+                self._in_flight.pop(k, None)
+
+    def restore(self, values: Dict[str, str]) -> None:
+        """Put back writes that failed to flush.
+
+        Keys that were written again since they were drained keep their newer
+        value.
+
+        Args:
+            values (Dict[str, str]): The writes returned by drain.
+        """
+        with self._lock:
+            for k, v in values.items():
+                self._in_flight.pop(k, None)
+                if k not in self._pending:
+                    self._pending[k] = v
+                    self._size += len(k) + len(v)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._pending or key in self._in_flight
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__}(pending={len(self)}, "
+            f"max_keys={self.max_keys}, max_bytes={self.max_bytes}, "
+            f"max_delay={self.max_delay})>"
+        )
@@ -0,0 +1,143 @@
+"""An in-process read-through cache for database values."""
+
+from collections import OrderedDict
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class ReadCache:
+    """A size-bounded LRU cache of raw database values with per-entry expiry.
+
+    Pass an instance to Database or AsyncDatabase to serve repeated reads of the
+    same key from memory. Keys that were not found can be cached too, so repeated
+    lookups of a missing key don't go to the network either. The cache is safe to
+    use from several threads, and can be shared between databases that point at
+    the same data.
+
+    Only writes made through a database using this cache invalidate entries.
+    Writes made by other processes are seen once the entry expires.
+
+    Attributes:
+        maxsize (int): The maximum number of entries kept.
+        ttl (float): How many seconds a value stays cached.
+        negative_ttl (float): How many seconds a missing key stays cached. 0
+            disables caching of missing keys.
+        hits (int): How many lookups were answered by the cache.
+        misses (int): How many lookups had to go to the database.
+    """
+
+    __slots__ = (
+        "maxsize",
+        "ttl",
+        "negative_ttl",
+        "hits",
+        "misses",
+        "_entries",
+        "_generation",
+        "_lock",
+    )
+
+    def __init__(
+        self, maxsize: int = 1024, ttl: float = 60, negative_ttl: Optional[float] = None
+    ) -> None:
+        """Initialize the cache.
+
+        Args:
+            maxsize (int): The maximum number of entries kept. The least recently
+                used entry is evicted when the cache is full.
+            ttl (float): How many seconds a value stays cached.
+            negative_ttl (Optional[float]): How many seconds a missing key stays
+                cached. Defaults to ttl, 0 disables caching of missing keys.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.hits = 0
+        self.misses = 0
+        # key -> (expiry, value), where a value of None means "not in the database"
+        self._entries: OrderedDict[str, Tuple[float, Optional[str]]] = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        """A counter that changes every time an entry is invalidated."""
+        return self._generation
+
+    def get(self, key: str) -> Tuple[bool, Optional[str]]:
+        """Look up a key in the cache.
+
+        Args:
+            key (str): The key to look up.
+
+        Returns:
+            Tuple[bool, Optional[str]]: Whether the key was cached, and its raw
+                value. The value is None if the key is cached as missing.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[1]
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(
+        self, key: str, value: Optional[str], generation: Optional[int] = None
+    ) -> None:
+        """Store the raw value of a key, or None if it is not in the database.
+
+        Args:
+            key (str): The key to store.
+            value (Optional[str]): The raw value, None if the key is missing.
+            generation (Optional[int]): The generation read before the value was
+                fetched. If anything was invalidated since, the value may be stale
+                and is not stored.
+        """
+        ttl = self.ttl if value is not None else self.negative_ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        """Drop a key from the cache.
+
+        Args:
+            key (str): The key to drop.
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry from the cache."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the cache's counters.
+
+        Returns:
+            Dict[str, int]: The hits, misses and current size of the cache.
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self)}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__}(maxsize={self.maxsize}, ttl={self.ttl}, "
+            f"hits={self.hits}, misses={self.misses})>"
+        )
@@ -0,0 +1,171 @@
+"""Storage of values that are too large for a single key.
+
+A chunked value is stored as numbered chunk keys under ``~chunk/<key>/<id>/``
+plus a manifest in the value's own key, ``~chunks:<id>:<count>:<size>``. Every
+write of a chunked value uses a new id, so readers never mix chunks of two
+versions. Databases reassemble chunked values whether or not they chunk values
+themselves. Chunk keys are left out of listings unless the listed prefix starts
+with ``~chunk/``.
+
+Before a key is overwritten or deleted, databases that chunk values list the
+chunk keys under ``~chunk/<key>/`` and delete them once the write is sent. Only
+the chunks listed before the write are deleted, so concurrent writers can't
+delete the chunks of the version that wins. Databases that don't chunk values
+skip this, so the chunks of values they replace stay until a database that
+chunks values writes or deletes the key, or ``replit nuke`` is run.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+import urllib.parse
+import uuid
+
+CHUNK_PREFIX = "~chunk/"
+MANIFEST_MARKER = "~chunks:"
+
+
+def chunk_prefix(key: str) -> str:
+    """Return the prefix shared by the chunk keys of every version of key.
+
+    Args:
+        key (str): The key of the chunked value.
+
+    Returns:
+        str: The prefix of its chunk keys.
+    """
+    return CHUNK_PREFIX + urllib.parse.quote(key, safe="") + "/"
+
+
+def is_chunk_key(key: str) -> bool:
+    """Return whether key holds a chunk of another key's value.
+
+    Args:
+        key (str): The key to check.
+
+    Returns:
+        bool: Whether key is a chunk key.
+    """
+    return key.startswith(CHUNK_PREFIX)
+
+
+@dataclass(frozen=True)
+class Manifest:
+    """Where the chunks of a chunked value are stored.
+
+    Attributes:
+        id (str): The id of this version of the value.
+        count (int): The number of chunks.
+        size (int): The length of the reassembled value.
+    """
+
+    id: str
+    count: int
+    size: int
+
+    def chunk_keys(self, key: str) -> List[str]:
+        """Return the chunk keys of this version of key, in order.
+
+        Args:
+            key (str): The key of the chunked value.
+
+        Returns:
+            List[str]: The chunk keys.
+        """
+        prefix = chunk_prefix(key) + self.id + "/"
+        return [prefix + str(i) for i in range(self.count)]
+
+    def encode(self) -> str:
+        """Return the manifest as stored in the value's key."""
+        return f"{MANIFEST_MARKER}{self.id}:{self.count}:{self.size}"
+
+    @classmethod
+    def parse(cls, raw: str) -> Optional["Manifest"]:
+        """Parse a stored value that may be a manifest.
+
+        Args:
+            raw (str): The stored value.
+
+        Returns:
+            Optional[Manifest]: The manifest, or None if raw is an ordinary value.
+        """
+        if not raw.startswith(MANIFEST_MARKER):
+            return None
+        parts = raw[len(MANIFEST_MARKER) :].split(":")
+        if len(parts) != 3 or not parts[1].isdigit() or not parts[2].isdigit():
+            return None
+        return cls(parts[0], int(parts[1]), int(parts[2]))
+
+    def join(self, key: str, chunks: Sequence[Optional[str]]) -> Optional[str]:
+        """Reassemble the value from its chunks.
+
+        Args:
+            key (str): The key of the chunked value.
+            chunks (Sequence[Optional[str]]): The values of the chunk keys, in
+                order, None for chunks that are not set.
+
+        Raises:
+            ValueError: The chunks don't add up to the value.
+
+        Returns:
+            Optional[str]: The value, or None if a chunk is not set.
+        """
+        parts = [chunk for chunk in chunks if chunk is not None]
+        if len(parts) != len(chunks):
+            return None
+        value = "".join(parts)
+        if len(value) != self.size:
+            raise ValueError(f"The chunks of {key!r} are incomplete")
+        return value
+
+
+class Chunking:
+    """Splits values larger than a chunk size across several keys.
+
+    Pass an instance to Database or AsyncDatabase to store oversized values in
+    chunks. All chunks and the manifest of a set are written in a single request,
+    chunks are fetched in parallel on read, and overwrites and deletes remove
+    the chunks of the version they replace.
+
+    Attributes:
+        chunk_size (int): The maximum length of a stored value, in characters.
+    """
+
+    __slots__ = ("chunk_size",)
+
+    def __init__(self, chunk_size: int = 1 << 20) -> None:
+        """Initialize the chunking settings.
+
+        Args:
+            chunk_size (int): The maximum length of a stored value, in characters.
+                Longer values are split into chunks of this length.
+
+        Raises:
+            ValueError: chunk_size is not positive.
+        """
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        self.chunk_size = chunk_size
+
+    def split(self, values: Dict[str, str]) -> Dict[str, str]:
+        """Replace the oversized values with manifests and chunks.
+
+        Args:
+            values (Dict[str, str]): The values being set.
+
+        Returns:
+            Dict[str, str]: The key-value pairs to store.
+        """
+        size = self.chunk_size
+        stored: Dict[str, str] = {}
+        for key, data in values.items():
+            if len(data) <= size or is_chunk_key(key):
+                stored[key] = data
+                continue
+            manifest = Manifest(uuid.uuid4().hex, -(-len(data) // size), len(data))
+            for i, chunk_key in enumerate(manifest.chunk_keys(key)):
+                stored[chunk_key] = data[i * size : (i + 1) * size]
+            stored[key] = manifest.encode()
+        return stored
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(chunk_size={self.chunk_size})"
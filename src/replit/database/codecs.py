@@ -0,0 +1,192 @@
+"""Codecs that turn database values into the strings stored in the database.
+
+By default values are stored as JSON. Other codecs can be configured per
+Database or AsyncDatabase. Codecs that don't produce JSON prefix their output with
+a marker (``~name:``), which JSON text can never start with, so a keyspace that
+mixes codecs still decodes: every value is decoded by the codec that wrote it.
+"""
+
+import abc
+import base64
+import json
+from typing import Any, Dict
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+try:
+    import msgpack  # type: ignore
+except ImportError:  # pragma: no cover
+    msgpack = None  # type: ignore
+
+MARKER_PREFIX = "~"
+
+
+def _to_primitive(o: Any) -> Any:
+    # Imported here because the database module imports this one.
+    from .database import to_primitive
+
+    return to_primitive(o)
+
+
+class Codec(abc.ABC):
+    """Encodes values to the strings stored in the database, and back.
+
+    Subclasses must implement encode and decode. Codecs that don't produce JSON
+    must set a marker and be registered with `register_codec` to be decodable by
+    databases that use a different codec.
+
+    Attributes:
+        marker (str): The name written in front of encoded values, empty if the
+            codec produces plain JSON.
+    """
+
+    marker = ""
+
+    @abc.abstractmethod
+    def encode(self, value: Any) -> str:
+        """Encode a value to a string, without the marker.
+
+        Args:
+            value (Any): The value to encode.
+        """
+
+    @abc.abstractmethod
+    def decode(self, data: str) -> Any:
+        """Decode a string produced by encode.
+
+        Args:
+            data (str): The encoded value, without the marker.
+        """
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}()"
+
+
+class JSONCodec(Codec):
+    """Stores values as compact JSON using the standard library."""
+
+    def encode(self, value: Any) -> str:
+        """Encode a value as JSON, handling ObservedList and ObservedDict."""
+        return json.dumps(value, separators=(",", ":"), default=_to_primitive)
+
+    def decode(self, data: str) -> Any:
+        """Decode a JSON string."""
+        return json.loads(data)
+
+
+class FastJSONCodec(JSONCodec):
+    """Stores values as JSON, using orjson when it is installed.
+
+    The output is plain JSON, readable by every other codec. Without orjson this
+    behaves exactly like JSONCodec.
+    """
+
+    def encode(self, value: Any) -> str:
+        """Encode a value as JSON, handling ObservedList and ObservedDict."""
+        if orjson is None:
+            return super().encode(value)
+        return orjson.dumps(
+            value, default=_to_primitive, option=orjson.OPT_NON_STR_KEYS
+        ).decode()
+
+    def decode(self, data: str) -> Any:
+        """Decode a JSON string."""
+        if orjson is None:
+            return super().decode(data)
+        return orjson.loads(data)
+
+
+class MsgpackCodec(Codec):
+    """Stores values as MessagePack, a compact binary format.
+
+    The binary output is URL-safe Base64 encoded so it can be stored as a string
+    and form-encoded without further escaping. This requires the msgpack package.
+    """
+
+    marker = "mp"
+
+    def __init__(self) -> None:
+        """Initialize the codec.
+
+        Raises:
+            ImportError: The msgpack package is not installed.
+        """
+        if msgpack is None:
+            raise ImportError("MsgpackCodec requires the msgpack package")
+
+    def encode(self, value: Any) -> str:
+        """Encode a value as Base64 encoded MessagePack."""
+        packed = msgpack.packb(value, default=_to_primitive)
+        return base64.urlsafe_b64encode(packed).decode("ascii")
+
+    def decode(self, data: str) -> Any:
+        """Decode Base64 encoded MessagePack."""
+        return msgpack.unpackb(base64.urlsafe_b64decode(data), strict_map_key=False)
+
+
+_codecs: Dict[str, Codec] = {}
+
+
+def register_codec(codec: Codec) -> None:
+    """Make values written by a codec decodable by every database.
+
+    Args:
+        codec (Codec): The codec to register.
+
+    Raises:
+        ValueError: The codec has no marker.
+    """
+    if not codec.marker:
+        raise ValueError("Only codecs with a marker can be registered")
+    _codecs[codec.marker] = codec
+
+
+def encode_value(value: Any, codec: Codec) -> str:
+    """Encode a value with a codec, adding the codec's marker.
+
+    Args:
+        value (Any): The value to encode.
+        codec (Codec): The codec to encode it with.
+
+    Returns:
+        str: The string to store in the database.
+    """
+    if not codec.marker:
+        return codec.encode(value)
+    return MARKER_PREFIX + codec.marker + ":" + codec.encode(value)
+
+
+def decode_value(data: str, codec: Codec) -> Any:
+    """Decode a stored string with the codec named by its marker.
+
+    Args:
+        data (str): The string stored in the database.
+        codec (Codec): The database's codec. Used for unmarked values if it is a
+            JSON codec.
+
+    Raises:
+        ValueError: The value names a codec that is not registered.
+
+    Returns:
+        Any: The decoded value.
+    """
+    if not data.startswith(MARKER_PREFIX):
+        if codec.marker:
+            codec = _json
+        return codec.decode(data)
+
+    marker, _, payload = data[len(MARKER_PREFIX) :].partition(":")
+    if marker == codec.marker:
+        return codec.decode(payload)
+    registered = _codecs.get(marker)
+    if registered is None:
+        raise ValueError(f"Value was encoded with unknown codec {marker!r}")
+    return registered.decode(payload)
+
+
+_json = FastJSONCodec()
+if msgpack is not None:
+    register_codec(MsgpackCodec())
@@ -0,0 +1,102 @@
+"""Transparent compression of large database values.
+
+Compressed values are stored as ``~zlib:`` or ``~lzma:`` followed by the
+URL-safe Base64 encoded compressed data. Databases decompress values with these
+markers whether or not they compress values themselves, and values without a
+marker are read as they are, so uncompressed values stay readable.
+"""
+
+import base64
+import lzma
+from typing import Any, Dict, Optional
+import zlib
+
+from .codecs import MARKER_PREFIX
+
+_compressors: Dict[str, Any] = {"zlib": zlib, "lzma": lzma}
+
+
+class Compression:
+    """Compresses encoded values that are larger than a threshold.
+
+    Pass an instance to Database or AsyncDatabase to compress the values written
+    by `set` and `set_bulk`. Raw values are never compressed.
+
+    Attributes:
+        algorithm (str): The compression algorithm, "zlib" or "lzma".
+        threshold (int): Values shorter than this many characters are stored
+            uncompressed.
+        level (Optional[int]): The compression level or preset, None for the
+            algorithm's default.
+    """
+
+    __slots__ = ("algorithm", "threshold", "level", "_marker")
+
+    def __init__(
+        self,
+        algorithm: str = "zlib",
+        threshold: int = 1024,
+        level: Optional[int] = None,
+    ) -> None:
+        """Initialize the compression settings.
+
+        Args:
+            algorithm (str): The compression algorithm, "zlib" or "lzma".
+            threshold (int): Values shorter than this many characters are stored
+                uncompressed.
+            level (Optional[int]): The compression level (zlib) or preset (lzma),
+                None for the algorithm's default.
+
+        Raises:
+            ValueError: The algorithm is not supported.
+        """
+        if algorithm not in _compressors:
+            raise ValueError(f"Unsupported compression algorithm {algorithm!r}")
+        self.algorithm = algorithm
+        self.threshold = threshold
+        self.level = level
+        self._marker = MARKER_PREFIX + algorithm + ":"
+
+    def compress(self, data: str) -> str:
+        """Compress an encoded value if it is large enough to be worth it.
+
+        Args:
+            data (str): The encoded value.
+
+        Returns:
+            str: The value with a compression marker, or data unchanged if it is
+                below the threshold or doesn't get smaller.
+        """
+        if len(data) < self.threshold:
+            return data
+        raw = data.encode("utf-8")
+        if self.algorithm == "zlib":
+            compressed = zlib.compress(raw, -1 if self.level is None else self.level)
+        else:
+            compressed = lzma.compress(raw, preset=self.level)
+        stored = self._marker + base64.urlsafe_b64encode(compressed).decode("ascii")
+        return stored if len(stored) < len(data) else data
+
+    def __repr__(self) -> str:
+        return (
+            f"{type(self).__name__}(algorithm={self.algorithm!r}, "
+            f"threshold={self.threshold}, level={self.level})"
+        )
+
+
+def decompress(data: str) -> str:
+    """Decompress a stored value if it has a compression marker.
+
+    Args:
+        data (str): The value stored in the database.
+
+    Returns:
+        str: The decompressed value, or data unchanged if it isn't compressed.
+    """
+    if not data.startswith(MARKER_PREFIX):
+        return data
+    marker, _, payload = data[len(MARKER_PREFIX) :].partition(":")
+    module = _compressors.get(marker)
+    if module is None:
+        return data
+    return module.decompress(base64.urlsafe_b64decode(payload)).decode("utf-8")
@@ -1,26 +1,59 @@
 """Async and dict-like interfaces for interacting with Replit Database."""
 
 import asyncio
-from collections import abc
+import atexit
+from collections import abc, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+import contextvars
+from dataclasses import dataclass
 import json
 import threading
+import time
+import traceback
 from typing import (
     Any,
+    AsyncIterator,
+    Awaitable,
     Callable,
+    ContextManager,
+    Deque,
     Dict,
+    Iterable,
     Iterator,
     List,
+    Mapping,
     Optional,
+    Sequence,
     Tuple,
     Union,
 )
 import urllib.parse
+import weakref
 
 import aiohttp
-from aiohttp_retry import ExponentialRetry, RetryClient  # type: ignore
+from aiohttp_retry import RetryClient  # type: ignore
 import requests
-from requests.adapters import HTTPAdapter, Retry
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
 from urllib3.filepost import encode_multipart_formdata
+from urllib3.util import Timeout
+
+from .buffer import WriteBuffer
+from .cache import ReadCache
+from .chunks import chunk_prefix, Chunking, is_chunk_key, Manifest
+from .codecs import Codec, decode_value, encode_value, JSONCodec, register_codec
+from .compression import Compression, decompress
+from .deadline import deadline, remaining, request_timeout
+from .hedging import Hedging
+from .index import KeyIndex
+from .metrics import Metrics
+from .namespace import Namespace
+from .pool import ConnectionPool
+from .profiler import KeyProfiler
+from .ratelimit import RateLimiter
+from .retry import AsyncDatabaseRetry, DatabaseRetry
+from .scheduler import ScheduledTask, scheduler
+from .singleflight import AsyncSingleFlight, SingleFlight
 
 
 def to_primitive(o: Any) -> Any:
@@ -63,6 +96,159 @@ def dumps(val: Any) -> str:
 _dumps = dumps
 
 
+@dataclass(frozen=True)
+class KeyPage:
+    """A page of keys from a streamed prefix listing.
+
+    Attributes:
+        keys (Tuple[str, ...]): The keys in this page, in listing order.
+        cursor (Optional[str]): The last key in this page. Pass it as the cursor of
+            a later listing to resume after this page.
+    """
+
+    keys: Tuple[str, ...]
+    cursor: Optional[str]
+
+
+def _decode_listed_key(line: bytes) -> Optional[str]:
+    """Decode one line of an encoded key listing, None if the line is blank."""
+    line = line.rstrip(b"\r\n")
+    if not line:
+        return None
+    return urllib.parse.unquote(line.decode("utf-8"))
+
+
+class _Cursor:
+    """Skips the keys of a listing up to and including a cursor key.
+
+    The server can't resume a listing, so the whole listing is downloaded again
+    and the keys before the cursor are skipped on the client. The API doesn't
+    promise that listings are sorted, so keys are skipped until the cursor itself
+    is listed. Keys that sort after the cursor are kept meanwhile, in case it was
+    deleted since: from an unsorted listing they may be repeated, never lost.
+    """
+
+    __slots__ = ("after", "_seen")
+
+    def __init__(self, after: Optional[str]) -> None:
+        self.after = after
+        self._seen = after is None
+
+    def skip(self, key: str) -> bool:
+        """Return whether key was listed before the cursor."""
+        if self._seen or self.after is None:
+            return False
+        if key == self.after:
+            self._seen = True
+            return True
+        return key < self.after
+
+
+class _Pages:
+    """Groups a stream of keys into pages of at most page_size keys."""
+
+    __slots__ = ("page_size", "_keys")
+
+    def __init__(self, page_size: int) -> None:
+        self.page_size = page_size
+        self._keys: List[str] = []
+
+    def add(self, key: str) -> Optional[KeyPage]:
+        """Add a key, returning the page it completes, if any."""
+        self._keys.append(key)
+        return self.rest() if len(self._keys) >= self.page_size else None
+
+    def rest(self) -> Optional[KeyPage]:
+        """Return the keys added since the last page, None if there are none."""
+        if not self._keys:
+            return None
+        page = KeyPage(tuple(self._keys), self._keys[-1])
+        self._keys = []
+        return page
+
+
+def _paginate(keys: Iterator[str], page_size: int) -> Iterator[KeyPage]:
+    """Group a stream of keys into pages of at most page_size keys."""
+    pages = _Pages(page_size)
+    for key in keys:
+        page = pages.add(key)
+        if page is not None:
+            yield page
+    page = pages.rest()
+    if page is not None:
+        yield page
+
+
+@dataclass(frozen=True)
+class DeleteSummary:
+    """The outcome of a bulk deletion.
+
+    Attributes:
+        deleted (int): How many keys were deleted.
+        missing (Tuple[str, ...]): The keys that were not in the database.
+    """
+
+    deleted: int
+    missing: Tuple[str, ...]
+
+
+async def _gather_bounded(
+    func: Callable[[str], Awaitable[None]], keys: Sequence[str], concurrency: int
+) -> None:
+    """Call func on every key, with at most concurrency calls in flight at once.
+
+    A fixed number of workers pull keys from a shared iterator, so only
+    `concurrency` coroutines exist no matter how many keys there are. If any call
+    raises, the remaining workers are cancelled and the exception propagates.
+
+    Args:
+        func (Callable[[str], Awaitable[None]]): The coroutine function to call.
+        keys (Sequence[str]): The keys to call it on.
+        concurrency (int): The maximum number of concurrent calls.
+    """
+    it = iter(keys)
+
+    async def worker() -> None:
+        for key in it:
+            await func(key)
+
+    workers = [
+        asyncio.ensure_future(worker()) for _ in range(min(concurrency, len(keys)))
+    ]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for w in workers:
+            w.cancel()
+
+
+# Databases that haven't been closed, to close when the interpreter exits.
+# Keyed by id, since Database, as a mapping, isn't hashable.
+_open_databases: "weakref.WeakValueDictionary[int, Any]" = weakref.WeakValueDictionary()
+
+
+def _close_open_databases() -> None:
+    # Sends buffered writes and releases connections of the databases still
+    # open at exit, instead of watching the main thread from every database.
+    for db in list(_open_databases.values()):
+        try:
+            if isinstance(db, AsyncDatabase):
+                asyncio.run(db.close())
+            else:
+                db.close()
+        except Exception:
+            traceback.print_exc()
+
+
+atexit.register(_close_open_databases)
+
+# Statuses of requests made with a URL whose credentials have expired.
+_AUTH_FAILURES = (401, 403)
+
+# Requested to open connections, never set.
+_WARM_UP_KEY = "~warm-up"
+
+
 class AsyncDatabase:
     """Async interface for Replit Database.
 
@@ -70,19 +256,42 @@ class AsyncDatabase:
     :param int retry_count: How many retry attempts we should make
     :param get_db_url Callable: A callback that returns the current db_url
     :param unbind Callable: Permit additional behavior after Database close
+    :param int concurrency: How many requests bulk reads may have in flight
+    :param ReadCache cache: An optional cache for read values
+    :param Codec codec: How values are encoded, JSON by default
+    :param Compression compression: Compress large values before storing them
+    :param Chunking chunking: Split values that are too large for one key
+    :param Metrics metrics: Count requests, latencies, bytes and retries
+    :param KeyProfiler profiler: Find hot keys and large values
+    :param RateLimiter rate_limiter: Hold requests back to a rate limit
+    :param Hedging hedging: Send a second copy of slow reads
+
+    Concurrent gets of the same key, and lists of the same prefix, share one
+    request.
     """
 
     __slots__ = (
         "db_url",
         "sess",
         "client",
+        "concurrency",
+        "cache",
+        "codec",
+        "compression",
+        "chunking",
+        "metrics",
+        "profiler",
+        "pool",
         "_get_db_url",
         "_unbind",
-        "_refresh_timer",
-        "_watchdog_timer",
+        "_refresh_task",
+        "rate_limiter",
+        "hedging",
+        "_timeout",
+        "_get_flights",
+        "_list_flights",
+        "__weakref__",
     )
-    _refresh_timer: Optional[threading.Timer]
-    _watchdog_timer: Optional[threading.Timer]
 
     def __init__(
         self,
@@ -90,6 +299,18 @@ class AsyncDatabase:
         retry_count: int = 5,
         get_db_url: Optional[Callable[[], Optional[str]]] = None,
         unbind: Optional[Callable[[], None]] = None,
+        concurrency: int = 16,
+        cache: Optional[ReadCache] = None,
+        codec: Optional[Codec] = None,
+        compression: Optional[Compression] = None,
+        chunking: Optional[Chunking] = None,
+        metrics: Optional[Metrics] = None,
+        profiler: Optional[KeyProfiler] = None,
+        pool: Optional[ConnectionPool] = None,
+        refresh_interval: float = 3600,
+        timeout: Optional[float] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        hedging: Optional[Hedging] = None,
     ) -> None:
         """Initialize database. You shouldn't have to do this manually.
 
@@ -98,44 +319,162 @@ class AsyncDatabase:
             retry_count (int): How many times to retry connecting
                 (with exponential backoff)
             get_db_url (callable[[], str]): A function that will be called to refresh
-                the db_url property
+                the db_url property, every refresh_interval seconds and when a
+                request fails authentication
             unbind (callable[[], None]): A callback to clean up after .close() is called
+            concurrency (int): The default number of requests that bulk reads such
+                as to_dict may have in flight at once.
+            cache (Optional[ReadCache]): A cache to serve repeated reads from.
+                Disabled by default.
+            codec (Optional[Codec]): The codec used to encode and decode values.
+                Defaults to JSON.
+            compression (Optional[Compression]): Compress encoded values above a
+                size threshold. Compressed values are always decompressed on read.
+                Disabled by default.
+            chunking (Optional[Chunking]): Store values longer than a chunk size
+                across several keys. Chunked values are always reassembled on read.
+                Disabled by default.
+            metrics (Optional[Metrics]): Record every request made by the
+                database. Disabled by default.
+            profiler (Optional[KeyProfiler]): Record the keys read, written and
+                deleted, to find hot keys and large values. Disabled by default.
+            pool (Optional[ConnectionPool]): The connection pool to send requests
+                through, which may be shared with other databases. The database
+                doesn't close it. Defaults to a session of its own.
+            refresh_interval (float): Seconds between calls to get_db_url.
+            timeout (Optional[float]): Seconds each request attempt may take, on
+                top of the pool's timeouts. None for no limit. See `deadline` to
+                bound a call including its retries.
+            rate_limiter (Optional[RateLimiter]): Hold requests back to a rate of
+                requests and bytes per second, which may be shared with other
+                databases. Disabled by default.
+            hedging (Optional[Hedging]): Send a second copy of gets and listings
+                that are slower than usual, and use the first answer. Disabled by
+                default.
+
+        Raises:
+            ValueError: If both metrics and a pool are given. Set the metrics on
+                the pool instead.
         """
+        if pool is not None and metrics is not None and metrics is not pool.metrics:
+            raise ValueError("metrics must be set on the pool the database uses")
         self.db_url = db_url
-        self.sess = aiohttp.ClientSession()
+        self.concurrency = concurrency
+        self.cache = cache
+        self.codec = codec or JSONCodec()
+        if self.codec.marker:
+            register_codec(self.codec)
+        self.compression = compression
+        self.chunking = chunking
+        self.profiler = profiler
+        self.pool = pool
+        if pool is not None:
+            self.metrics = pool.metrics
+            self.sess = pool.session()
+        else:
+            self.metrics = metrics
+            self.sess = aiohttp.ClientSession(
+                trace_configs=[metrics.trace_config()] if metrics is not None else None
+            )
         self._get_db_url = get_db_url
         self._unbind = unbind
 
-        retry_options = ExponentialRetry(attempts=retry_count)
+        self._timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.hedging = hedging
+        self._get_flights: AsyncSingleFlight[Optional[str]] = AsyncSingleFlight()
+        self._list_flights: AsyncSingleFlight[Tuple[str, ...]] = AsyncSingleFlight()
+        retry_options = AsyncDatabaseRetry(retry_count, rate_limiter)
         self.client = RetryClient(client_session=self.sess, retry_options=retry_options)
 
+        self._refresh_task: Optional[ScheduledTask] = None
         if self._get_db_url:
-            self._refresh_timer = threading.Timer(3600, self._refresh_db)
-            self._refresh_timer.start()
-        else:
-            self._refresh_timer = None
-        watched_thread = threading.main_thread()
-        self._watchdog_timer = threading.Timer(1, self._watchdog, args=[watched_thread])
-        self._watchdog_timer.start()
-
-    def _refresh_db(self) -> None:
-        if self._refresh_timer:
-            self._refresh_timer.cancel()
-            self._refresh_timer = None
+            self._refresh_task = scheduler.call_every(
+                refresh_interval, self._refresh_db
+            )
+        _open_databases[id(self)] = self
+
+    def _refresh_db(self) -> bool:
+        # Returns whether the URL changed.
         if self._get_db_url:
             db_url = self._get_db_url()
-            if db_url:
+            if db_url and db_url != self.db_url:
                 self.update_db_url(db_url)
-            self._refresh_timer = threading.Timer(3600, self._refresh_db)
-            self._refresh_timer.start()
+                return True
+        return False
+
+    @asynccontextmanager
+    async def _request(
+        self, method: str, path: str = "", **kwargs: Any
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        # Send a request to the database. If it is rejected because the URL's
+        # credentials expired, refresh the URL and replay the request once.
+        db_url = self.db_url
+        async with self._send(method, db_url + path, **kwargs) as response:
+            # The URL may have been refreshed by another request in the meantime.
+            if response.status not in _AUTH_FAILURES or (
+                not self._refresh_db() and self.db_url == db_url
+            ):
+                yield response
+                return
+        async with self._send(method, self.db_url + path, **kwargs) as response:
+            yield response
+
+    async def _read(
+        self, path: str = "", params: Optional[Dict[str, str]] = None
+    ) -> Tuple[aiohttp.ClientResponse, bytes]:
+        # Send a GET and read its body, hedged if the database hedges reads. The
+        # response is released, but its status can still be checked.
+        async def read() -> Tuple[aiohttp.ClientResponse, bytes]:
+            async with self._request("GET", path, params=params) as response:
+                return response, await response.read()
+
+        if self.hedging is None:
+            return await read()
+        return await self.hedging.run(read)
+
+    @asynccontextmanager
+    async def _send(
+        self, method: str, url: str, **kwargs: Any
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        # Send a request, with retries, at the rate limit and with the database's
+        # timeout capped by the current deadline.
+        limiter = self.rate_limiter
+        if limiter is not None:
+            await limiter.acquire_async(_body_size(kwargs.get("data")))
+        timeout = request_timeout(self._timeout)
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+        # aiohttp_retry gives every attempt the timeout computed above, so the
+        # deadline also bounds the attempts and the waits between them together.
+        request = self.client.request(method, url, **kwargs)
+        response = await asyncio.wait_for(request, remaining())
+        try:
+            if limiter is not None:
+                limiter.observe(
+                    response.status,
+                    response.headers.get("Retry-After"),
+                    response.content_length or 0,
+                )
+            yield response
+        finally:
+            response.close()
+
+    def deadline(self, seconds: float) -> ContextManager[None]:
+        """Bound the time spent by requests in a with block, including retries.
+
+        Requests that can't finish in time raise a timeout error, and retries
+        that can't start in time raise DeadlineExceeded. The deadline applies to
+        every database in the current task, and nested deadlines can only
+        shorten it.
+
+        Args:
+            seconds (float): The time allowed, from now.
 
-    def _watchdog(self, watched_thread: threading.Thread) -> None:
-        if not watched_thread.is_alive():
-            return asyncio.run(self.close())
-        if self._watchdog_timer:
-            self._watchdog_timer.cancel()
-        self._watchdog_timer = threading.Timer(1, self._watchdog, args=[watched_thread])
-        self._watchdog_timer.start()
+        Returns:
+            ContextManager[None]: The context manager to enter.
+        """
+        return deadline(seconds)
 
     def update_db_url(self, db_url: str) -> None:
         """Update the database url.
@@ -149,14 +488,29 @@ class AsyncDatabase:
         return self
 
     async def __aexit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
-        await self.client.close()
-        await self.sess.close()
+        await self.close()
+
+    async def warm_up(self, connections: int = 1) -> None:
+        """Open connections to the database before the first requests need them.
+
+        Sends concurrent requests for a key that doesn't exist, leaving up to
+        connections keep-alive connections open in the session's pool.
+
+        Args:
+            connections (int): The number of connections to open.
+        """
+
+        async def probe() -> None:
+            async with self.sess.get(self.db_url + "/" + _WARM_UP_KEY) as response:
+                await response.read()
+
+        await asyncio.gather(*(probe() for _ in range(connections)))
 
     async def get(self, key: str) -> str:
         """Return the value for key if key is in the database.
 
-        This method will JSON decode the value. To disable this behavior, use the
-        `get_raw` method instead.
+        This method will decode the value with the database's codec, JSON by
+        default. To disable this behavior, use the `get_raw` method instead.
 
         Args:
             key (str): The key to retreive
@@ -164,11 +518,22 @@ class AsyncDatabase:
         Returns:
             str: The value for key if key is in the database.
         """
-        return json.loads(await self.get_raw(key))
+        return self._decode(await self.get_raw(key))
+
+    def _encode(self, value: Any) -> str:
+        data = encode_value(value, self.codec)
+        if self.compression is not None:
+            data = self.compression.compress(data)
+        return data
+
+    def _decode(self, raw: str) -> Any:
+        return decode_value(decompress(raw), self.codec)
 
     async def get_raw(self, key: str) -> str:
         """Get the value of an item from the database.
 
+        Chunked values are reassembled, fetching their chunks concurrently.
+
         Args:
             key (str): The key to retreive
 
@@ -178,22 +543,73 @@ class AsyncDatabase:
         Returns:
             str: The value of the key
         """
-        async with self.client.get(
-            self.db_url + "/" + urllib.parse.quote(key)
-        ) as response:
-            if response.status == 404:
-                raise KeyError(key)
-            response.raise_for_status()
-            return await response.text()
+        start = time.perf_counter()
+        value = await self._get_value(key)
+        if self.profiler is not None:
+            self.profiler.record(key, time.perf_counter() - start, len(value or ""))
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    async def _get_value(self, key: str) -> Optional[str]:
+        # Return the value of key with its chunks joined, None if it is not set.
+        for _ in range(2):
+            raw = await self._get_stored(key)
+            if raw is None:
+                return None
+            manifest = Manifest.parse(raw)
+            if manifest is None:
+                return raw
+            value = await self._join_chunks(key, manifest)
+            if value is not None:
+                return value
+            # The value was overwritten or deleted while its chunks were read.
+            self._invalidate((key,))
+        return None
+
+    async def _join_chunks(self, key: str, manifest: Manifest) -> Optional[str]:
+        chunks: Dict[str, Optional[str]] = {}
+
+        async def fetch(chunk_key: str) -> None:
+            chunks[chunk_key] = await self._get_stored(chunk_key)
+
+        chunk_keys = manifest.chunk_keys(key)
+        await _gather_bounded(fetch, chunk_keys, self.concurrency)
+        return manifest.join(key, [chunks[k] for k in chunk_keys])
+
+    async def _get_stored(self, key: str) -> Optional[str]:
+        # Return the stored value of key, None if it is not set.
+        if self.cache is not None:
+            hit, cached = self.cache.get(key)
+            if hit:
+                return cached
+        return await self._get_flights.do(key, lambda: self._fetch(key))
+
+    async def _fetch(self, key: str) -> Optional[str]:
+        # Request the stored value of key and cache it.
+        cache = self.cache
+        generation = cache.generation if cache is not None else None
+        response, body = await self._read("/" + urllib.parse.quote(key))
+        if response.status == 404:
+            if cache is not None:
+                cache.put(key, None, generation)
+            return None
+        response.raise_for_status()
+        text = body.decode(response.get_encoding())
+        if cache is not None:
+            cache.put(key, text, generation)
+        return text
 
     async def set(self, key: str, value: Any) -> None:
-        """Set a key in the database to the result of JSON encoding value.
+        """Set a key in the database to the result of encoding value.
+
+        Values are encoded with the database's codec, JSON by default.
 
         Args:
             key (str): The key to set
-            value (Any): The value to set it to. Must be JSON-serializable.
+            value (Any): The value to set it to. Must be encodable by the codec.
         """
-        await self.set_raw(key, _dumps(value))
+        await self.set_raw(key, self._encode(value))
 
     async def set_raw(self, key: str, value: str) -> None:
         """Set a key in the database to value.
@@ -205,22 +621,60 @@ class AsyncDatabase:
         await self.set_bulk_raw({key: value})
 
     async def set_bulk(self, values: Dict[str, Any]) -> None:
-        """Set multiple values in the database, JSON encoding them.
+        """Set multiple values in the database, encoded with the database's codec.
 
         Args:
             values (Dict[str, Any]): A dictionary of values to put into the dictionary.
-                Values must be JSON serializeable.
+                Values must be encodable by the codec.
         """
-        await self.set_bulk_raw({k: _dumps(v) for k, v in values.items()})
+        await self.set_bulk_raw({k: self._encode(v) for k, v in values.items()})
 
     async def set_bulk_raw(self, values: Dict[str, str]) -> None:
         """Set multiple values in the database.
 
+        With chunking enabled, oversized values are split into chunks that are
+        sent in the same request. The chunks of overwritten chunked values are
+        deleted once the new values are sent, see `Chunking`.
+
         Args:
             values (Dict[str, str]): The key-value pairs to set.
         """
-        async with self.client.post(self.db_url, data=values) as response:
-            response.raise_for_status()
+        start = time.perf_counter()
+        stored = values if self.chunking is None else self.chunking.split(values)
+        previous = await self._stored_chunks(stored)
+        try:
+            async with self._request("POST", data=stored) as response:
+                response.raise_for_status()
+        finally:
+            self._invalidate(stored)
+        await self._delete_chunks(previous)
+        self._profile_writes(values, start)
+
+    def _profile_writes(self, values: Dict[str, str], start: float) -> None:
+        # Split the time taken by a bulk write evenly between its keys.
+        if self.profiler is not None and values:
+            share = (time.perf_counter() - start) / len(values)
+            for key, value in values.items():
+                self.profiler.record(key, share, len(value))
+
+    async def _stored_chunks(self, keys: Iterable[str]) -> List[str]:
+        # List the chunk keys of keys about to be overwritten or deleted, when
+        # this database chunks values. Only the chunks listed before a write are
+        # deleted after it, never those of a concurrent write that replaced it.
+        chunk_keys: List[str] = []
+        if self.chunking is None:
+            return chunk_keys
+
+        async def list_chunks(key: str) -> None:
+            chunk_keys.extend([k async for k in self.iter_prefix(chunk_prefix(key))])
+
+        keys = [k for k in keys if not is_chunk_key(k)]
+        await _gather_bounded(list_chunks, keys, self.concurrency)
+        return chunk_keys
+
+    async def _delete_chunks(self, chunk_keys: List[str]) -> None:
+        if chunk_keys:
+            await self.delete_many(chunk_keys)
 
     async def delete(self, key: str) -> None:
         """Delete a key from the database.
@@ -231,13 +685,85 @@ class AsyncDatabase:
         Raises:
             KeyError: Key does not exist
         """
+        start = time.perf_counter()
+        previous = await self._stored_chunks((key,))
         body, content_type = encode_multipart_formdata({"key": key})
-        async with self.client.delete(
-            self.db_url, data=body, headers={"Content-Type": content_type}
-        ) as response:
-            if response.status == 404:
-                raise KeyError(key)
-            response.raise_for_status()
+        try:
+            async with self._request(
+                "DELETE", data=body, headers={"Content-Type": content_type}
+            ) as response:
+                if response.status == 404:
+                    raise KeyError(key)
+                response.raise_for_status()
+        finally:
+            self._invalidate((key,))
+        await self._delete_chunks(previous)
+        if self.profiler is not None:
+            self.profiler.record(key, time.perf_counter() - start, 0)
+
+    def _invalidate(self, keys: Iterable[str]) -> None:
+        # Later reads of the keys must not be answered by reads made before.
+        for key in keys:
+            if self.cache is not None:
+                self.cache.invalidate(key)
+            self._get_flights.forget(key)
+        self._list_flights.forget_all()
+
+    async def delete_many(
+        self,
+        keys: Iterable[str],
+        concurrency: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> DeleteSummary:
+        """Delete many keys from the database concurrently.
+
+        Args:
+            keys (Iterable[str]): The keys to delete.
+            concurrency (Optional[int]): The maximum number of requests in flight.
+                Defaults to the database's concurrency setting.
+            progress (Optional[Callable[[int, int], None]]): Called with the number
+                of keys processed so far and the total after each key.
+
+        Returns:
+            DeleteSummary: How many keys were deleted, and which were missing.
+        """
+        keys = tuple(keys)
+        missing: List[str] = []
+        done = 0
+
+        async def delete(key: str) -> None:
+            nonlocal done
+            try:
+                await self.delete(key)
+            except KeyError:
+                missing.append(key)
+            done += 1
+            if progress is not None:
+                progress(done, len(keys))
+
+        await _gather_bounded(delete, keys, concurrency or self.concurrency)
+        return DeleteSummary(len(keys) - len(missing), tuple(missing))
+
+    async def delete_prefix(
+        self,
+        prefix: str,
+        concurrency: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> DeleteSummary:
+        """Delete every key that begins with prefix, see `delete_many`.
+
+        Args:
+            prefix (str): The prefix the keys must start with, blank means anything.
+            concurrency (Optional[int]): The maximum number of requests in flight.
+                Defaults to the database's concurrency setting.
+            progress (Optional[Callable[[int, int], None]]): Called with the number
+                of keys processed so far and the total after each key.
+
+        Returns:
+            DeleteSummary: How many keys were deleted, and which were missing.
+        """
+        keys = await self.list(prefix)
+        return await self.delete_many(keys, concurrency=concurrency, progress=progress)
 
     async def list(self, prefix: str) -> Tuple[str, ...]:
         """List keys in the database which start with prefix.
@@ -248,30 +774,138 @@ class AsyncDatabase:
         Returns:
             Tuple[str]: The keys found.
         """
+        return await self._list_flights.do(prefix, lambda: self._list(prefix))
+
+    async def _list(self, prefix: str) -> Tuple[str, ...]:
+        if self.hedging is None:
+            return tuple([k async for k in self.iter_prefix(prefix)])
+        # Hedged listings are read whole, since a stream can't be hedged.
+        response, body = await self._read(params={"prefix": prefix, "encode": "true"})
+        response.raise_for_status()
+        hide_chunks = not is_chunk_key(prefix)
+        keys = [_decode_listed_key(line) for line in body.split(b"\n")]
+        return tuple(
+            key
+            for key in keys
+            if key is not None and not (hide_chunks and is_chunk_key(key))
+        )
+
+    async def iter_prefix(
+        self, prefix: str = "", after: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Stream the keys in the database which start with prefix.
+
+        The listing is parsed line by line as it arrives, so memory use does not
+        grow with the number of keys. Keys are yielded in the order the server
+        lists them. Chunk keys are left out unless prefix starts with ``~chunk/``.
+
+        Args:
+            prefix (str): The prefix keys must start with, blank means anything.
+            after (Optional[str]): Only yield keys listed after this one. Used to
+                resume an interrupted listing. The server can't resume listings,
+                so the keys before it are still downloaded and skipped here.
+
+        Yields:
+            str: The keys found.
+        """
         params = {"prefix": prefix, "encode": "true"}
-        async with self.client.get(self.db_url, params=params) as response:
+        hide_chunks = not is_chunk_key(prefix)
+        resume = _Cursor(after)
+        async with self._request("GET", params=params) as response:
             response.raise_for_status()
-            text = await response.text()
-            if not text:
-                return tuple()
-            else:
-                return tuple(urllib.parse.unquote(k) for k in text.split("\n"))
+            async for line in response.content:
+                key = _decode_listed_key(line)
+                if key is None or resume.skip(key):
+                    continue
+                if hide_chunks and is_chunk_key(key):
+                    continue
+                yield key
+
+    async def prefix_pages(
+        self, prefix: str = "", page_size: int = 1000, cursor: Optional[str] = None
+    ) -> AsyncIterator[KeyPage]:
+        """Stream the keys which start with prefix in pages of bounded size.
+
+        Args:
+            prefix (str): The prefix keys must start with, blank means anything.
+            page_size (int): The maximum number of keys in a page.
+            cursor (Optional[str]): The cursor of a previously returned page. The
+                listing resumes after it.
+
+        Yields:
+            KeyPage: The pages of keys found.
+        """
+        pages = _Pages(page_size)
+        async for key in self.iter_prefix(prefix, after=cursor):
+            page = pages.add(key)
+            if page is not None:
+                yield page
+        page = pages.rest()
+        if page is not None:
+            yield page
+
+    async def get_many(
+        self,
+        keys: Iterable[str],
+        concurrency: Optional[int] = None,
+        on_error: Optional[Callable[[str, Exception], None]] = None,
+    ) -> Dict[str, Any]:
+        """Get the decoded values of many keys concurrently.
+
+        Requests share the client's connection pool. Keys that are not in the
+        database (for example because they were deleted after being listed) are left
+        out of the result.
+
+        Args:
+            keys (Iterable[str]): The keys to retrieve.
+            concurrency (Optional[int]): The maximum number of requests in flight.
+                Defaults to the database's concurrency setting.
+            on_error (Optional[Callable[[str, Exception], None]]): Called with the
+                key and the exception when fetching a key fails. The key is then
+                left out of the result. If not given, the first error is raised.
 
-    async def to_dict(self, prefix: str = "") -> Dict[str, str]:
+        Returns:
+            Dict[str, Any]: The values found, in the same order as keys.
+        """
+        keys = tuple(keys)
+        found: Dict[str, Any] = {}
+
+        async def fetch(key: str) -> None:
+            try:
+                found[key] = await self.get(key)
+            except KeyError:
+                pass
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(key, e)
+
+        await _gather_bounded(fetch, keys, concurrency or self.concurrency)
+        return {k: found[k] for k in keys if k in found}
+
+    async def to_dict(
+        self,
+        prefix: str = "",
+        concurrency: Optional[int] = None,
+        on_error: Optional[Callable[[str, Exception], None]] = None,
+    ) -> Dict[str, str]:
         """Dump all data in the database into a dictionary.
 
+        Values are fetched concurrently, see `get_many`.
+
         Args:
             prefix (str): The prefix the keys must start with,
                 blank means anything. Defaults to "".
+            concurrency (Optional[int]): The maximum number of requests in flight.
+                Defaults to the database's concurrency setting.
+            on_error (Optional[Callable[[str, Exception], None]]): Called with the
+                key and the exception when fetching a key fails, instead of raising.
 
         Returns:
             Dict[str, str]: All keys in the database.
         """
-        ret = {}
         keys = await self.list(prefix=prefix)
-        for i in keys:
-            ret[i] = await self.get(i)
-        return ret
+        return await self.get_many(keys, concurrency=concurrency, on_error=on_error)
 
     async def keys(self) -> Tuple[str, ...]:
         """Get all keys in the database.
@@ -281,32 +915,52 @@ class AsyncDatabase:
         """
         return await self.list("")
 
-    async def values(self) -> Tuple[str, ...]:
+    async def values(
+        self,
+        concurrency: Optional[int] = None,
+        on_error: Optional[Callable[[str, Exception], None]] = None,
+    ) -> Tuple[str, ...]:
         """Get every value in the database.
 
+        Args:
+            concurrency (Optional[int]): The maximum number of requests in flight.
+                Defaults to the database's concurrency setting.
+            on_error (Optional[Callable[[str, Exception], None]]): Called with the
+                key and the exception when fetching a key fails, instead of raising.
+
         Returns:
             Tuple[str]: The values in the database.
         """
-        data = await self.to_dict()
+        data = await self.to_dict(concurrency=concurrency, on_error=on_error)
         return tuple(data.values())
 
-    async def items(self) -> Tuple[Tuple[str, str], ...]:
+    async def items(
+        self,
+        concurrency: Optional[int] = None,
+        on_error: Optional[Callable[[str, Exception], None]] = None,
+    ) -> Tuple[Tuple[str, str], ...]:
         """Convert the database to a dict and return the dict's items method.
 
+        Args:
+            concurrency (Optional[int]): The maximum number of requests in flight.
+                Defaults to the database's concurrency setting.
+            on_error (Optional[Callable[[str, Exception], None]]): Called with the
+                key and the exception when fetching a key fails, instead of raising.
+
         Returns:
             Tuple[Tuple[str]]: The items
         """
-        return tuple((await self.to_dict()).items())
+        data = await self.to_dict(concurrency=concurrency, on_error=on_error)
+        return tuple(data.items())
 
     async def close(self) -> None:
-        """Closes the database client connection."""
-        await self.sess.close()
-        if self._refresh_timer:
-            self._refresh_timer.cancel()
-            self._refresh_timer = None
-        if self._watchdog_timer:
-            self._watchdog_timer.cancel()
-            self._watchdog_timer = None
+        """Closes the database client connection, unless it is a shared pool's."""
+        if self.pool is None:
+            await self.sess.close()
+        _open_databases.pop(id(self), None)
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
         if self._unbind:
             # Permit signaling to surrounding scopes that we have closed
             self._unbind()
@@ -323,6 +977,9 @@ class AsyncDatabase:
 class ObservedList(abc.MutableSequence):
     """A list that calls a function every time it is mutated.
 
+    Nested lists and dicts are wrapped when they are accessed, so that mutating
+    them calls this list's function too.
+
     Attributes:
         value (List): The underlying list.
     """
@@ -343,7 +1000,10 @@ class ObservedList(abc.MutableSequence):
         self._on_mutate_handler(self.value)
 
     def __getitem__(self, i: Union[int, slice]) -> Any:
-        return self.value[i]
+        if isinstance(i, slice):
+            cb = _get_on_mutate_cb(self)
+            return [item_to_observed(cb, v) for v in self.value[i]]
+        return item_to_observed(_get_on_mutate_cb(self), self.value[i])
 
     def __setitem__(self, i: Union[int, slice], val: Any) -> None:
         self.value[i] = val
@@ -357,7 +1017,11 @@ class ObservedList(abc.MutableSequence):
         return len(self.value)
 
     def __iter__(self) -> Iterator[Any]:
-        return iter(self.value)
+        cb = _get_on_mutate_cb(self)
+        return (item_to_observed(cb, v) for v in self.value)
+
+    def __contains__(self, elem: Any) -> bool:
+        return elem in self.value
 
     def __imul__(self, rhs: Any) -> Any:
         self.value *= rhs
@@ -384,6 +1048,9 @@ class ObservedList(abc.MutableSequence):
 class ObservedDict(abc.MutableMapping):
     """A list that calls a function every time it is mutated.
 
+    Nested lists and dicts are wrapped when they are accessed, so that mutating
+    them calls this dict's function too.
+
     Attributes:
         value (Dict): The underlying dict.
     """
@@ -407,14 +1074,14 @@ class ObservedDict(abc.MutableMapping):
         return k in self.value
 
     def __getitem__(self, k: Any) -> Any:
-        return self.value[k]
+        return item_to_observed(_get_on_mutate_cb(self), self.value[k])
 
     # This should be posititional only but flake8 doesn't like that
     def get(self, key: str, default: Any = None) -> Any:
         """Return the value for key if key is in the dictionary, else default."""
-        return self.value.get(
-            key, item_to_observed(_get_set_cb(db=self, k=key), default)
-        )
+        if key in self.value:
+            return self[key]
+        return item_to_observed(_get_set_cb(db=self, k=key), default)
 
     def __setitem__(self, k: Any, v: Any) -> None:
         self.value[k] = v
@@ -463,53 +1130,161 @@ def _get_set_cb(db: Any, k: str) -> Callable[[Any], None]:
 
 
 def item_to_observed(on_mutate: Callable[[Any], None], item: Any) -> Any:
-    """Takes a JSON value and recursively converts it into an Observed value."""
-    if isinstance(item, dict):
-        # no-op handler so we don't call on_mutate in the loop below
-        observed_dict = ObservedDict((lambda _: None), item)
-        cb = _get_on_mutate_cb(observed_dict)
+    """Takes a JSON value and converts it into an Observed value.
 
-        for k, v in item.items():
-            observed_dict[k] = item_to_observed(cb, v)
-
-        observed_dict._on_mutate_handler = on_mutate
-        return observed_dict
-    elif isinstance(item, list):
-        # no-op handler so we don't call on_mutate in the loop below
-        observed_list = ObservedList((lambda _: None), item)
-        cb = _get_on_mutate_cb(observed_list)
+    Only the outermost container is wrapped. Nested containers stay plain JSON
+    values and are wrapped by their parent when they are accessed, so reading one
+    field of a large document doesn't wrap all of it.
 
-        for i, v in enumerate(item):
-            observed_list[i] = item_to_observed(cb, v)
+    Args:
+        on_mutate (Callable[[Any], None]): Called with the value when it mutates.
+        item (Any): The decoded JSON value.
 
-        observed_list._on_mutate_handler = on_mutate
-        return observed_list
+    Returns:
+        Any: An ObservedDict or ObservedList for containers, otherwise item.
+    """
+    if isinstance(item, dict):
+        return ObservedDict(on_mutate, item)
+    elif isinstance(item, list):
+        return ObservedList(on_mutate, item)
     else:
         return item
 
 
+_WORKER_THREAD_PREFIX = "replit-db"
+
+# Records, in the worker threads of a Database's pool, the id of that database.
+_worker = threading.local()
+
+
+def _start_worker(database_id: int) -> None:
+    # The initializer of the worker threads of a Database's pool.
+    _worker.database_id = database_id
+
+
+def _body_size(body: Any) -> int:
+    # The size of a request body, as far as it is known before sending it.
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    if isinstance(body, dict):
+        return sum(len(k) + len(v) for k, v in body.items())
+    return 0
+
+
+class _DeadlineTimeout(Timeout):
+    # A urllib3 timeout that is recomputed from the current deadline every time
+    # urllib3 copies it, which it does before each attempt, so that retries made
+    # inside urllib3 are capped by the deadline too.
+
+    def __init__(self, timeout: Optional[float]) -> None:
+        super().__init__(total=request_timeout(timeout))
+        self.limit = timeout
+
+    def clone(self) -> Timeout:
+        return Timeout(total=request_timeout(self.limit))
+
+
+class _DatabaseAdapter(HTTPAdapter):
+    # Gives requests the database's timeout, capped by the current deadline, and
+    # holds them back to the rate limit.
+
+    def __init__(
+        self,
+        timeout: Optional[float],
+        limiter: Optional[RateLimiter],
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.timeout = timeout
+        self.limiter = limiter
+
+    def send(
+        self,
+        request: requests.PreparedRequest,
+        stream: bool = False,
+        timeout: Union[None, float, Tuple[float, float], Tuple[float, None]] = None,
+        verify: Union[bool, str] = True,
+        cert: Union[
+            None, bytes, str, Tuple[Union[bytes, str], Union[bytes, str]]
+        ] = None,
+        proxies: Optional[Mapping[str, str]] = None,
+    ) -> requests.Response:
+        limiter = self.limiter
+        if limiter is not None:
+            limiter.acquire(_body_size(request.body))
+        attempt_timeout: Any = timeout
+        if timeout is None:
+            attempt_timeout = _DeadlineTimeout(self.timeout)
+        r = super().send(request, stream, attempt_timeout, verify, cert, proxies)
+        if limiter is not None:
+            limiter.observe(
+                r.status_code,
+                r.headers.get("Retry-After"),
+                int(r.headers.get("Content-Length") or 0),
+            )
+        return r
+
+
 class Database(abc.MutableMapping):
     """Dictionary-like interface for Replit Database.
 
-    This interface will coerce all values everything to and from JSON. If you
-    don't want this, use AsyncDatabase instead.
+    This interface will coerce all values to and from the database's codec, JSON
+    by default. If you don't want this, use AsyncDatabase instead.
+
+    A Database can be shared by many threads, such as the workers of a threaded
+    Flask app. Requests from different threads run in parallel over a pool of up
+    to pool_size keep-alive connections. When more threads than that make
+    requests at once, the extra connections are closed after one request, unless
+    pool_block is set, in which case threads wait for a pooled connection. Size
+    the pool to the number of threads using the database. The values returned
+    are not locked: don't mutate one value from several threads at once.
 
     :param str db_url: The Database URL to connect to
     :param int retry_count: How many retry attempts we should make
     :param get_db_url Callable: A callback that returns the current db_url
     :param unbind Callable: Permit additional behavior after Database close
+    :param ReadCache cache: An optional cache for read values
+    :param WriteBuffer write_buffer: Buffer writes and send them in batches
+    :param KeyIndex key_index: Answer key listings and lookups from memory
+    :param Codec codec: How values are encoded, JSON by default
+    :param Compression compression: Compress large values before storing them
+    :param Chunking chunking: Split values that are too large for one key
+    :param Metrics metrics: Count requests, latencies, bytes and retries
+    :param KeyProfiler profiler: Find hot keys and large values
+    :param int pool_size: The number of connections kept open for reuse
+    :param bool pool_block: Wait for a pooled connection instead of opening more
+    :param float refresh_interval: How often get_db_url is called
+    :param float timeout: The time each request attempt may take
+    :param RateLimiter rate_limiter: Hold requests back to a rate limit
+
+    Concurrent reads of the same key, and listings of the same prefix, share one
+    request.
     """
 
     __slots__ = (
         "db_url",
         "sess",
+        "cache",
+        "codec",
+        "compression",
+        "chunking",
+        "metrics",
+        "profiler",
+        "write_buffer",
+        "key_index",
         "_get_db_url",
         "_unbind",
-        "_refresh_timer",
-        "_watchdog_timer",
+        "_refresh_task",
+        "_flush_task",
+        "_flush_lock",
+        "_pool_size",
+        "_executor",
+        "_executor_lock",
+        "rate_limiter",
+        "_get_flights",
+        "_list_flights",
+        "__weakref__",
     )
-    _refresh_timer: Optional[threading.Timer]
-    _watchdog_timer: Optional[threading.Timer]
 
     def __init__(
         self,
@@ -517,6 +1292,19 @@ class Database(abc.MutableMapping):
         retry_count: int = 5,
         get_db_url: Optional[Callable[[], Optional[str]]] = None,
         unbind: Optional[Callable[[], None]] = None,
+        cache: Optional[ReadCache] = None,
+        write_buffer: Optional[WriteBuffer] = None,
+        key_index: Optional[KeyIndex] = None,
+        codec: Optional[Codec] = None,
+        compression: Optional[Compression] = None,
+        chunking: Optional[Chunking] = None,
+        metrics: Optional[Metrics] = None,
+        profiler: Optional[KeyProfiler] = None,
+        pool_size: int = DEFAULT_POOLSIZE,
+        pool_block: bool = False,
+        refresh_interval: float = 3600,
+        timeout: Optional[float] = None,
+        rate_limiter: Optional[RateLimiter] = None,
     ) -> None:
         """Initialize database. You shouldn't have to do this manually.
 
@@ -525,46 +1313,134 @@ class Database(abc.MutableMapping):
             retry_count (int): How many times to retry connecting
                 (with exponential backoff)
             get_db_url (callable[[], str]): A function that will be called to refresh
-                the db_url property
+                the db_url property, every refresh_interval seconds and when a
+                request fails authentication
             unbind (callable[[], None]): A callback to clean up after .close() is called
+            cache (Optional[ReadCache]): A cache to serve repeated reads from.
+                Disabled by default.
+            write_buffer (Optional[WriteBuffer]): Enables write-behind mode, where
+                writes are buffered and sent in batches. Disabled by default.
+            key_index (Optional[KeyIndex]): An index of keys to answer len,
+                iteration, prefix and membership tests from. Disabled by default.
+            codec (Optional[Codec]): The codec used to encode and decode values.
+                Defaults to JSON.
+            compression (Optional[Compression]): Compress encoded values above a
+                size threshold. Compressed values are always decompressed on read.
+                Disabled by default.
+            chunking (Optional[Chunking]): Store values longer than a chunk size
+                across several keys. Chunked values are always reassembled on read.
+                Disabled by default.
+            metrics (Optional[Metrics]): Record every request made by the
+                database. Disabled by default.
+            profiler (Optional[KeyProfiler]): Record the keys read, written and
+                deleted, to find hot keys and large values. Disabled by default.
+            pool_size (int): The number of connections kept open for reuse, and
+                of threads used by bulk reads. Set it to at least the number of
+                threads sharing the database.
+            pool_block (bool): Make threads wait for a pooled connection when all
+                of them are in use, instead of opening a connection that is
+                closed after one request.
+            refresh_interval (float): Seconds between calls to get_db_url.
+            timeout (Optional[float]): Seconds each request attempt may take to
+                connect, and to receive each part of the response. None for no
+                limit. See `deadline` to bound a call including its retries.
+            rate_limiter (Optional[RateLimiter]): Hold requests back to a rate of
+                requests and bytes per second, which may be shared with other
+                databases and threads. Disabled by default.
         """
         self.db_url = db_url
+        self.cache = cache
+        self.codec = codec or JSONCodec()
+        if self.codec.marker:
+            register_codec(self.codec)
+        self.compression = compression
+        self.chunking = chunking
+        self.metrics = metrics
+        self.profiler = profiler
+        self.write_buffer = write_buffer
+        self.key_index = key_index
+        self._flush_task: Optional[ScheduledTask] = None
+        self._flush_lock = threading.Lock()
+        self._pool_size = pool_size
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
         self.sess = requests.Session()
+        if metrics is not None:
+            self.sess.hooks["response"].append(metrics.requests_hook)
+        if get_db_url is not None:
+            self.sess.hooks["response"].append(self._replay_on_auth_failure)
         self._get_db_url = get_db_url
         self._unbind = unbind
-        retries = Retry(
-            total=retry_count, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504]
+        retries = DatabaseRetry(
+            total=retry_count,
+            backoff_factor=0.1,
+            status_forcelist=[500, 502, 503, 504],
+            backoff_jitter=0.1,
+            metrics=metrics,
+            limiter=rate_limiter,
         )
-        self.sess.mount("http://", HTTPAdapter(max_retries=retries))
-        self.sess.mount("https://", HTTPAdapter(max_retries=retries))
+        self.rate_limiter = rate_limiter
+        self._get_flights: SingleFlight[Optional[str]] = SingleFlight()
+        self._list_flights: SingleFlight[Tuple[str, ...]] = SingleFlight()
+        adapter = _DatabaseAdapter(
+            timeout,
+            rate_limiter,
+            max_retries=retries,
+            pool_maxsize=pool_size,
+            pool_block=pool_block,
+        )
+        self.sess.mount("http://", adapter)
+        self.sess.mount("https://", adapter)
 
+        self._refresh_task: Optional[ScheduledTask] = None
         if self._get_db_url:
-            self._refresh_timer = threading.Timer(3600, self._refresh_db)
-            self._refresh_timer.start()
-        else:
-            self._refresh_timer = None
-        watched_thread = threading.main_thread()
-        self._watchdog_timer = threading.Timer(1, self._watchdog, args=[watched_thread])
-        self._watchdog_timer.start()
-
-    def _refresh_db(self) -> None:
-        if self._refresh_timer:
-            self._refresh_timer.cancel()
-            self._refresh_timer = None
+            self._refresh_task = scheduler.call_every(
+                refresh_interval, self._refresh_db
+            )
+        _open_databases[id(self)] = self
+
+    def _refresh_db(self) -> bool:
+        # Returns whether the URL changed.
         if self._get_db_url:
             db_url = self._get_db_url()
-            if db_url:
+            if db_url and db_url != self.db_url:
                 self.update_db_url(db_url)
-            self._refresh_timer = threading.Timer(3600, self._refresh_db)
-            self._refresh_timer.start()
+                return True
+        return False
+
+    def _replay_on_auth_failure(
+        self, r: requests.Response, *args: Any, **kwargs: Any
+    ) -> requests.Response:
+        # A response hook that refreshes the URL when a request is rejected
+        # because the URL's credentials expired, and replays the request once
+        # with the new URL.
+        if r.status_code not in _AUTH_FAILURES:
+            return r
+        stale = self.db_url
+        url = r.request.url or ""
+        if not self._refresh_db() or not url.startswith(stale):
+            return r
+        replay = r.request.copy()
+        replay.url = self.db_url + url[len(stale) :]
+        r.close()
+        return self.sess.send(replay, **kwargs)
+
+    def deadline(self, seconds: float) -> ContextManager[None]:
+        """Bound the time spent by requests in a with block, including retries.
+
+        Requests that can't finish in time raise requests.Timeout, and retries
+        that can't start in time raise DeadlineExceeded. The deadline applies to
+        every database in the current thread, including the requests bulk
+        operations make from their thread pool, and nested deadlines can only
+        shorten it.
 
-    def _watchdog(self, watched_thread: threading.Thread) -> None:
-        if not watched_thread.is_alive():
-            return self.close()
-        if self._watchdog_timer:
-            self._watchdog_timer.cancel()
-        self._watchdog_timer = threading.Timer(1, self._watchdog, args=[watched_thread])
-        self._watchdog_timer.start()
+        Args:
+            seconds (float): The time allowed, from now.
+
+        Returns:
+            ContextManager[None]: The context manager to enter.
+        """
+        return deadline(seconds)
 
     def update_db_url(self, db_url: str) -> None:
         """Update the database url.
@@ -580,10 +1456,10 @@ class Database(abc.MutableMapping):
         Will replace the mutable JSON types of dict and list with subclasses that
         enable nested setting. These classes will block to request the DB on every
         mutation, which can have performance implications. To disable this, use the
-        `get_raw` method instead.
+        `get_raw` method instead, or `batch` to write many mutations at once.
 
-        This method will JSON decode the value. To disable this behavior, use the
-        `get_raw` method instead.
+        This method will decode the value with the database's codec, JSON by
+        default. To disable this behavior, use the `get_raw` method instead.
 
         Args:
             key (str): The key to retreive
@@ -592,9 +1468,18 @@ class Database(abc.MutableMapping):
             Any: The value of the key
         """
         raw_val = self.get_raw(key)
-        val = json.loads(raw_val)
+        val = self._decode(raw_val)
         return item_to_observed(_get_set_cb(self, key), val)
 
+    def _encode(self, value: Any) -> str:
+        data = encode_value(value, self.codec)
+        if self.compression is not None:
+            data = self.compression.compress(data)
+        return data
+
+    def _decode(self, raw: str) -> Any:
+        return decode_value(decompress(raw), self.codec)
+
     # This should be posititional only but flake8 doesn't like that
     def get(self, key: str, default: Any = None) -> Any:
         """Return the value for key if key is in the database, else default.
@@ -604,8 +1489,8 @@ class Database(abc.MutableMapping):
         mutation, which can have performance implications. To disable this, use the
         `get_raw` method instead.
 
-        This method will JSON decode the value. To disable this behavior, use the
-        `get_raw` method instead.
+        This method will decode the value with the database's codec, JSON by
+        default. To disable this behavior, use the `get_raw` method instead.
 
         Args:
             key (str): The key to retreive
@@ -617,9 +1502,41 @@ class Database(abc.MutableMapping):
         """
         return super().get(key, item_to_observed(_get_set_cb(self, key), default))
 
+    @contextmanager
+    def batch(self, key: str) -> Iterator[Any]:
+        """Mutate the value of a key, writing it back once at the end of the block.
+
+        The value is wrapped like in `__getitem__`, but mutations only mark it as
+        changed instead of writing the whole value to the database every time.
+        If the value was mutated, it is written once when the block exits. If the
+        block raises, nothing is written.
+
+        >>> with db.batch("list") as value:
+        ...     for x in items:
+        ...         value.append(x)
+
+        Args:
+            key (str): The key to mutate.
+
+        Yields:
+            Any: The value of the key.
+        """
+        changed = False
+
+        def on_mutate(_: Any) -> None:
+            nonlocal changed
+            changed = True
+
+        value = item_to_observed(on_mutate, self._decode(self.get_raw(key)))
+        yield value
+        if changed:
+            self.set(key, value)
+
     def get_raw(self, key: str) -> str:
         """Look up the given key in the database and return the corresponding value.
 
+        Chunked values are reassembled, fetching their chunks in parallel.
+
         Args:
             key (str): The key to look up
 
@@ -629,30 +1546,173 @@ class Database(abc.MutableMapping):
         Returns:
             str: The value of the key in the database.
         """
+        start = time.perf_counter()
+        value = self._get_value(key)
+        if self.profiler is not None:
+            self.profiler.record(key, time.perf_counter() - start, len(value or ""))
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def _get_value(self, key: str) -> Optional[str]:
+        # Return the value of key with its chunks joined, None if it is not set.
+        for _ in range(2):
+            raw = self._get_stored(key)
+            if raw is None:
+                return None
+            manifest = Manifest.parse(raw)
+            if manifest is None:
+                return raw
+            value = self._join_chunks(key, manifest)
+            if value is not None:
+                return value
+            # The value was overwritten or deleted while its chunks were read.
+            self._invalidate((key,))
+        return None
+
+    def _join_chunks(self, key: str, manifest: Manifest) -> Optional[str]:
+        chunks = self._map_keys(self._get_stored, manifest.chunk_keys(key))
+        return manifest.join(key, chunks)
+
+    def _map_keys(self, func: Callable[[str], Any], keys: List[str]) -> List[Any]:
+        # Run func on every key, in parallel if there are several, and return
+        # the results in key order.
+        if len(keys) < 2 or getattr(_worker, "database_id", None) == id(self):
+            # Already running in the pool, waiting on it could deadlock.
+            return [func(key) for key in keys]
+        futures = self._map_ordered(func, keys, self._pool_size * 2)
+        return [future.result() for _, future in futures]
+
+    def _get_stored(self, key: str) -> Optional[str]:
+        # Return the stored value of key, None if it is not set.
+        if self.write_buffer is not None:
+            pending = self.write_buffer.get(key)
+            if pending is not None:
+                return pending
+
+        if self.cache is not None:
+            hit, cached = self.cache.get(key)
+            if hit:
+                return cached
+        return self._get_remote(key)
+
+    def _get_remote(self, key: str) -> Optional[str]:
+        return self._get_flights.do(key, lambda: self._fetch(key))
+
+    def _fetch(self, key: str) -> Optional[str]:
+        # Request the stored value of key and cache it.
+        cache = self.cache
+        generation = cache.generation if cache is not None else None
         r = self.sess.get(self.db_url + "/" + urllib.parse.quote(key))
         if r.status_code == 404:
-            raise KeyError(key)
+            if cache is not None:
+                cache.put(key, None, generation)
+            return None
 
         r.raise_for_status()
+        if cache is not None:
+            cache.put(key, r.text, generation)
         return r.text
 
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Get the decoded values of many keys, fetching them in parallel.
+
+        Values are fetched by a thread pool as large as the session's connection
+        pool. They are not wrapped in observed values, so mutating them does not
+        write to the database. Keys that are not in the database are left out.
+
+        Args:
+            keys (Iterable[str]): The keys to retrieve.
+
+        Returns:
+            Dict[str, Any]: The values found, in the same order as keys.
+        """
+        return dict(self._iter_values(keys, prefetch=self._pool_size * 2))
+
+    def iter_items(
+        self, prefix: str = "", prefetch: Optional[int] = None
+    ) -> Iterator[Tuple[str, Any]]:
+        """Stream the keys that begin with prefix and their decoded values.
+
+        Keys are streamed from the listing, see `iter_prefix`, and their values
+        fetched in parallel ahead of the consumer, but yielded in listing order.
+        Like `get_many`, values are not wrapped in observed values, and keys
+        deleted while iterating are skipped.
+
+        Args:
+            prefix (str): The prefix the keys must start with, blank means anything.
+            prefetch (Optional[int]): How many values to fetch ahead of the one
+                being consumed. Defaults to twice the connection pool size.
+
+        Returns:
+            Iterator[Tuple[str, Any]]: The keys and values.
+        """
+        return self._iter_values(
+            self.iter_prefix(prefix), prefetch=prefetch or self._pool_size * 2
+        )
+
+    def _iter_values(
+        self, keys: Iterable[str], prefetch: int
+    ) -> Iterator[Tuple[str, Any]]:
+        for key, future in self._map_ordered(self.get_raw, keys, prefetch):
+            try:
+                raw = future.result()
+            except KeyError:
+                continue
+            yield key, self._decode(raw)
+
+    def _map_ordered(
+        self, func: Callable[[str], Any], keys: Iterable[str], prefetch: int
+    ) -> Iterator[Tuple[str, Future]]:
+        # Run func on every key in the thread pool, at most prefetch keys ahead of
+        # the consumer, yielding the keys and their futures in key order.
+        executor = self._get_executor()
+        pending: Deque[Tuple[str, Future]] = deque()
+        try:
+            for key in keys:
+                # Run in a copy of the context, for deadlines to apply.
+                run = contextvars.copy_context().run
+                pending.append((key, executor.submit(run, func, key)))
+                if len(pending) >= prefetch:
+                    yield pending.popleft()
+            while pending:
+                yield pending.popleft()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._pool_size,
+                    thread_name_prefix=_WORKER_THREAD_PREFIX,
+                    initializer=_start_worker,
+                    initargs=(id(self),),
+                )
+            return self._executor
+
     def __setitem__(self, key: str, value: Any) -> None:
-        """Set a key in the database to the result of JSON encoding value.
+        """Set a key in the database to the result of encoding value.
+
+        Values are encoded with the database's codec, JSON by default.
 
         Args:
             key (str): The key to set
-            value (Any): The value to set it to. Must be JSON-serializable.
+            value (Any): The value to set it to. Must be encodable by the codec.
         """
         self.set(key, value)
 
     def set(self, key: str, value: Any) -> None:
-        """Set a key in the database to value, JSON encoding it.
+        """Set a key in the database to value, encoding it.
+
+        Values are encoded with the database's codec, JSON by default.
 
         Args:
             key (str): The key to set
             value (Any): The value to set.
         """
-        self.set_raw(key, _dumps(value))
+        self.set_raw(key, self._encode(value))
 
     def set_raw(self, key: str, value: str) -> None:
         """Set a key in the database to value.
@@ -664,22 +1724,114 @@ class Database(abc.MutableMapping):
         self.set_bulk_raw({key: value})
 
     def set_bulk(self, values: Dict[str, Any]) -> None:
-        """Set multiple values in the database, JSON encoding them.
+        """Set multiple values in the database, encoded with the database's codec.
 
         Args:
             values (Dict[str, Any]): A dictionary of values to put into the dictionary.
-                Values must be JSON serializeable.
+                Values must be encodable by the codec.
         """
-        self.set_bulk_raw({k: _dumps(v) for k, v in values.items()})
+        self.set_bulk_raw({k: self._encode(v) for k, v in values.items()})
 
     def set_bulk_raw(self, values: Dict[str, str]) -> None:
         """Set multiple values in the database.
 
+        In write-behind mode the values are buffered instead, see `flush`. With
+        chunking enabled, oversized values are split into chunks that are sent in
+        the same request. The chunks of overwritten chunked values are deleted
+        once the new values are sent, see `Chunking`.
+
         Args:
             values (Dict[str, str]): The key-value pairs to set.
         """
-        r = self.sess.post(self.db_url, data=values)
-        r.raise_for_status()
+        start = time.perf_counter()
+        if self.chunking is None:
+            self._store(values)
+        else:
+            self._store(self.chunking.split(values))
+        self._profile_writes(values, start)
+
+    def _profile_writes(self, values: Dict[str, str], start: float) -> None:
+        # Split the time taken by a bulk write evenly between its keys.
+        if self.profiler is not None and values:
+            share = (time.perf_counter() - start) / len(values)
+            for key, value in values.items():
+                self.profiler.record(key, share, len(value))
+
+    def _store(self, values: Dict[str, str]) -> None:
+        keys = [k for k in values if not is_chunk_key(k)]
+        buffer = self.write_buffer
+        if buffer is None:
+            self._post_bulk_raw(values)
+            if self.key_index is not None:
+                self.key_index.add(keys)
+            return
+
+        self._invalidate(values)
+        if self.key_index is not None:
+            self.key_index.add(keys)
+        self._discard_buffered_chunks(buffer, keys)
+        if buffer.add(values):
+            self._schedule_flush(buffer.max_delay)
+        if buffer.full():
+            self.flush()
+
+    def _discard_buffered_chunks(
+        self, buffer: WriteBuffer, keys: Iterable[str]
+    ) -> None:
+        # Drop the buffered chunks of buffered chunked values that are about to
+        # be overwritten or deleted, they were never sent.
+        for key in keys:
+            pending = buffer.get(key)
+            manifest = Manifest.parse(pending) if pending is not None else None
+            if manifest is not None:
+                for chunk_key in manifest.chunk_keys(key):
+                    buffer.discard(chunk_key)
+
+    def _post_bulk_raw(self, values: Dict[str, str]) -> None:
+        previous = self._stored_chunks(values)
+        try:
+            r = self.sess.post(self.db_url, data=values)
+            r.raise_for_status()
+        finally:
+            self._invalidate(values)
+        self._delete_chunks(previous)
+
+    def flush(self) -> None:
+        """Send every buffered write to the database in a single request.
+
+        Does nothing unless the database is in write-behind mode. If the request
+        fails the writes stay buffered and the error is raised.
+        """
+        buffer = self.write_buffer
+        if buffer is None:
+            return
+        with self._flush_lock:
+            # Cancel before draining, so writes buffered after the drain always
+            # get a flush of their own.
+            self._cancel_flush()
+            values = buffer.drain()
+            if not values:
+                return
+            sent = False
+            try:
+                self._post_bulk_raw(values)
+                sent = True
+            finally:
+                if sent:
+                    buffer.sent(values)
+                else:
+                    buffer.restore(values)
+                    self._schedule_flush(buffer.max_delay)
+
+    def _schedule_flush(self, delay: float) -> None:
+        # Held strongly, so buffered writes are sent even if the database is
+        # dropped without being closed.
+        self._flush_task = scheduler.call_later(delay, self.flush, weak=False)
+
+    def _cancel_flush(self) -> None:
+        task, self._flush_task = self._flush_task, None
+        if task is not None:
+            task.cancel()
 
     def __delitem__(self, key: str) -> None:
         """Delete a key from the database.
@@ -690,23 +1842,170 @@ class Database(abc.MutableMapping):
         Raises:
             KeyError: Key is not set
         """
-        body, content_type = encode_multipart_formdata({"key": key})
-        r = self.sess.delete(
-            self.db_url, data=body, headers={"Content-Type": content_type}
+        start = time.perf_counter()
+        previous = self._stored_chunks((key,))
+        pending = False
+        if self.write_buffer is not None:
+            # Taking the flush lock waits for an in-flight flush, so it can't
+            # write the key back after it was deleted. Later flushes no longer
+            # have the key to send, so the delete needn't hold the lock.
+            with self._flush_lock:
+                self._discard_buffered_chunks(self.write_buffer, (key,))
+                pending = self.write_buffer.discard(key)
+        try:
+            self._delete(key)
+        except KeyError:
+            if not pending:
+                raise
+        self._delete_chunks(previous)
+        if self.profiler is not None:
+            self.profiler.record(key, time.perf_counter() - start, 0)
+
+    def _stored_chunks(self, keys: Iterable[str]) -> List[str]:
+        # List the chunk keys on the server of keys about to be overwritten or
+        # deleted, when this database chunks values. Only the chunks listed
+        # before a write are deleted after it, never those of a concurrent write
+        # that replaced it. The listing doesn't flush, it runs inside flushes.
+        if self.chunking is None:
+            return []
+        keys = [k for k in keys if not is_chunk_key(k)]
+        listed = self._map_keys(
+            lambda key: list(self._iter_listing(chunk_prefix(key))), keys
+        )
+        return [chunk_key for chunk_keys in listed for chunk_key in chunk_keys]
+
+    def _delete_chunks(self, chunk_keys: List[str]) -> None:
+        self._map_keys(self._delete_chunk, chunk_keys)
+
+    def _delete_chunk(self, chunk_key: str) -> None:
+        try:
+            self._delete(chunk_key)
+        except KeyError:
+            pass
+
+    def delete_many(
+        self,
+        keys: Iterable[str],
+        concurrency: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> DeleteSummary:
+        """Delete many keys from the database in parallel.
+
+        Deletes are sent by a thread pool as large as the session's connection
+        pool, so at most that many are in flight whatever the concurrency.
+
+        Args:
+            keys (Iterable[str]): The keys to delete.
+            concurrency (Optional[int]): The maximum number of requests in flight.
+                Defaults to the size of the connection pool.
+            progress (Optional[Callable[[int, int], None]]): Called with the number
+                of keys processed so far and the total after each key.
+
+        Returns:
+            DeleteSummary: How many keys were deleted, and which were missing.
+        """
+        keys = tuple(keys)
+        missing = []
+        futures = self._map_ordered(
+            self.__delitem__, keys, concurrency or self._pool_size
         )
+        for done, (key, future) in enumerate(futures, 1):
+            try:
+                future.result()
+            except KeyError:
+                missing.append(key)
+            if progress is not None:
+                progress(done, len(keys))
+        return DeleteSummary(len(keys) - len(missing), tuple(missing))
+
+    def delete_prefix(
+        self,
+        prefix: str,
+        concurrency: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> DeleteSummary:
+        """Delete every key that begins with prefix, see `delete_many`.
+
+        Args:
+            prefix (str): The prefix the keys must start with, blank means anything.
+            concurrency (Optional[int]): The maximum number of requests in flight.
+                Defaults to the size of the connection pool.
+            progress (Optional[Callable[[int, int], None]]): Called with the number
+                of keys processed so far and the total after each key.
+
+        Returns:
+            DeleteSummary: How many keys were deleted, and which were missing.
+        """
+        return self.delete_many(
+            self.prefix(prefix), concurrency=concurrency, progress=progress
+        )
+
+    def _delete(self, key: str) -> None:
+        if self.key_index is not None:
+            self.key_index.discard(key)
+        body, content_type = encode_multipart_formdata({"key": key})
+        try:
+            r = self.sess.delete(
+                self.db_url, data=body, headers={"Content-Type": content_type}
+            )
+        finally:
+            self._invalidate((key,))
         if r.status_code == 404:
             raise KeyError(key)
 
         r.raise_for_status()
 
+    def _invalidate(self, keys: Iterable[str]) -> None:
+        # Later reads of the keys must not be answered by reads made before.
+        for key in keys:
+            if self.cache is not None:
+                self.cache.invalidate(key)
+            self._get_flights.forget(key)
+        self._list_flights.forget_all()
+
     def __iter__(self) -> Iterator[str]:
         """Return an iterator for the database."""
         return iter(self.prefix(""))
 
     def __len__(self) -> int:
         """The number of keys in the database."""
+        index = self._loaded_key_index()
+        if index is not None:
+            return len(index)
         return len(self.prefix(""))
 
+    def __contains__(self, key: object) -> bool:
+        """Whether key is in the database, see `contains`."""
+        return isinstance(key, str) and self.contains(key)
+
+    def contains(self, key: str) -> bool:
+        """Return whether key is in the database without downloading its value.
+
+        Args:
+            key (str): The key to look for.
+
+        Returns:
+            bool: Whether the key is in the database.
+        """
+        index = self._loaded_key_index()
+        if index is not None:
+            return key in index
+        if self.write_buffer is not None and key in self.write_buffer:
+            return True
+        if self.cache is not None:
+            hit, cached = self.cache.get(key)
+            if hit:
+                return cached is not None
+        # The server doesn't promise to list keys in order, so look through the
+        # whole listing of the keys that start with key.
+        return key in self.prefix(key)
+
+    def _loaded_key_index(self) -> Optional[KeyIndex]:
+        index = self.key_index
+        if index is not None and index.stale:
+            index.load(self.iter_prefix(""))
+        return index
+
     def prefix(self, prefix: str) -> Tuple[str, ...]:
         """Return all of the keys in the database that begin with the prefix.
 
@@ -716,13 +2015,80 @@ class Database(abc.MutableMapping):
         Returns:
             Tuple[str]: The keys found.
         """
-        r = self.sess.get(f"{self.db_url}", params={"prefix": prefix, "encode": "true"})
-        r.raise_for_status()
+        index = self._loaded_key_index()
+        if index is not None:
+            return index.prefix(prefix)
+        return self._list_flights.do(prefix, lambda: tuple(self.iter_prefix(prefix)))
 
-        if not r.text:
-            return tuple()
-        else:
-            return tuple(urllib.parse.unquote(k) for k in r.text.split("\n"))
+    def iter_prefix(
+        self, prefix: str = "", after: Optional[str] = None
+    ) -> Iterator[str]:
+        """Stream the keys in the database that begin with the prefix.
+
+        The listing is parsed line by line as it arrives, so memory use does not
+        grow with the number of keys. Keys are yielded in the order the server
+        lists them. This always lists the keys on the server, even if a key index
+        is used. Chunk keys are left out unless prefix starts with ``~chunk/``.
+
+        Args:
+            prefix (str): The prefix the keys must start with, blank means anything.
+            after (Optional[str]): Only yield keys listed after this one. Used to
+                resume an interrupted listing. The server can't resume listings,
+                so the keys before it are still downloaded and skipped here.
+
+        Yields:
+            str: The keys found.
+        """
+        # Buffered writes must be visible to listings.
+        self.flush()
+        yield from self._iter_listing(prefix, after)
+
+    def _iter_listing(self, prefix: str, after: Optional[str] = None) -> Iterator[str]:
+        hide_chunks = not is_chunk_key(prefix)
+        resume = _Cursor(after)
+        with self.sess.get(
+            self.db_url, params={"prefix": prefix, "encode": "true"}, stream=True
+        ) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                key = _decode_listed_key(line)
+                if key is None or resume.skip(key):
+                    continue
+                if hide_chunks and is_chunk_key(key):
+                    continue
+                yield key
+
+    def prefix_pages(
+        self, prefix: str = "", page_size: int = 1000, cursor: Optional[str] = None
+    ) -> Iterator[KeyPage]:
+        """Stream the keys that begin with the prefix in pages of bounded size.
+
+        Args:
+            prefix (str): The prefix the keys must start with, blank means anything.
+            page_size (int): The maximum number of keys in a page.
+            cursor (Optional[str]): The cursor of a previously returned page. The
+                listing resumes after it.
+
+        Returns:
+            Iterator[KeyPage]: The pages of keys found.
+        """
+        return _paginate(self.iter_prefix(prefix, after=cursor), page_size)
+
+    def namespace(self, prefix: str, key_index: Optional[KeyIndex] = None) -> Namespace:
+        """Return a mapping over the keys that start with prefix, without it.
+
+        Listing the namespace only lists its keys on the server, and stripping
+        the prefix is a slice per key.
+
+        Args:
+            prefix (str): The prefix of the namespace's keys, such as ``"users:"``.
+            key_index (Optional[KeyIndex]): An index to cache the namespace's keys
+                in. Disabled by default.
+
+        Returns:
+            Namespace: The namespace.
+        """
+        return Namespace(self, prefix, key_index)
 
     def keys(self) -> abc.KeysView[str]:
         """Returns all of the keys in the database.
@@ -753,14 +2119,19 @@ class Database(abc.MutableMapping):
         return f"<{self.__class__.__name__}(db_url=...)>"
 
     def close(self) -> None:
-        """Closes the database client connection."""
-        self.sess.close()
-        if self._refresh_timer:
-            self._refresh_timer.cancel()
-            self._refresh_timer = None
-        if self._watchdog_timer:
-            self._watchdog_timer.cancel()
-            self._watchdog_timer = None
-        if self._unbind:
-            # Permit signaling to surrounding scopes that we have closed
-            self._unbind()
+        """Flushes buffered writes and closes the database client connection."""
+        try:
+            self.flush()
+        finally:
+            self._cancel_flush()
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            self.sess.close()
+            _open_databases.pop(id(self), None)
+            if self._refresh_task is not None:
+                self._refresh_task.cancel()
+                self._refresh_task = None
+            if self._unbind:
+                # Permit signaling to surrounding scopes that we have closed
+                self._unbind()
@@ -0,0 +1,93 @@
+"""Deadlines for database requests.
+
+A deadline bounds the total time spent by every database request made in its
+scope, including retries and the backoff between them:
+
+    with db.deadline(0.2):
+        value = db["key"]
+
+Each request is given a timeout of at most the time remaining, and a retry is
+abandoned with DeadlineExceeded when its backoff would not end before the
+deadline (see replit.database.retry). Deadlines are stored in a context
+variable, so they apply to the current thread or asyncio task, and nested
+deadlines can only shorten them.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+from typing import Iterator, Optional
+
+_deadline: ContextVar[Optional[float]] = ContextVar("replit_db_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request can't be sent or retried before the deadline."""
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """Bound the time spent by database requests made in this scope.
+
+    Args:
+        seconds (float): The time allowed, from now.
+
+    Yields:
+        None: The body runs with the deadline set.
+    """
+    at = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(at if outer is None else min(outer, at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Return the seconds left before the current deadline.
+
+    Returns:
+        Optional[float]: The seconds left, negative once it passed, None if there
+            is no deadline.
+    """
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def request_timeout(timeout: Optional[float]) -> Optional[float]:
+    """Return the timeout to give a request, capped by the current deadline.
+
+    Args:
+        timeout (Optional[float]): The timeout of the database, None for none.
+
+    Returns:
+        Optional[float]: The timeout in seconds, None for no limit.
+
+    Raises:
+        DeadlineExceeded: If the deadline already passed.
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("database deadline exceeded")
+    return left if timeout is None else min(timeout, left)
+
+
+def check_backoff(wait: float) -> float:
+    """Check that a wait before sending a request ends before the deadline.
+
+    Args:
+        wait (float): The seconds to wait.
+
+    Returns:
+        float: The wait, unchanged.
+
+    Raises:
+        DeadlineExceeded: If the request couldn't be sent before the deadline.
+    """
+    left = remaining()
+    if left is not None and wait >= left:
+        raise DeadlineExceeded("database deadline exceeded before a request")
+    return wait
@@ -2,20 +2,41 @@
 
 import os
 import os.path
-from typing import Any, Optional
+from typing import Any, Optional, Tuple
 
 from .database import Database
 
+# How often the default database checks whether its URL changed, in seconds.
+REFRESH_INTERVAL = 1.0
+
+# The identity of the URL file when it was last read, and what it contained.
+_url_file_stat: Optional[Tuple[int, int, int]] = None
+_url_file_contents: Optional[str] = None
+
 
 def get_db_url() -> Optional[str]:
-    """Fetches the most up-to-date db url from the Repl environment."""
+    """Fetches the most up-to-date db url from the Repl environment.
+
+    The URL file is only read again when its inode, modification time or size
+    changed, so this is cheap enough to poll.
+
+    Returns:
+        Optional[str]: The database URL, None if the Repl has no database.
+    """
+    global _url_file_stat, _url_file_contents
     # todo look into the security warning ignored below
     tmpdir = "/tmp/replitdb"  # noqa: S108
-    if os.path.exists(tmpdir):
-        with open(tmpdir, "r") as file:
-            return file.read()
+    try:
+        st = os.stat(tmpdir)
+    except OSError:
+        return os.environ.get("REPLIT_DB_URL")
 
-    return os.environ.get("REPLIT_DB_URL")
+    stat = (st.st_ino, st.st_mtime_ns, st.st_size)
+    if stat != _url_file_stat:
+        with open(tmpdir, "r") as file:
+            _url_file_contents = file.read()
+        _url_file_stat = stat
+    return _url_file_contents
 
 
 def refresh_db() -> None:
@@ -36,7 +57,12 @@ def _get_db() -> Optional[Database]:
     db_url = get_db_url()
 
     if db_url:
-        _db = Database(db_url, get_db_url=get_db_url, unbind=_unbind)
+        _db = Database(
+            db_url,
+            get_db_url=get_db_url,
+            unbind=_unbind,
+            refresh_interval=REFRESH_INTERVAL,
+        )
     else:
         # The user will see errors if they try to use the database.
         print("Warning: error initializing database. Replit DB is not configured.")
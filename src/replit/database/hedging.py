@@ -0,0 +1,203 @@
+"""Hedged reads for AsyncDatabase.
+
+A few slow connections can dominate the tail latency of reads even when the
+server is not loaded. Pass a Hedging instance to AsyncDatabase to send a second
+copy of a get or a listing that hasn't been answered after a delay, by default
+the observed 95th percentile of read latency, and use whichever copy answers
+first. Reads are idempotent, so the slower copy is simply cancelled.
+
+A budget caps the hedges to a fraction of reads, so a slow server is not sent
+twice the load, and counters report how often the hedge won. Every read adds its
+share of the budget to a bucket that holds at most a small burst of hedges, so a
+long healthy period doesn't save up hedges for when the server gets slow. Only
+the first copy of each read is timed: a copy that is cancelled because its hedge
+won counts as taking at least until then, so hedging doesn't lower its own delay.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, TypeVar
+
+from .metrics import Histogram
+
+T = TypeVar("T")
+
+
+class Hedging:
+    """Sends a second copy of reads that are slower than usual.
+
+    Attributes:
+        delay (Optional[float]): The seconds to wait for an answer before hedging,
+            None to use the observed percentile of read latency.
+        percentile (float): The percentile of read latency to wait for when
+            delay is None.
+        budget (float): The most hedges sent, as a fraction of reads.
+        min_samples (int): The reads to observe before hedging when delay is
+            None.
+        burst (float): The most hedges that unused budget can save up for.
+    """
+
+    __slots__ = (
+        "delay",
+        "percentile",
+        "budget",
+        "min_samples",
+        "burst",
+        "_latency",
+        "_samples",
+        "_tokens",
+        "_reads",
+        "_hedges",
+        "_wins",
+        "_lock",
+    )
+
+    def __init__(
+        self,
+        delay: Optional[float] = None,
+        percentile: float = 95,
+        budget: float = 0.05,
+        min_samples: int = 100,
+        burst: float = 1,
+    ) -> None:
+        """Initialize the hedging settings.
+
+        Args:
+            delay (Optional[float]): The seconds to wait for an answer before
+                hedging. Defaults to the observed percentile of read latency.
+            percentile (float): The percentile of read latency to wait for when
+                delay is None.
+            budget (float): The most hedges sent, as a fraction of reads. The
+                default adds at most 5% more read requests.
+            min_samples (int): The reads to observe before hedging when delay is
+                None.
+            burst (float): The most hedges that unused budget can save up for,
+                sent in a row when reads get slow.
+
+        Raises:
+            ValueError: budget is not between 0 and 1, or burst is less than 1.
+        """
+        if not 0 <= budget <= 1:
+            raise ValueError("budget must be between 0 and 1")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.delay = delay
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.burst = burst
+        self._latency = Histogram()
+        self._samples = 0
+        self._tokens = 0.0
+        self._reads = 0
+        self._hedges = 0
+        self._wins = 0
+        self._lock = threading.Lock()
+
+    @property
+    def reads(self) -> int:
+        """How many reads were made."""
+        return self._reads
+
+    @property
+    def hedges(self) -> int:
+        """How many reads were hedged."""
+        return self._hedges
+
+    @property
+    def wins(self) -> int:
+        """How many hedges were answered before the read they duplicated."""
+        return self._wins
+
+    def hedge_delay(self) -> Optional[float]:
+        """Return how long to wait for a read before hedging it.
+
+        Returns:
+            Optional[float]: The delay in seconds, None to not hedge yet.
+        """
+        if self.delay is not None:
+            return self.delay
+        if self._samples < self.min_samples:
+            return None
+        return self._latency.percentile(self.percentile)
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            self._hedges += 1
+            return True
+
+    def _observe(self, seconds: float) -> None:
+        with self._lock:
+            self._latency.add(seconds)
+            self._samples += 1
+
+    async def run(self, read: Callable[[], Awaitable[T]]) -> T:
+        """Make a read, hedging it if it is slower than the hedge delay.
+
+        If every copy fails, the error of the first copy is raised.
+
+        Args:
+            read (Callable[[], Awaitable[T]]): Makes one copy of the read.
+
+        Returns:
+            T: The result of the first copy to succeed.
+        """
+        with self._lock:
+            self._reads += 1
+            self._tokens = min(self._tokens + self.budget, self.burst)
+        delay = self.hedge_delay()
+        start = time.perf_counter()
+        first = asyncio.ensure_future(read())
+        pending: Set["asyncio.Future[T]"] = {first}
+        try:
+            if delay is not None:
+                await asyncio.wait(pending, timeout=delay)
+            if first.done() or delay is None or not self._take_budget():
+                return await first
+            second = asyncio.ensure_future(read())
+            pending.add(second)
+            while True:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            with self._lock:
+                                self._wins += 1
+                        return task.result()
+                if not pending:
+                    return first.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            # Only the first copy feeds the latency estimate, or every hedge that
+            # wins would drag it down. A first copy that is cancelled is recorded
+            # at the time it was cancelled, a lower bound of its latency.
+            if not first.done() or first.cancelled() or first.exception() is None:
+                self._observe(time.perf_counter() - start)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the hedging counters.
+
+        Returns:
+            Dict[str, Any]: The reads, hedges and wins counted, and the current
+                hedge delay in seconds.
+        """
+        return {
+            "reads": self._reads,
+            "hedges": self._hedges,
+            "wins": self._wins,
+            "delay": self.hedge_delay(),
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__}(delay={self.delay}, "
+            f"percentile={self.percentile}, budget={self.budget}, "
+            f"burst={self.burst})>"
+        )
@@ -0,0 +1,117 @@
+"""An in-memory index of the keys in a database."""
+
+import bisect
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+
+class KeyIndex:
+    """A sorted, in-memory copy of the keys in a database.
+
+    Pass an instance to Database to answer `len`, iteration, `prefix` and `in`
+    from memory. The index is loaded from a single listing the first time it is
+    needed and is kept up to date by writes and deletes made through that
+    database. Keys written by other processes show up when the index is reloaded,
+    either every `refresh_interval` seconds or after `invalidate` is called.
+
+    Attributes:
+        refresh_interval (Optional[float]): Reload the index from the database
+            when it is older than this many seconds. None never reloads it.
+    """
+
+    __slots__ = ("refresh_interval", "_keys", "_loaded_at", "_lock")
+
+    def __init__(self, refresh_interval: Optional[float] = None) -> None:
+        """Initialize an empty index.
+
+        Args:
+            refresh_interval (Optional[float]): Reload the index from the database
+                when it is older than this many seconds. Defaults to never.
+        """
+        self.refresh_interval = refresh_interval
+        self._keys: List[str] = []
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def stale(self) -> bool:
+        """Whether the index needs to be loaded from the database."""
+        if self._loaded_at is None:
+            return True
+        if self.refresh_interval is None:
+            return False
+        return time.monotonic() - self._loaded_at > self.refresh_interval
+
+    def load(self, keys: Iterable[str]) -> None:
+        """Replace the contents of the index.
+
+        Args:
+            keys (Iterable[str]): Every key in the database.
+        """
+        loaded = sorted(keys)
+        with self._lock:
+            self._keys = loaded
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        """Mark the index to be reloaded the next time it is used."""
+        with self._lock:
+            self._loaded_at = None
+
+    def add(self, keys: Iterable[str]) -> None:
+        """Add keys that were written to the database.
+
+        Args:
+            keys (Iterable[str]): The keys to add.
+        """
+        with self._lock:
+            for key in keys:
+                i = bisect.bisect_left(self._keys, key)
+                if i == len(self._keys) or self._keys[i] != key:
+                    self._keys.insert(i, key)
+
+    def discard(self, key: str) -> None:
+        """Remove a key that was deleted from the database.
+
+        Args:
+            key (str): The key to remove.
+        """
+        with self._lock:
+            i = bisect.bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                del self._keys[i]
+
+    def prefix(self, prefix: str) -> Tuple[str, ...]:
+        """Return the keys that begin with the prefix, in sorted order.
+
+        Args:
+            prefix (str): The prefix the keys must start with, blank means anything.
+
+        Returns:
+            Tuple[str, ...]: The keys found.
+        """
+        with self._lock:
+            if not prefix:
+                return tuple(self._keys)
+            start = bisect.bisect_left(self._keys, prefix)
+            end = start
+            while end < len(self._keys) and self._keys[end].startswith(prefix):
+                end += 1
+            return tuple(self._keys[start:end])
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, str):
+            return False
+        with self._lock:
+            i = bisect.bisect_left(self._keys, key)
+            return i < len(self._keys) and self._keys[i] == key
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__}(keys={len(self)}, "
+            f"refresh_interval={self.refresh_interval})>"
+        )
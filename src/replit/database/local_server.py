@@ -0,0 +1,446 @@
+"""A local stand-in for the Replit DB HTTP service.
+
+The server speaks the same protocol as the real service, so Database and
+AsyncDatabase can be pointed at it to test, benchmark and load-test offline:
+
+- ``POST /`` with form-encoded key-value pairs sets them.
+- ``GET /<quoted key>`` returns a value, or 404.
+- ``DELETE /`` with a multipart ``key`` field, or ``DELETE /<quoted key>``,
+  deletes a key, or returns 404.
+- ``GET /?prefix=<prefix>&encode=true`` lists the keys that start with prefix,
+  one per line, in sorted order. Keys are quoted if ``encode`` is given.
+
+Values are kept in memory or in an SQLite file, and latency, jitter, server
+errors and throttling can be injected to measure retry behavior.
+"""
+
+import abc
+import random
+import sqlite3
+import threading
+import time
+from types import TracebackType
+from typing import Any, Dict, Iterable, List, Optional, Type
+from urllib.parse import quote
+
+from flask import Blueprint, Flask, request, Response
+from werkzeug.routing import PathConverter
+from werkzeug.serving import BaseWSGIServer, make_server, WSGIRequestHandler
+
+
+class Storage(abc.ABC):
+    """Where a local database server keeps its keys and values.
+
+    Subclasses must implement get, set_many, delete and keys, and be safe to use
+    from several threads at once.
+    """
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """Return the value of key, or None if it is not set.
+
+        Args:
+            key (str): The key to look up.
+        """
+
+    @abc.abstractmethod
+    def set_many(self, values: Dict[str, str]) -> None:
+        """Set several keys at once.
+
+        Args:
+            values (Dict[str, str]): The key-value pairs to set.
+        """
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> bool:
+        """Delete a key, returning whether it was set.
+
+        Args:
+            key (str): The key to delete.
+        """
+
+    @abc.abstractmethod
+    def keys(self, prefix: str) -> List[str]:
+        """Return the keys that start with prefix, in sorted order.
+
+        Args:
+            prefix (str): The prefix the keys must start with, blank means anything.
+        """
+
+    def close(self) -> None:  # noqa: B027
+        """Release any resources held by the storage. Does nothing by default."""
+
+
+class MemoryStorage(Storage):
+    """Keeps keys and values in a dictionary, lost when the process exits."""
+
+    def __init__(self) -> None:
+        """Initialize an empty storage."""
+        self._data: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the value of key, or None if it is not set."""
+        return self._data.get(key)
+
+    def set_many(self, values: Dict[str, str]) -> None:
+        """Set several keys at once."""
+        with self._lock:
+            self._data.update(values)
+
+    def delete(self, key: str) -> bool:
+        """Delete a key, returning whether it was set."""
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def keys(self, prefix: str) -> List[str]:
+        """Return the keys that start with prefix, in sorted order."""
+        with self._lock:
+            return sorted(k for k in self._data if k.startswith(prefix))
+
+
+class SQLiteStorage(Storage):
+    """Keeps keys and values in an SQLite database file.
+
+    Attributes:
+        path (str): The path of the database file.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open or create the database file.
+
+        Args:
+            path (str): The path of the database file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT)"
+            )
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the value of key, or None if it is not set."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE key = ?", (key,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def set_many(self, values: Dict[str, str]) -> None:
+        """Set several keys at once, in a single transaction."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", values.items()
+            )
+
+    def delete(self, key: str) -> bool:
+        """Delete a key, returning whether it was set."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+        return cursor.rowcount > 0
+
+    def keys(self, prefix: str) -> List[str]:
+        """Return the keys that start with prefix, in sorted order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM kv WHERE key >= ? ORDER BY key", (prefix,)
+            )
+            return list(_take_prefixed((row[0] for row in rows), prefix))
+
+    def close(self) -> None:
+        """Close the database file."""
+        with self._lock:
+            self._conn.close()
+
+
+def _take_prefixed(keys: Iterable[str], prefix: str) -> Iterable[str]:
+    # Yield sorted keys until one no longer starts with prefix.
+    for key in keys:
+        if not key.startswith(prefix):
+            return
+        yield key
+
+
+class Faults:
+    """Latency and errors injected into every request to a local server.
+
+    Attributes:
+        latency (float): Seconds to wait before answering each request.
+        jitter (float): Up to this many seconds are randomly added to or removed
+            from the latency.
+        error_rate (float): The fraction of requests answered with error_status.
+        error_status (int): The status code of injected server errors.
+        throttle_rate (float): The fraction of requests answered with 429.
+        retry_after (Optional[float]): The Retry-After header of throttled
+            responses, in seconds. None leaves it out.
+        injected (Dict[int, int]): How many failures were injected, by status.
+    """
+
+    __slots__ = (
+        "latency",
+        "jitter",
+        "error_rate",
+        "error_status",
+        "throttle_rate",
+        "retry_after",
+        "injected",
+        "_random",
+        "_lock",
+    )
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        throttle_rate: float = 0.0,
+        retry_after: Optional[float] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        """Initialize the faults.
+
+        Args:
+            latency (float): Seconds to wait before answering each request.
+            jitter (float): Up to this many seconds are randomly added to or
+                removed from the latency.
+            error_rate (float): The fraction of requests answered with
+                error_status.
+            error_status (int): The status code of injected server errors.
+            throttle_rate (float): The fraction of requests answered with 429.
+            retry_after (Optional[float]): The Retry-After header of throttled
+                responses, in seconds. None leaves it out.
+            seed (Optional[int]): Seed for the random choices, to make runs
+                reproducible.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.injected: Dict[int, int] = {}
+        self._random = random.Random(seed)  # noqa: S311
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        """Return how long to wait before answering the next request."""
+        if not self.jitter:
+            return self.latency
+        with self._lock:
+            offset = self._random.uniform(-self.jitter, self.jitter)
+        return max(0.0, self.latency + offset)
+
+    def status(self) -> Optional[int]:
+        """Return the status to fail the next request with, or None."""
+        if not self.error_rate and not self.throttle_rate:
+            return None
+        with self._lock:
+            roll = self._random.random()
+            if roll < self.throttle_rate:
+                status = 429
+            elif roll < self.throttle_rate + self.error_rate:
+                status = self.error_status
+            else:
+                return None
+            self.injected[status] = self.injected.get(status, 0) + 1
+        return status
+
+    def __repr__(self) -> str:
+        return (
+            f"{type(self).__name__}(latency={self.latency}, jitter={self.jitter}, "
+            f"error_rate={self.error_rate}, throttle_rate={self.throttle_rate})"
+        )
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    # Don't log every request, it would dominate benchmarks.
+    def log_request(self, code: Any = "-", size: Any = "-") -> None:
+        pass
+
+
+class _KeyConverter(PathConverter):
+    # Keys may contain slashes and newlines.
+    regex = "(?s:.+)"
+    part_isolating = False
+
+
+def make_local_database_blueprint(
+    storage: Storage, faults: Optional[Faults] = None
+) -> Blueprint:
+    """Generates a blueprint that serves a database from local storage.
+
+    Args:
+        storage (Storage): Where keys and values are kept.
+        faults (Optional[Faults]): Latency and errors to inject into requests.
+
+    Returns:
+        Blueprint: A flask blueprint with the database logic.
+    """
+    app = Blueprint("local_database", __name__)
+
+    @app.record_once
+    def register_converter(state: Any) -> None:
+        state.app.url_map.converters["db_key"] = _KeyConverter
+
+    @app.before_request
+    def inject_faults() -> Any:
+        if faults is None:
+            return None
+        delay = faults.delay()
+        if delay:
+            time.sleep(delay)
+        status = faults.status()
+        if status is None:
+            return None
+        response = Response("Injected failure", status=status)
+        if status == 429 and faults.retry_after is not None:
+            response.headers["Retry-After"] = str(faults.retry_after)
+        return response
+
+    @app.route("/", methods=["GET", "POST", "DELETE"])
+    def index() -> Any:
+        if request.method == "POST":
+            storage.set_many(request.form.to_dict())
+            return ""
+        if request.method == "DELETE":
+            return delete_key(request.form.get("key", ""))
+        keys = storage.keys(request.args.get("prefix", ""))
+        if "encode" in request.args:
+            return "\n".join(quote(k) for k in keys)
+        return "\n".join(keys)
+
+    def delete_key(key: str) -> Any:
+        if not storage.delete(key):
+            return "", 404
+        return ""
+
+    @app.route("/<db_key:key>", methods=["GET", "DELETE"])
+    def manage_key(key: str) -> Any:
+        if request.method == "DELETE":
+            return delete_key(key)
+        value = storage.get(key)
+        if value is None:
+            return "", 404
+        return value
+
+    return app
+
+
+class LocalDatabaseServer:
+    """Serves a local database from a background thread.
+
+    Use it as a context manager, or call `start` and `stop`::
+
+        with LocalDatabaseServer(faults=Faults(latency=0.01)) as server:
+            db = Database(server.url)
+
+    Attributes:
+        storage (Storage): Where keys and values are kept.
+        faults (Optional[Faults]): Latency and errors injected into requests.
+        host (str): The interface to listen on.
+        port (int): The port to listen on, 0 picks a free one when started.
+    """
+
+    def __init__(
+        self,
+        storage: Optional[Storage] = None,
+        faults: Optional[Faults] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        """Initialize the server without starting it.
+
+        Args:
+            storage (Optional[Storage]): Where keys and values are kept. Defaults
+                to a new MemoryStorage.
+            faults (Optional[Faults]): Latency and errors to inject into requests.
+            host (str): The interface to listen on.
+            port (int): The port to listen on, 0 picks a free one when started.
+        """
+        self.storage = storage if storage is not None else MemoryStorage()
+        self.faults = faults
+        self.host = host
+        self.port = port
+        self._server: Optional[BaseWSGIServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """The URL to pass to Database or AsyncDatabase."""
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> str:
+        """Start serving in a daemon thread.
+
+        Returns:
+            str: The URL of the database.
+        """
+        app = Flask(__name__, static_folder=None)
+        app.register_blueprint(make_local_database_blueprint(self.storage, self.faults))
+        self._server = make_server(
+            self.host,
+            self.port,
+            app,
+            threaded=True,
+            request_handler=_QuietRequestHandler,
+        )
+        self.port = self._server.server_port
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="replit-local-db", daemon=True
+        )
+        self._thread.start()
+        return self.url
+
+    def stop(self) -> None:
+        """Stop serving and close the storage."""
+        server, self._server = self._server, None
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.storage.close()
+
+    def __enter__(self) -> "LocalDatabaseServer":
+        self.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.stop()
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__}(url={self.url!r}, faults={self.faults})>"
+
+
+def start_local_database(
+    path: Optional[str] = None,
+    faults: Optional[Faults] = None,
+    host: str = "127.0.0.1",
+    port: int = 8080,
+) -> None:
+    """Serves a local database until interrupted.
+
+    Args:
+        path (Optional[str]): An SQLite file to keep the data in. Data is kept in
+            memory if not given.
+        faults (Optional[Faults]): Latency and errors to inject into requests.
+        host (str): The interface to listen on.
+        port (int): The port to listen on.
+    """
+    storage = SQLiteStorage(path) if path is not None else MemoryStorage()
+    app = Flask(__name__, static_folder=None)
+    app.register_blueprint(make_local_database_blueprint(storage, faults))
+    try:
+        app.run(host=host, port=port, threaded=True)
+    finally:
+        storage.close()
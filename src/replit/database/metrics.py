@@ -0,0 +1,421 @@
+"""Request metrics for database clients.
+
+Pass a Metrics instance to Database or AsyncDatabase to count the HTTP requests
+they make. Requests are observed through the HTTP libraries' own hooks (a
+requests response hook and urllib3 retry counting for Database, an aiohttp trace
+config for AsyncDatabase), so the cost is a few counter updates per request.
+
+Database records each call once, including time spent retrying in urllib3.
+AsyncDatabase records every attempt, since aiohttp_retry retries above aiohttp.
+"""
+
+import bisect
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import aiohttp
+from requests import Response
+from requests.adapters import Retry
+
+from .scheduler import ScheduledTask, scheduler
+
+OPERATIONS = ("get", "set", "delete", "list")
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def operation(method: str, listing: bool) -> str:
+    """Return the database operation of an HTTP request.
+
+    Args:
+        method (str): The HTTP method.
+        listing (bool): Whether the request has a query string, which only
+            listings do.
+
+    Returns:
+        str: One of "get", "set", "delete" or "list".
+    """
+    if method == "POST":
+        return "set"
+    if method == "DELETE":
+        return "delete"
+    return "list" if listing else "get"
+
+
+class Histogram:
+    """A latency histogram with fixed buckets.
+
+    Attributes:
+        bounds (List[float]): The upper bounds of the buckets, in seconds. A last
+            bucket holds everything slower.
+        counts (List[int]): The number of samples in each bucket.
+        total (float): The sum of all samples, in seconds.
+    """
+
+    __slots__ = ("bounds", "counts", "total")
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS) -> None:
+        """Initialize an empty histogram.
+
+        Args:
+            bounds (Sequence[float]): The upper bounds of the buckets, in seconds.
+        """
+        self.bounds: List[float] = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+
+    def add(self, seconds: float) -> None:
+        """Record a sample.
+
+        Args:
+            seconds (float): The latency to record.
+        """
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.total += seconds
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Estimate a percentile as the upper bound of the bucket it falls in.
+
+        Args:
+            p (float): The percentile, between 0 and 100.
+
+        Returns:
+            Optional[float]: The estimate in seconds, None if there are no samples
+                or it falls in the last, unbounded bucket.
+        """
+        count = sum(self.counts)
+        if not count:
+            return None
+        rank = p / 100 * count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts, strict=False):
+            seen += n
+            if seen >= rank:
+                return bound
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the histogram as a dictionary.
+
+        Returns:
+            Dict[str, Any]: The bucket bounds and counts, the sample count and sum,
+                and estimated p50, p95 and p99 in seconds.
+        """
+        return {
+            "bounds": list(self.bounds),
+            "counts": list(self.counts),
+            "count": sum(self.counts),
+            "sum": self.total,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class _OperationStats:
+    __slots__ = ("requests", "errors", "not_found", "latency")
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.not_found = 0
+        self.latency = Histogram()
+
+
+class Metrics:
+    """Counters and latency histograms of the requests made by database clients.
+
+    One instance can be shared by several clients. Take a `snapshot` at any time,
+    or give an exporter to have snapshots pushed to it, either when `export` is
+    called or every `export_interval` seconds.
+
+    Attributes:
+        exporter (Optional[Callable[[Dict[str, Any]], None]]): Called with a
+            snapshot on every export.
+        export_interval (Optional[float]): Export every this many seconds, on the
+            shared scheduler thread, starting with the first request. None only
+            exports when `export` is called.
+    """
+
+    __slots__ = (
+        "exporter",
+        "export_interval",
+        "_ops",
+        "_retries",
+        "_bytes_sent",
+        "_bytes_received",
+        "_lock",
+        "_task",
+        "_closed",
+        "__weakref__",
+    )
+
+    def __init__(
+        self,
+        exporter: Optional[Callable[[Dict[str, Any]], None]] = None,
+        export_interval: Optional[float] = None,
+    ) -> None:
+        """Initialize empty metrics.
+
+        Args:
+            exporter (Optional[Callable[[Dict[str, Any]], None]]): Called with a
+                snapshot on every export.
+            export_interval (Optional[float]): Export every this many seconds.
+                Defaults to only exporting when `export` is called.
+        """
+        self.exporter = exporter
+        self.export_interval = export_interval
+        self._lock = threading.Lock()
+        self._ops = {op: _OperationStats() for op in OPERATIONS}
+        self._retries = 0
+        self._bytes_sent = 0
+        self._bytes_received = 0
+        self._task: Optional[ScheduledTask] = None
+        self._closed = False
+
+    def record(
+        self,
+        op: str,
+        seconds: float,
+        status: Optional[int],
+        sent: int = 0,
+        received: int = 0,
+    ) -> None:
+        """Record a finished request.
+
+        Args:
+            op (str): The operation, one of "get", "set", "delete" or "list".
+            seconds (float): How long the request took.
+            status (Optional[int]): The response status, None if the request
+                failed without a response.
+            sent (int): The size of the request body in bytes.
+            received (int): The size of the response body in bytes.
+        """
+        with self._lock:
+            stats = self._ops[op]
+            stats.requests += 1
+            stats.latency.add(seconds)
+            if status == 404:
+                stats.not_found += 1
+            elif status is None or status >= 400:
+                stats.errors += 1
+            self._bytes_sent += sent
+            self._bytes_received += received
+            if self._task is None and self.export_interval and not self._closed:
+                self._task = scheduler.call_every(self.export_interval, self.export)
+
+    def record_retry(self) -> None:
+        """Record that a request is being retried."""
+        with self._lock:
+            self._retries += 1
+
+    def record_bytes(self, sent: int = 0, received: int = 0) -> None:
+        """Record bytes transferred outside of `record`.
+
+        Args:
+            sent (int): Request body bytes.
+            received (int): Response body bytes.
+        """
+        with self._lock:
+            self._bytes_sent += sent
+            self._bytes_received += received
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the current metrics.
+
+        Returns:
+            Dict[str, Any]: Requests, errors, 404s and a latency histogram per
+                operation, and the total retries and bytes sent and received.
+        """
+        with self._lock:
+            return {
+                "ops": {
+                    op: {
+                        "requests": stats.requests,
+                        "errors": stats.errors,
+                        "not_found": stats.not_found,
+                        "latency": stats.latency.snapshot(),
+                    }
+                    for op, stats in self._ops.items()
+                },
+                "retries": self._retries,
+                "bytes_sent": self._bytes_sent,
+                "bytes_received": self._bytes_received,
+            }
+
+    def reset(self) -> None:
+        """Set every counter back to zero."""
+        with self._lock:
+            self._ops = {op: _OperationStats() for op in OPERATIONS}
+            self._retries = 0
+            self._bytes_sent = 0
+            self._bytes_received = 0
+
+    def export(self) -> Dict[str, Any]:
+        """Push a snapshot to the exporter, if there is one.
+
+        Returns:
+            Dict[str, Any]: The snapshot.
+        """
+        snapshot = self.snapshot()
+        if self.exporter is not None:
+            self.exporter(snapshot)
+        return snapshot
+
+    def close(self) -> None:
+        """Stop exporting periodically."""
+        with self._lock:
+            self._closed = True
+            task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+
+    def requests_hook(self, r: Response, *args: Any, **kwargs: Any) -> Response:
+        """Record a response, as a requests response hook.
+
+        Args:
+            r (Response): The response.
+            *args (Any): Ignored.
+            **kwargs (Any): The arguments the request was sent with.
+
+        Returns:
+            Response: The response, unchanged.
+        """
+        request = r.request
+        body = request.body
+        if kwargs.get("stream"):
+            received = int(r.headers.get("Content-Length", 0))
+        else:
+            received = len(r.content)
+        self.record(
+            operation(request.method or "GET", "?" in (request.url or "")),
+            r.elapsed.total_seconds(),
+            r.status_code,
+            len(body) if body else 0,
+            received,
+        )
+        return r
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """Return an aiohttp trace config that records requests to these metrics.
+
+        Returns:
+            aiohttp.TraceConfig: The trace config, to pass to a ClientSession.
+        """
+        trace = aiohttp.TraceConfig()
+        # aiohttp's annotations of the signal lists don't accept plain callbacks.
+        signals: Any = (
+            (trace.on_request_start, self._on_request_start),
+            (trace.on_request_end, self._on_request_end),
+            (trace.on_request_exception, self._on_request_exception),
+            (trace.on_request_chunk_sent, self._on_request_chunk_sent),
+            (trace.on_response_chunk_received, self._on_response_chunk_received),
+        )
+        for signal, callback in signals:
+            signal.append(callback)
+        return trace
+
+    async def _on_request_start(
+        self,
+        session: aiohttp.ClientSession,
+        ctx: SimpleNamespace,
+        params: aiohttp.TraceRequestStartParams,
+    ) -> None:
+        ctx.start = time.perf_counter()
+        attempt = (ctx.trace_request_ctx or {}).get("current_attempt", 1)
+        if attempt > 1:
+            self.record_retry()
+
+    async def _on_request_end(
+        self,
+        session: aiohttp.ClientSession,
+        ctx: SimpleNamespace,
+        params: aiohttp.TraceRequestEndParams,
+    ) -> None:
+        self.record(
+            operation(params.method, bool(params.url.query_string)),
+            time.perf_counter() - ctx.start,
+            params.response.status,
+        )
+
+    async def _on_request_exception(
+        self,
+        session: aiohttp.ClientSession,
+        ctx: SimpleNamespace,
+        params: aiohttp.TraceRequestExceptionParams,
+    ) -> None:
+        self.record(
+            operation(params.method, bool(params.url.query_string)),
+            time.perf_counter() - ctx.start,
+            None,
+        )
+
+    async def _on_request_chunk_sent(
+        self,
+        session: aiohttp.ClientSession,
+        ctx: SimpleNamespace,
+        params: aiohttp.TraceRequestChunkSentParams,
+    ) -> None:
+        self.record_bytes(sent=len(params.chunk))
+
+    async def _on_response_chunk_received(
+        self,
+        session: aiohttp.ClientSession,
+        ctx: SimpleNamespace,
+        params: aiohttp.TraceResponseChunkReceivedParams,
+    ) -> None:
+        self.record_bytes(received=len(params.chunk))
+
+    def __repr__(self) -> str:
+        requests = sum(stats.requests for stats in self._ops.values())
+        return (
+            f"<{self.__class__.__name__}(requests={requests}, "
+            f"retries={self._retries})>"
+        )
+
+
+class CountingRetry(Retry):
+    """A urllib3 Retry that counts the retries it allows in a Metrics."""
+
+    def __init__(
+        self, *args: Any, metrics: Optional[Metrics] = None, **kwargs: Any
+    ) -> None:
+        """Initialize the retry configuration.
+
+        Args:
+            *args (Any): Passed to Retry.
+            metrics (Optional[Metrics]): The metrics to count retries in.
+            **kwargs (Any): Passed to Retry.
+        """
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics
+
+    def new(self, **kw: Any) -> "CountingRetry":
+        """Return a copy with updated counts, see Retry.new."""
+        retry = super().new(**kw)
+        retry.metrics = self.metrics
+        return retry
+
+    def increment(self, *args: Any, **kwargs: Any) -> "CountingRetry":
+        """Count a retry that is allowed, see Retry.increment."""
+        retry = super().increment(*args, **kwargs)
+        if self.metrics is not None:
+            self.metrics.record_retry()
+        return retry
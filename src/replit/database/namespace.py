@@ -0,0 +1,147 @@
+"""Views of the keys of a database that share a prefix."""
+
+from collections import abc
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple, TYPE_CHECKING
+
+from .index import KeyIndex
+
+if TYPE_CHECKING:
+    from .database import Database
+
+
+class Namespace(abc.MutableMapping):
+    """A mapping over the keys of a Database that start with a prefix.
+
+    Keys are given without the prefix. Iterating and `len` use a listing of the
+    prefix on the server, so they cost as much as the namespace's keys, not the
+    whole database's. Usually created with `Database.namespace`.
+
+    Attributes:
+        db (Database): The database the keys are stored in.
+        prefix (str): The prefix of the keys in the database.
+        key_index (Optional[KeyIndex]): An index of the namespace's keys, without
+            the prefix, to answer `len`, iteration and `in` from memory.
+    """
+
+    __slots__ = ("db", "prefix", "key_index")
+
+    def __init__(
+        self, db: "Database", prefix: str, key_index: Optional[KeyIndex] = None
+    ) -> None:
+        """Initialize the view.
+
+        Args:
+            db (Database): The database the keys are stored in.
+            prefix (str): The prefix of the keys in the database.
+            key_index (Optional[KeyIndex]): An index to load the namespace's keys
+                into the first time they are listed, and keep up to date with
+                writes and deletes made through this view. Disabled by default.
+        """
+        self.db = db
+        self.prefix = prefix
+        self.key_index = key_index
+
+    def __getitem__(self, key: str) -> Any:
+        return self.db[self.prefix + key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the value for key if it is in the namespace, else default.
+
+        Args:
+            key (str): The key, without the prefix.
+            default (Any): The value to return if the key is not in the namespace.
+
+        Returns:
+            Any: The value, see `Database.get`.
+        """
+        return self.db.get(self.prefix + key, default)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Get the values of many keys in parallel, see `Database.get_many`.
+
+        Args:
+            keys (Iterable[str]): The keys, without the prefix.
+
+        Returns:
+            Dict[str, Any]: The values found, by key without the prefix.
+        """
+        n = len(self.prefix)
+        values = self.db.get_many(self.prefix + key for key in keys)
+        return {key[n:]: value for key, value in values.items()}
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.db[self.prefix + key] = value
+        if self.key_index is not None:
+            self.key_index.add((key,))
+
+    def set_bulk(self, values: Dict[str, Any]) -> None:
+        """Set many keys in a single request, see `Database.set_bulk`.
+
+        Args:
+            values (Dict[str, Any]): The values, by key without the prefix.
+        """
+        self.db.set_bulk({self.prefix + key: value for key, value in values.items()})
+        if self.key_index is not None:
+            self.key_index.add(values)
+
+    def __delitem__(self, key: str) -> None:
+        try:
+            del self.db[self.prefix + key]
+        finally:
+            if self.key_index is not None:
+                self.key_index.discard(key)
+
+    def clear(self) -> None:
+        """Delete every key in the namespace, in parallel."""
+        self.db.delete_many(self.prefix + key for key in self._keys())
+        if self.key_index is not None:
+            self.key_index.load(())
+
+    def _keys(self) -> Tuple[str, ...]:
+        index = self.key_index
+        if index is None or index.stale:
+            n = len(self.prefix)
+            keys = tuple(key[n:] for key in self.db.prefix(self.prefix))
+            if index is None:
+                return keys
+            index.load(keys)
+        return index.prefix("")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys())
+
+    def __len__(self) -> int:
+        return len(self._keys())
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, str):
+            return False
+        index = self.key_index
+        if index is not None and not index.stale:
+            return key in index
+        return self.db.contains(self.prefix + key)
+
+    def keys(self) -> abc.KeysView[str]:
+        """Returns the keys in the namespace, without the prefix.
+
+        Returns:
+            KeysView[str]: The keys.
+        """
+        return abc.KeysView(self)
+
+    def namespace(
+        self, prefix: str, key_index: Optional[KeyIndex] = None
+    ) -> "Namespace":
+        """Return a view of the keys of this namespace that start with prefix.
+
+        Args:
+            prefix (str): The prefix, appended to this namespace's.
+            key_index (Optional[KeyIndex]): An index of the nested namespace's keys.
+
+        Returns:
+            Namespace: The nested namespace.
+        """
+        return Namespace(self.db, self.prefix + prefix, key_index)
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__}(prefix={self.prefix!r})>"
@@ -0,0 +1,142 @@
+"""Connection pools for AsyncDatabase.
+
+By default every AsyncDatabase opens its own aiohttp session with aiohttp's
+default connector. Pass a ConnectionPool to tune the connector, and pass the same
+pool to several databases to share its connections between them, which keeps the
+number of sockets down in services that talk to many databases.
+"""
+
+from typing import Any, Optional
+
+import aiohttp
+
+from .metrics import Metrics
+
+
+class ConnectionPool:
+    """An aiohttp session with a tunable connector, shareable between databases.
+
+    The session is created by the first database that uses the pool, and is bound
+    to the event loop running at that time. Databases don't close a pool they are
+    given: close it with `close`, or use it as an async context manager.
+
+    Attributes:
+        limit (int): The maximum number of open connections, 0 for no limit.
+        limit_per_host (int): The maximum number of open connections to one
+            host, 0 for no limit.
+        keepalive_timeout (float): Seconds an idle connection is kept open.
+        dns_cache_ttl (Optional[int]): Seconds DNS lookups are cached, None to
+            cache them forever.
+        use_dns_cache (bool): Whether to cache DNS lookups at all.
+        total_timeout (Optional[float]): Seconds each request may take, None for
+            no limit.
+        connect_timeout (Optional[float]): Seconds opening a connection may take.
+        read_timeout (Optional[float]): Seconds between reads of a response.
+        metrics (Optional[Metrics]): Records the requests of every database using
+            the pool.
+    """
+
+    __slots__ = (
+        "limit",
+        "limit_per_host",
+        "keepalive_timeout",
+        "dns_cache_ttl",
+        "use_dns_cache",
+        "total_timeout",
+        "connect_timeout",
+        "read_timeout",
+        "metrics",
+        "_session",
+    )
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 0,
+        keepalive_timeout: float = 15.0,
+        dns_cache_ttl: Optional[int] = 10,
+        use_dns_cache: bool = True,
+        total_timeout: Optional[float] = 300.0,
+        connect_timeout: Optional[float] = 30.0,
+        read_timeout: Optional[float] = None,
+        metrics: Optional[Metrics] = None,
+    ) -> None:
+        """Initialize the pool. The defaults are aiohttp's.
+
+        Args:
+            limit (int): The maximum number of open connections, 0 for no limit.
+            limit_per_host (int): The maximum number of open connections to one
+                host, 0 for no limit.
+            keepalive_timeout (float): Seconds an idle connection is kept open.
+            dns_cache_ttl (Optional[int]): Seconds DNS lookups are cached, None to
+                cache them forever.
+            use_dns_cache (bool): Whether to cache DNS lookups at all.
+            total_timeout (Optional[float]): Seconds each request may take, None
+                for no limit. Retries by the database are separate requests.
+            connect_timeout (Optional[float]): Seconds opening a connection may
+                take, None for no limit.
+            read_timeout (Optional[float]): Seconds between reads of a response,
+                None for no limit.
+            metrics (Optional[Metrics]): Record the requests of every database
+                using the pool.
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.use_dns_cache = use_dns_cache
+        self.total_timeout = total_timeout
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.metrics = metrics
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def session(self) -> aiohttp.ClientSession:
+        """Return the pool's session, creating it if needed.
+
+        Returns:
+            aiohttp.ClientSession: The session.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=self.use_dns_cache,
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=self.total_timeout,
+                sock_connect=self.connect_timeout,
+                sock_read=self.read_timeout,
+            )
+            metrics = self.metrics
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                trace_configs=[metrics.trace_config()] if metrics is not None else None,
+            )
+        return self._session
+
+    @property
+    def closed(self) -> bool:
+        """Whether the pool has no open session."""
+        return self._session is None or self._session.closed
+
+    async def close(self) -> None:
+        """Close the session and all of its connections."""
+        session, self._session = self._session, None
+        if session is not None:
+            await session.close()
+
+    async def __aenter__(self) -> "ConnectionPool":
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        await self.close()
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__}(limit={self.limit}, "
+            f"limit_per_host={self.limit_per_host}, closed={self.closed})>"
+        )
@@ -0,0 +1,230 @@
+"""Find hot keys and large values in database traffic.
+
+Pass a KeyProfiler to Database or AsyncDatabase to track which keys are read
+and written most often, transfer the most bytes and take the most time. Memory
+stays bounded by counting with the space-saving algorithm, which keeps a fixed
+number of counters and reports every key whose true count is above the smallest
+counter. Reports can be printed from code, or saved with `KeyProfiler.save` and
+printed with ``replit profile-report``.
+"""
+
+import heapq
+import json
+import random
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class SpaceSaving:
+    """Approximate top-N weighted counts over a stream, in bounded memory.
+
+    Estimates never undercount. A key's estimate exceeds its true count by at most
+    its reported error.
+
+    Attributes:
+        capacity (int): The number of counters kept.
+    """
+
+    __slots__ = ("capacity", "_counts", "_errors")
+
+    def __init__(self, capacity: int) -> None:
+        """Initialize empty counters.
+
+        Args:
+            capacity (int): The number of counters to keep.
+        """
+        self.capacity = capacity
+        self._counts: Dict[str, float] = {}
+        self._errors: Dict[str, float] = {}
+
+    def add(self, key: str, weight: float = 1.0) -> None:
+        """Count an occurrence of key.
+
+        Args:
+            key (str): The key.
+            weight (float): How much to count it for.
+        """
+        counts = self._counts
+        if key in counts:
+            counts[key] += weight
+            return
+        floor = 0.0
+        if len(counts) >= self.capacity:
+            # Replace the smallest counter, the new key may have been counted in it.
+            victim = min(counts, key=counts.__getitem__)
+            floor = counts.pop(victim)
+            del self._errors[victim]
+        counts[key] = floor + weight
+        self._errors[key] = floor
+
+    def top(self, n: int) -> List[Tuple[str, float, float]]:
+        """Return the keys with the largest counts.
+
+        Args:
+            n (int): The number of keys to return.
+
+        Returns:
+            List[Tuple[str, float, float]]: The keys, their estimated counts and
+                the maximum overestimate, largest first.
+        """
+        top = heapq.nlargest(n, self._counts.items(), key=lambda item: item[1])
+        return [(key, count, self._errors[key]) for key, count in top]
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+
+class KeyProfiler:
+    """A sampling profiler of the keys accessed through a database client.
+
+    Attributes:
+        capacity (int): The number of keys tracked per ranking.
+        sample_rate (float): The fraction of operations recorded. Counts are
+            scaled up to estimate the totals.
+    """
+
+    __slots__ = (
+        "capacity",
+        "sample_rate",
+        "_accesses",
+        "_bytes",
+        "_latency",
+        "_largest",
+        "_sizes",
+        "_operations",
+        "_random",
+        "_lock",
+    )
+
+    def __init__(
+        self, capacity: int = 100, sample_rate: float = 1.0, seed: Optional[int] = None
+    ) -> None:
+        """Initialize an empty profile.
+
+        Args:
+            capacity (int): The number of keys tracked per ranking.
+            sample_rate (float): The fraction of operations to record.
+            seed (Optional[int]): Seed for sampling, to make profiles reproducible.
+        """
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self._accesses = SpaceSaving(capacity)
+        self._bytes = SpaceSaving(capacity)
+        self._latency = SpaceSaving(capacity)
+        self._largest: List[Tuple[int, str]] = []
+        self._sizes: Dict[str, int] = {}
+        self._operations = 0
+        self._random = random.Random(seed)  # noqa: S311
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float, size: int) -> None:
+        """Record an operation on a key, if it is sampled.
+
+        Args:
+            key (str): The key read, written or deleted.
+            seconds (float): How long the operation took.
+            size (int): The size of the value transferred, in characters.
+        """
+        with self._lock:
+            self._operations += 1
+            if self.sample_rate < 1 and self._random.random() >= self.sample_rate:
+                return
+            scale = 1 / self.sample_rate
+            self._accesses.add(key, scale)
+            if size:
+                self._bytes.add(key, size * scale)
+                self._track_size(key, size)
+            self._latency.add(key, seconds * scale)
+
+    def _track_size(self, key: str, size: int) -> None:
+        # Keep the largest values seen, one entry per key.
+        known = self._sizes.get(key)
+        if known is not None:
+            if size <= known:
+                return
+            self._sizes[key] = size
+            self._largest = [(s, k) for s, k in self._largest if k != key]
+            self._largest.append((size, key))
+            heapq.heapify(self._largest)
+        elif len(self._largest) < self.capacity:
+            self._sizes[key] = size
+            heapq.heappush(self._largest, (size, key))
+        elif size > self._largest[0][0]:
+            _, evicted = heapq.heapreplace(self._largest, (size, key))
+            del self._sizes[evicted]
+            self._sizes[key] = size
+
+    def report(self, n: int = 10) -> Dict[str, Any]:
+        """Return the top keys of each ranking.
+
+        Args:
+            n (int): The number of keys per ranking.
+
+        Returns:
+            Dict[str, Any]: The number of operations and the sample rate, and lists
+                of ``[key, estimate, error]`` by accesses, bytes and seconds, and
+                of ``[key, size]`` for the largest values.
+        """
+        with self._lock:
+            return {
+                "operations": self._operations,
+                "sample_rate": self.sample_rate,
+                "accesses": [list(t) for t in self._accesses.top(n)],
+                "bytes": [list(t) for t in self._bytes.top(n)],
+                "seconds": [list(t) for t in self._latency.top(n)],
+                "largest": [[k, s] for s, k in heapq.nlargest(n, self._largest)],
+            }
+
+    def save(self, path: str) -> None:
+        """Save the full report as JSON, for ``replit profile-report``.
+
+        Args:
+            path (str): The file to write.
+        """
+        with open(path, "w") as f:
+            json.dump(self.report(self.capacity), f)
+
+    def format(self, n: int = 10) -> str:
+        """Return the report as text, see `format_report`.
+
+        Args:
+            n (int): The number of keys per ranking.
+
+        Returns:
+            str: The formatted report.
+        """
+        return format_report(self.report(n), n)
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__}(capacity={self.capacity}, "
+            f"sample_rate={self.sample_rate}, operations={self._operations})>"
+        )
+
+
+def format_report(report: Dict[str, Any], n: int = 10) -> str:
+    """Format a report from `KeyProfiler.report` as text tables.
+
+    Args:
+        report (Dict[str, Any]): The report.
+        n (int): The maximum number of keys per ranking.
+
+    Returns:
+        str: The formatted report.
+    """
+    lines = [
+        f"{report['operations']} operations, "
+        f"sample rate {report['sample_rate']:g}, estimates ± max overestimate"
+    ]
+    for title, name, unit in (
+        ("Most accessed keys", "accesses", ""),
+        ("Most bytes transferred", "bytes", " B"),
+        ("Most time spent", "seconds", " s"),
+    ):
+        lines.append(f"\n{title}:")
+        for key, estimate, error in report[name][:n]:
+            lines.append(f"  {estimate:>14.6g}{unit} ± {error:<10.3g} {key!r}")
+    lines.append("\nLargest values:")
+    for key, size in report["largest"][:n]:
+        lines.append(f"  {size:>14} B {key!r}")
+    return "\n".join(lines)
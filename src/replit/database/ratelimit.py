@@ -0,0 +1,264 @@
+"""Client-side rate limiting for database clients.
+
+Pass a RateLimiter to Database or AsyncDatabase to keep their requests under a
+quota of requests and bytes per second. Share one limiter between every client
+of a process to limit them together. When the server answers 429 anyway, the
+limiter pauses for the Retry-After the server asked for and halves its rate,
+then creeps back up to the configured rate as requests succeed, so throughput
+settles just under the real quota instead of bursting into more 429s.
+"""
+
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from typing import Optional
+
+from .deadline import check_backoff
+
+# The most a wait is lengthened by, as a fraction, to spread out retries.
+JITTER = 0.2
+
+
+def jittered(seconds: float) -> float:
+    """Lengthen a wait by a random amount, so clients don't all retry at once.
+
+    Args:
+        seconds (float): The wait.
+
+    Returns:
+        float: The wait, up to JITTER longer.
+    """
+    return seconds * (1 + random.random() * JITTER)  # noqa: S311
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header.
+
+    Args:
+        value (Optional[str]): The header, in seconds or as an HTTP date.
+
+    Returns:
+        Optional[float]: The seconds to wait, None if there is no valid header.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+class _Bucket:
+    __slots__ = ("rate", "capacity", "tokens")
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+
+    def refill(self, elapsed: float, scale: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate * scale)
+
+    def take(self, n: float, scale: float) -> float:
+        # Takes n tokens, going into debt if needed, and returns how long until
+        # the debt is paid off.
+        self.tokens -= n
+        return 0.0 if self.tokens >= 0 else -self.tokens / (self.rate * scale)
+
+
+class RateLimiter:
+    """A token bucket limiter of requests and bytes per second.
+
+    Requests wait for a token before they are sent, and their bodies, and the
+    bodies of their responses, are counted against the bytes per second. The
+    limiter is thread-safe and can be shared by sync and async clients.
+
+    Attributes:
+        ops_per_sec (Optional[float]): The requests allowed per second, None for
+            no limit.
+        bytes_per_sec (Optional[float]): The bytes allowed per second, None for
+            no limit.
+        burst (float): How many seconds of quota can be spent at once after the
+            limiter was idle.
+        min_scale (float): The lowest fraction of the configured rates that 429
+            responses can slow the limiter down to.
+    """
+
+    __slots__ = (
+        "ops_per_sec",
+        "bytes_per_sec",
+        "burst",
+        "min_scale",
+        "_ops",
+        "_bytes",
+        "_scale",
+        "_updated",
+        "_paused_until",
+        "_throttles",
+        "_lock",
+    )
+
+    # How much 429 responses multiply the rate by, and how much of the configured
+    # rate each successful request restores.
+    DECREASE = 0.5
+    INCREASE = 0.02
+
+    def __init__(
+        self,
+        ops_per_sec: Optional[float] = None,
+        bytes_per_sec: Optional[float] = None,
+        burst: float = 1.0,
+        min_scale: float = 0.1,
+    ) -> None:
+        """Initialize a limiter with full buckets.
+
+        Args:
+            ops_per_sec (Optional[float]): The requests allowed per second.
+                Defaults to no limit.
+            bytes_per_sec (Optional[float]): The bytes allowed per second.
+                Defaults to no limit.
+            burst (float): How many seconds of quota can be spent at once.
+            min_scale (float): The lowest fraction of the configured rates that
+                429 responses can slow the limiter down to.
+        """
+        self.ops_per_sec = ops_per_sec
+        self.bytes_per_sec = bytes_per_sec
+        self.burst = burst
+        self.min_scale = min_scale
+        self._ops = None
+        if ops_per_sec is not None:
+            self._ops = _Bucket(ops_per_sec, max(1.0, ops_per_sec * burst))
+        self._bytes = None
+        if bytes_per_sec is not None:
+            self._bytes = _Bucket(bytes_per_sec, bytes_per_sec * burst)
+        self._scale = 1.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._throttles = 0
+        self._lock = threading.Lock()
+
+    @property
+    def scale(self) -> float:
+        """The fraction of the configured rates currently allowed."""
+        return self._scale
+
+    @property
+    def throttles(self) -> int:
+        """How many 429 responses the limiter was told about."""
+        return self._throttles
+
+    def _refill(self) -> float:
+        # Called with the lock held, returns the current time.
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        for bucket in (self._ops, self._bytes):
+            if bucket is not None:
+                bucket.refill(elapsed, self._scale)
+        return now
+
+    def reserve(self, nbytes: int = 0) -> float:
+        """Take the tokens of a request, and return how long to wait to send it.
+
+        Args:
+            nbytes (int): The size of the request body.
+
+        Returns:
+            float: The seconds to wait before sending.
+        """
+        with self._lock:
+            now = self._refill()
+            wait = max(0.0, self._paused_until - now)
+            if self._ops is not None:
+                wait = max(wait, self._ops.take(1, self._scale))
+            if self._bytes is not None and nbytes:
+                wait = max(wait, self._bytes.take(nbytes, self._scale))
+            return wait
+
+    def acquire(self, nbytes: int = 0) -> None:
+        """Wait until a request may be sent.
+
+        Args:
+            nbytes (int): The size of the request body.
+        """
+        wait = check_backoff(self.reserve(nbytes))
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self, nbytes: int = 0) -> None:
+        """Wait until a request may be sent, without blocking the event loop.
+
+        Args:
+            nbytes (int): The size of the request body.
+        """
+        wait = check_backoff(self.reserve(nbytes))
+        if wait:
+            await asyncio.sleep(wait)
+
+    def charge(self, nbytes: int) -> None:
+        """Count bytes received against the quota, delaying later requests.
+
+        Args:
+            nbytes (int): The size of a response body.
+        """
+        if self._bytes is None or not nbytes:
+            return
+        with self._lock:
+            self._refill()
+            self._bytes.take(nbytes, self._scale)
+
+    def throttled(self, retry_after: Optional[float] = None) -> None:
+        """Slow down after the server answered 429.
+
+        Args:
+            retry_after (Optional[float]): The seconds the server asked to wait.
+                Defaults to the time between two requests at the current rate.
+        """
+        with self._lock:
+            now = self._refill()
+            self._throttles += 1
+            self._scale = max(self.min_scale, self._scale * self.DECREASE)
+            if retry_after is None:
+                rate = (self.ops_per_sec or 1.0) * self._scale
+                retry_after = 1 / rate
+            self._paused_until = max(self._paused_until, now + retry_after)
+            # Resume at the new rate, not with a burst.
+            for bucket in (self._ops, self._bytes):
+                if bucket is not None:
+                    bucket.tokens = min(bucket.tokens, 0.0)
+
+    def observe(
+        self, status: int, retry_after: Optional[str] = None, nbytes: int = 0
+    ) -> None:
+        """Update the limiter after a response.
+
+        Args:
+            status (int): The response status.
+            retry_after (Optional[str]): The response's Retry-After header.
+            nbytes (int): The size of the response body.
+        """
+        if status == 429:
+            self.throttled(parse_retry_after(retry_after))
+            return
+        self.charge(nbytes)
+        if status < 400:
+            self.succeeded()
+
+    def succeeded(self) -> None:
+        """Speed back up towards the configured rates after a request succeeded."""
+        if self._scale < 1.0:
+            with self._lock:
+                self._scale = min(1.0, self._scale + self.INCREASE)
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__}(ops_per_sec={self.ops_per_sec}, "
+            f"bytes_per_sec={self.bytes_per_sec}, scale={self._scale:g})>"
+        )
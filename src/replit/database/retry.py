@@ -0,0 +1,110 @@
+"""The retry policies of the database clients.
+
+Both clients retry server errors with exponential backoff, and 429 responses of
+any method, since the server didn't act on them. Waits follow the server's
+Retry-After with some jitter, are paced by the client's RateLimiter and are
+given up with DeadlineExceeded when they would outlast the current deadline.
+"""
+
+import time
+from typing import Any, cast, Optional
+
+from aiohttp_retry import ExponentialRetry  # type: ignore
+
+from .deadline import check_backoff
+from .metrics import CountingRetry
+from .ratelimit import jittered, parse_retry_after, RateLimiter
+
+TOO_MANY_REQUESTS = 429
+
+
+class DatabaseRetry(CountingRetry):
+    """The urllib3 retry policy of Database."""
+
+    def __init__(
+        self, *args: Any, limiter: Optional[RateLimiter] = None, **kwargs: Any
+    ) -> None:
+        """Initialize the retry configuration.
+
+        Args:
+            *args (Any): Passed to CountingRetry.
+            limiter (Optional[RateLimiter]): The limiter to pace retries with and
+                to tell about 429 responses.
+            **kwargs (Any): Passed to CountingRetry.
+        """
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter
+
+    def new(self, **kw: Any) -> "DatabaseRetry":
+        """Return a copy with updated counts, see Retry.new."""
+        retry = cast(DatabaseRetry, super().new(**kw))
+        retry.limiter = self.limiter
+        return retry
+
+    def is_retry(
+        self, method: str, status_code: int, has_retry_after: bool = False
+    ) -> bool:
+        """Whether a response should be retried, see Retry.is_retry."""
+        if status_code == TOO_MANY_REQUESTS:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def increment(self, *args: Any, **kwargs: Any) -> "DatabaseRetry":
+        """Tell the limiter about 429 responses, see Retry.increment."""
+        response = kwargs.get("response")
+        if (
+            self.limiter is not None
+            and response is not None
+            and response.status == TOO_MANY_REQUESTS
+        ):
+            self.limiter.throttled(self.get_retry_after(response))
+        return cast(DatabaseRetry, super().increment(*args, **kwargs))
+
+    def parse_retry_after(self, retry_after: str) -> float:
+        """Parse a Retry-After header, also in fractional seconds, with jitter."""
+        seconds = parse_retry_after(retry_after)
+        if seconds is None:
+            seconds = super().parse_retry_after(retry_after)
+        return jittered(seconds)
+
+    def sleep(self, response: Any = None) -> None:
+        """Wait before the next attempt, see Retry.sleep."""
+        wait = None
+        if self.respect_retry_after_header and response is not None:
+            wait = self.get_retry_after(response)
+        if wait is None:
+            wait = self.get_backoff_time()
+        if self.limiter is not None:
+            wait = max(wait, self.limiter.reserve())
+        wait = check_backoff(wait)
+        if wait:
+            time.sleep(wait)
+
+
+class AsyncDatabaseRetry(ExponentialRetry):
+    """The aiohttp_retry options of AsyncDatabase."""
+
+    def __init__(self, attempts: int, limiter: Optional[RateLimiter] = None) -> None:
+        """Initialize the retry options.
+
+        Args:
+            attempts (int): The number of attempts of each request.
+            limiter (Optional[RateLimiter]): The limiter to pace retries with and
+                to tell about 429 responses.
+        """
+        super().__init__(attempts=attempts, statuses={TOO_MANY_REQUESTS})
+        self.limiter = limiter
+
+    def get_timeout(self, attempt: int, response: Any = None) -> float:
+        """Return the wait before the next attempt, see ExponentialRetry."""
+        retry_after = None
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if self.limiter is not None and response.status == TOO_MANY_REQUESTS:
+                self.limiter.throttled(retry_after)
+        if retry_after is None:
+            retry_after = super().get_timeout(attempt, response)
+        wait = jittered(retry_after)
+        if self.limiter is not None:
+            wait = max(wait, self.limiter.reserve())
+        return check_backoff(wait)
@@ -0,0 +1,223 @@
+"""A background scheduler shared by every database client.
+
+Database clients refresh their URL, flush buffered writes and export metrics on
+timers. Rather than a thread per timer, a single daemon thread sleeps until
+the next callback is due and hands it to a small pool of worker threads, so idle
+clients cost no threads at all and a flush blocked on the network doesn't hold
+up the timers of every other client.
+"""
+
+import atexit
+import heapq
+import itertools
+import queue
+import threading
+import time
+import traceback
+from typing import Any, Callable, List, Optional, Tuple
+import weakref
+
+
+class ScheduledTask:
+    """A callback scheduled on a Scheduler.
+
+    Attributes:
+        interval (Optional[float]): Seconds between runs of a repeating task, None
+            for a task that runs once.
+    """
+
+    __slots__ = ("interval", "_callback", "_cancelled", "__weakref__")
+
+    def __init__(
+        self,
+        callback: Callable[[], Optional[Callable[[], Any]]],
+        interval: Optional[float],
+    ) -> None:
+        """Initialize the task.
+
+        Args:
+            callback (Callable[[], Optional[Callable[[], Any]]]): Returns the
+                function to call, or None if it no longer exists.
+            interval (Optional[float]): Seconds between runs, None to run once.
+        """
+        self.interval = interval
+        self._callback = callback
+        self._cancelled = False
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the task was cancelled."""
+        return self._cancelled
+
+    def cancel(self) -> None:
+        """Stop the task from running again. Does nothing if it already ran."""
+        self._cancelled = True
+
+    def run(self) -> bool:
+        """Run the callback.
+
+        Exceptions are printed, like they would be by a thread, and don't stop
+        a repeating task.
+
+        Returns:
+            bool: Whether the task should be scheduled again.
+        """
+        func = self._callback()
+        if func is None:
+            # The object the callback is bound to was garbage collected.
+            return False
+        try:
+            func()
+        except Exception:
+            traceback.print_exc()
+        return self.interval is not None and not self._cancelled
+
+
+def _reference(func: Callable[[], Any]) -> Callable[[], Optional[Callable[[], Any]]]:
+    # Hold bound methods weakly, so a scheduled task doesn't keep its object
+    # alive.
+    if hasattr(func, "__self__") and hasattr(func, "__func__"):
+        return weakref.WeakMethod(func)  # type: ignore[arg-type]
+    return lambda: func
+
+
+class Scheduler:
+    """Runs callbacks after a delay, or repeatedly, on daemon threads.
+
+    One thread is started when the first callback is scheduled. It sleeps until
+    the next callback is due and only hands it to a worker thread, started when
+    no worker is idle, so a callback that blocks delays only the others that are
+    due while every worker is busy. A repeating task is scheduled again once its
+    run returns, so it never runs twice at the same time. Bound methods are held
+    weakly: the task is dropped once its object is garbage collected.
+
+    Attributes:
+        max_workers (int): The most callbacks run at the same time.
+    """
+
+    def __init__(self, max_workers: int = 4) -> None:
+        """Initialize the scheduler without starting its threads.
+
+        Args:
+            max_workers (int): The most callbacks run at the same time.
+        """
+        self.max_workers = max_workers
+        self._queue: List[Tuple[float, int, ScheduledTask]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._due: "queue.SimpleQueue[Optional[ScheduledTask]]" = queue.SimpleQueue()
+        self._workers = 0
+        self._idle = 0
+
+    def call_later(
+        self, delay: float, func: Callable[[], Any], weak: bool = True
+    ) -> ScheduledTask:
+        """Call func once, after delay seconds.
+
+        Args:
+            delay (float): Seconds to wait.
+            func (Callable[[], Any]): The function to call.
+            weak (bool): Whether to hold a bound method weakly. Pass False for
+                work that must happen even if nothing else references the object.
+
+        Returns:
+            ScheduledTask: The task, which can be cancelled.
+        """
+        task = ScheduledTask(_reference(func) if weak else lambda: func, None)
+        self._push(delay, task)
+        return task
+
+    def call_every(self, interval: float, func: Callable[[], Any]) -> ScheduledTask:
+        """Call func every interval seconds, starting interval seconds from now.
+
+        Args:
+            interval (float): Seconds between calls.
+            func (Callable[[], Any]): The function to call.
+
+        Returns:
+            ScheduledTask: The task, which can be cancelled.
+        """
+        task = ScheduledTask(_reference(func), interval)
+        self._push(interval, task)
+        return task
+
+    def __len__(self) -> int:
+        with self._condition:
+            return sum(1 for _, _, task in self._queue if not task.cancelled)
+
+    def shutdown(self) -> None:
+        """Stop the threads, dropping every scheduled task.
+
+        Callbacks that are already running are not waited for.
+        """
+        with self._condition:
+            self._stopped = True
+            self._queue.clear()
+            self._condition.notify()
+            thread, self._thread = self._thread, None
+            for _ in range(self._workers):
+                self._due.put(None)
+            self._workers = self._idle = 0
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _push(self, delay: float, task: ScheduledTask) -> None:
+        with self._condition:
+            if self._stopped:
+                return
+            when = time.monotonic() + delay
+            heapq.heappush(self._queue, (when, next(self._counter), task))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="replit-db-scheduler", daemon=True
+                )
+                self._thread.start()
+            elif self._queue[0][2] is task:
+                # The new task is due before the one the thread is waiting for.
+                self._condition.notify()
+
+    def _run(self) -> None:
+        with self._condition:
+            while not self._stopped:
+                # Drop cancelled tasks without waiting for them to be due.
+                while self._queue and self._queue[0][2].cancelled:
+                    heapq.heappop(self._queue)
+                if not self._queue:
+                    self._condition.wait()
+                    continue
+                timeout = self._queue[0][0] - time.monotonic()
+                if timeout <= 0:
+                    _, _, task = heapq.heappop(self._queue)
+                    self._dispatch(task)
+                else:
+                    self._condition.wait(timeout)
+
+    def _dispatch(self, task: ScheduledTask) -> None:
+        # Called with the condition held. Claims an idle worker, or starts one.
+        if self._idle:
+            self._idle -= 1
+        elif self._workers < self.max_workers:
+            self._workers += 1
+            threading.Thread(
+                target=self._work, name="replit-db-scheduler-worker", daemon=True
+            ).start()
+        self._due.put(task)
+
+    def _work(self) -> None:
+        while True:
+            task = self._due.get()
+            if task is None:
+                return
+            if task.run():
+                self._push(task.interval or 0, task)
+            with self._condition:
+                if self._stopped:
+                    return
+                self._idle += 1
+
+
+# The scheduler used by database clients.
+scheduler = Scheduler()
+atexit.register(scheduler.shutdown)
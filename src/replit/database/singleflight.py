@@ -0,0 +1,156 @@
+"""Coalescing of concurrent identical reads.
+
+When a popular key expires from an application's cache, many threads or tasks
+read it at the same moment. The database clients pass their reads through a
+single-flight group, so concurrent reads of the same key or prefix share one
+request and all get its result or its error.
+
+Writes forget the flights of the keys they change, so a read that starts after
+a write returned never shares a request that started before it. Callers that
+join a shared request wait for it only until their own deadline.
+"""
+
+import asyncio
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import threading
+from typing import Awaitable, Callable, Dict, Generic, Hashable, TypeVar
+
+from .deadline import DeadlineExceeded, request_timeout
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """Shares one call between the threads that make it at the same time.
+
+    Attributes:
+        shared (int): How many calls were answered by another thread's call.
+    """
+
+    __slots__ = ("shared", "_calls", "_lock")
+
+    def __init__(self) -> None:
+        """Initialize an empty group."""
+        self.shared = 0
+        self._calls: Dict[Hashable, "Future[T]"] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], T]) -> T:
+        """Call func, unless a call for key is in flight, and wait for its result.
+
+        Args:
+            key (Hashable): What the call reads.
+            func (Callable[[], T]): Makes the call.
+
+        Returns:
+            T: The result of the call.
+
+        Raises:
+            BaseException: The error of the call, in every thread waiting for it.
+            DeadlineExceeded: If the call didn't finish before the deadline of a
+                thread that joined it.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self._calls[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            try:
+                return call.result(request_timeout(None))
+            except FutureTimeoutError:
+                raise DeadlineExceeded("database deadline exceeded") from None
+
+        try:
+            result = func()
+        except BaseException as e:
+            self._finished(key, call)
+            call.set_exception(e)
+            raise
+        self._finished(key, call)
+        call.set_result(result)
+        return result
+
+    def _finished(self, key: Hashable, call: "Future[T]") -> None:
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+    def forget(self, key: Hashable) -> None:
+        """Make later calls for key start a new call.
+
+        Args:
+            key (Hashable): What the call reads.
+        """
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def forget_all(self) -> None:
+        """Make every later call start a new call."""
+        with self._lock:
+            self._calls.clear()
+
+
+class AsyncSingleFlight(Generic[T]):
+    """Shares one call between the tasks that make it at the same time.
+
+    The call runs in a task of its own, so cancelling one of the tasks waiting
+    for it doesn't cancel it for the others.
+
+    Attributes:
+        shared (int): How many calls were answered by another task's call.
+    """
+
+    __slots__ = ("shared", "_calls")
+
+    def __init__(self) -> None:
+        """Initialize an empty group."""
+        self.shared = 0
+        self._calls: Dict[Hashable, "asyncio.Future[T]"] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """Call func, unless a call for key is in flight, and wait for its result.
+
+        Args:
+            key (Hashable): What the call reads.
+            func (Callable[[], Awaitable[T]]): Makes the call.
+
+        Returns:
+            T: The result of the call.
+
+        Raises:
+            DeadlineExceeded: If the call didn't finish before the deadline of a
+                task that joined it.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(func())
+            self._calls[key] = call
+            call.add_done_callback(lambda done: self._finished(key, done))
+            return await asyncio.shield(call)
+        self.shared += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(call), request_timeout(None))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("database deadline exceeded") from None
+
+    def _finished(self, key: Hashable, call: "asyncio.Future[T]") -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Retrieve the error, in case every waiting task was cancelled.
+        if not call.cancelled():
+            call.exception()
+
+    def forget(self, key: Hashable) -> None:
+        """Make later calls for key start a new call.
+
+        Args:
+            key (Hashable): What the call reads.
+        """
+        self._calls.pop(key, None)
+
+    def forget_all(self) -> None:
+        """Make every later call start a new call."""
+        self._calls.clear()
@@ -102,18 +102,17 @@ class UserStore(Mapping):
             return self[auth.name]
         return None
 
-    def _strip_prefix(self, k: str) -> str:
-        return k[len(self.prefix) :]
+    def _namespace(self) -> database.Namespace:
+        # Lists only the keys under the prefix, on the server.
+        if database.db is None:
+            raise RuntimeError("database not configured")
+        return database.db.namespace(self.prefix)
 
     def __getitem__(self, name: str) -> User:
         return User(username=name, prefix=self.prefix)
 
     def __iter__(self) -> Iterator[str]:
-        if database.db is None:
-            raise RuntimeError("database not configured")
-        for k in database.db.keys():
-            if k.startswith(self.prefix):
-                yield self._strip_prefix(k)
+        return iter(self._namespace())
 
     def __len__(self) -> int:
-        return sum(1 for _ in self)
+        return len(self._namespace())
@@ -1,13 +1,53 @@
 # flake8: noqa# flake8: noqa
 """Tests for replit.database."""
 
+import asyncio
 import os
+import threading
+import time
+from typing import Awaitable, Callable
 import unittest
+from unittest import mock
 
-from replit.database import AsyncDatabase, Database
+import aiohttp
+from replit.database import (
+    AsyncDatabase,
+    Chunking,
+    Codec,
+    Compression,
+    ConnectionPool,
+    Database,
+    DeadlineExceeded,
+    FastJSONCodec,
+    Faults,
+    Hedging,
+    JSONCodec,
+    KeyIndex,
+    KeyProfiler,
+    LocalDatabaseServer,
+    Metrics,
+    MsgpackCodec,
+    RateLimiter,
+    ReadCache,
+    WriteBuffer,
+)
+from replit.database.codecs import msgpack
+from replit.database.database import item_to_observed, ObservedDict, ObservedList
+from replit.database.profiler import SpaceSaving
 
 import requests
 
+_local_server = None
+
+
+def local_db_url() -> str:
+    """Start a local database shared by the tests, when no database is configured."""
+    global _local_server
+    if _local_server is None:
+        _local_server = LocalDatabaseServer()
+        _local_server.start()
+    return _local_server.url
+
 
 class TestAsyncDatabase(unittest.IsolatedAsyncioTestCase):
     """Tests for replit.database.AsyncDatabase."""
@@ -23,13 +63,15 @@ class TestAsyncDatabase(unittest.IsolatedAsyncioTestCase):
             )
             url = req.text
             self.db = AsyncDatabase(url)
-        else:
+        elif "JWT_PASSWORD" in os.environ:
             password = os.environ["JWT_PASSWORD"]
             req = requests.get(
                 "https://database-test-jwt-util.replit.app", auth=("test", password)
             )
             url = req.text
             self.db = AsyncDatabase(url)
+        else:
+            self.db = AsyncDatabase(local_db_url())
 
         # nuke whatever is already here
         for k in await self.db.keys():
@@ -85,6 +127,18 @@ class TestAsyncDatabase(unittest.IsolatedAsyncioTestCase):
         with self.assertRaises(KeyError):
             await self.db.get(key)
 
+    async def test_list_pages(self) -> None:
+        """Test that streamed listings page and resume from a cursor."""
+        await self.db.set_bulk({f"page{i}": i for i in range(5)})
+        pages = [p async for p in self.db.prefix_pages("page", page_size=2)]
+        self.assertEqual(
+            [p.keys for p in pages],
+            [("page0", "page1"), ("page2", "page3"), ("page4",)],
+        )
+
+        rest = [k async for k in self.db.iter_prefix("page", after=pages[0].cursor)]
+        self.assertEqual(rest, ["page2", "page3", "page4"])
+
     async def test_list_values(self) -> None:
         """Test that we can get all values."""
         key = "test-list-values"
@@ -101,6 +155,289 @@ class TestAsyncDatabase(unittest.IsolatedAsyncioTestCase):
         d = await self.db.to_dict()
         self.assertDictEqual(d, {"key1": "value", "key2": "value"})
 
+    async def test_dict_concurrent(self) -> None:
+        """Test that a bounded concurrent dump returns every key in order."""
+        values = {f"key{i:03}": i for i in range(50)}
+        await self.db.set_bulk(values)
+        d = await self.db.to_dict(concurrency=4)
+        self.assertDictEqual(d, values)
+        self.assertEqual(list(d), sorted(values))
+
+    async def test_get_many(self) -> None:
+        """Test that get_many skips missing keys and reports errors."""
+        await self.db.set_bulk({"many1": 1, "many2": 2, "bad": "x"})
+        await self.db.set_raw("bad", "not json")
+        errors = []
+        got = await self.db.get_many(
+            ["many1", "missing", "bad", "many2"],
+            on_error=lambda k, e: errors.append(k),
+        )
+        self.assertDictEqual(got, {"many1": 1, "many2": 2})
+        self.assertEqual(errors, ["bad"])
+
+        with self.assertRaises(ValueError):
+            await self.db.get_many(["many1", "bad"])
+
+    async def test_cache(self) -> None:
+        """Test that cached reads are served locally and invalidated by writes."""
+        self.db.cache = ReadCache(maxsize=2)
+        await self.db.set("cached", 1)
+        self.assertEqual(await self.db.get("cached"), 1)
+        self.assertEqual(await self.db.get("cached"), 1)
+        self.assertEqual((self.db.cache.hits, self.db.cache.misses), (1, 1))
+
+        await self.db.set("cached", 2)
+        self.assertEqual(await self.db.get("cached"), 2)
+
+        await self.db.delete("cached")
+        with self.assertRaises(KeyError):
+            await self.db.get("cached")
+        with self.assertRaises(KeyError):
+            await self.db.get("cached")
+        self.assertEqual(self.db.cache.hits, 2)
+
+    async def test_delete_many(self) -> None:
+        """Test bulk deletion with progress and missing keys."""
+        await self.db.set_bulk({f"del{i}": i for i in range(10)})
+        calls = []
+        summary = await self.db.delete_many(
+            ["del0", "del1", "nope"], progress=lambda *a: calls.append(a)
+        )
+        self.assertEqual((summary.deleted, summary.missing), (2, ("nope",)))
+        self.assertEqual(calls[-1], (3, 3))
+
+        summary = await self.db.delete_prefix("del", concurrency=3)
+        self.assertEqual(summary.deleted, 8)
+        self.assertEqual(await self.db.list("del"), ())
+
+    async def test_compression(self) -> None:
+        """Test that large values are compressed and read back transparently."""
+        self.db.compression = Compression(threshold=100)
+        big = {"data": "x" * 1000}
+        await self.db.set_bulk({"big": big, "small": "x"})
+        self.assertTrue((await self.db.get_raw("big")).startswith("~zlib:"))
+        self.assertEqual(await self.db.get_raw("small"), '"x"')
+
+        self.db.compression = None
+        self.assertEqual(await self.db.get("big"), big)
+
+    async def test_chunking(self) -> None:
+        """Test that oversized values are chunked and reassembled."""
+        self.db.chunking = Chunking(chunk_size=10)
+        await self.db.set_raw("big", "a" * 35)
+        self.assertEqual(await self.db.get_raw("big"), "a" * 35)
+        self.assertEqual(await self.db.list(""), ("big",))
+        self.assertEqual(len(await self.db.list("~chunk/")), 4)
+
+        await self.db.delete("big")
+        self.assertEqual(await self.db.list("~chunk/"), ())
+
+    async def test_metrics(self) -> None:
+        """Test that requests are counted per operation."""
+        metrics = Metrics()
+        db = AsyncDatabase(self.db.db_url, metrics=metrics)
+        await db.set("key", "value")
+        await db.get("key")
+        with self.assertRaises(KeyError):
+            await db.get("missing")
+        await db.list("")
+        await db.close()
+
+        ops = metrics.snapshot()["ops"]
+        self.assertEqual(ops["get"]["requests"], 2)
+        self.assertEqual(ops["get"]["not_found"], 1)
+        self.assertEqual(ops["set"]["requests"], 1)
+        self.assertEqual(ops["list"]["latency"]["count"], 1)
+        self.assertGreater(metrics.snapshot()["bytes_sent"], 0)
+
+    async def test_connection_pool(self) -> None:
+        """Test that databases share a pool's connections and leave it open."""
+        metrics = Metrics()
+        async with ConnectionPool(limit=4, metrics=metrics) as pool:
+            db1 = AsyncDatabase(self.db.db_url, pool=pool)
+            db2 = AsyncDatabase(self.db.db_url, pool=pool)
+            self.assertIs(db1.sess, db2.sess)
+            await db1.warm_up(2)
+            self.assertEqual(metrics.snapshot()["ops"]["get"]["not_found"], 2)
+
+            await db1.set("pooled", 1)
+            await db1.close()
+            self.assertFalse(pool.closed)
+            self.assertEqual(await db2.get("pooled"), 1)
+            with self.assertRaises(ValueError):
+                AsyncDatabase(self.db.db_url, pool=pool, metrics=Metrics())
+        self.assertTrue(pool.closed)
+
+    async def test_auth_failure_replay(self) -> None:
+        """Test that requests rejected by an expired URL are replayed once."""
+        with LocalDatabaseServer(faults=Faults(error_rate=1, error_status=401)) as old:
+            db = AsyncDatabase(old.url, get_db_url=lambda: self.db.db_url)
+            await db.set("rotated", 1)
+            self.assertEqual(db.db_url, self.db.db_url)
+            self.assertEqual(await db.get("rotated"), 1)
+            self.assertEqual(old.faults.injected, {401: 1})
+            await db.close()
+
+            db = AsyncDatabase(old.url, get_db_url=lambda: old.url)
+            with self.assertRaises(aiohttp.ClientResponseError):
+                await db.get("rotated")
+            await db.close()
+
+    async def test_deadline(self) -> None:
+        """Test that a deadline bounds requests and their retries."""
+        with LocalDatabaseServer(faults=Faults(latency=0.5)) as slow:
+            db = AsyncDatabase(slow.url)
+            start = time.monotonic()
+            with self.assertRaises((TimeoutError, DeadlineExceeded)):
+                with db.deadline(0.2):
+                    await db.get("key")
+            self.assertLess(time.monotonic() - start, 0.45)
+
+            with self.assertRaises(DeadlineExceeded):
+                with db.deadline(-1):
+                    await db.get("key")
+            await db.close()
+
+        # A retry is bounded by what is left of the deadline, not by all of it.
+        faults = Faults(latency=0.3, error_rate=1)
+        with LocalDatabaseServer(faults=faults) as failing:
+            db = AsyncDatabase(failing.url)
+
+            async def stall() -> None:
+                # Answer the first attempt with an error, then stop answering.
+                await asyncio.sleep(0.35)
+                faults.latency, faults.error_rate = 5, 0
+
+            stalling = asyncio.ensure_future(stall())
+            start = time.monotonic()
+            with self.assertRaises((TimeoutError, DeadlineExceeded)):
+                with db.deadline(1.0):
+                    await db.get("key")
+            self.assertLess(time.monotonic() - start, 1.05)
+            await stalling
+            await db.close()
+
+    async def test_hedging(self) -> None:
+        """Test that slow reads are hedged within the budget."""
+        hedging = Hedging(delay=0.05, budget=0.5)
+        calls = []
+
+        async def read() -> int:
+            calls.append(len(calls))
+            if len(calls) == 2:
+                await asyncio.sleep(1)
+            return len(calls)
+
+        self.assertEqual(await hedging.run(read), 1)
+        self.assertEqual(await hedging.run(read), 3)
+        self.assertEqual((hedging.reads, hedging.hedges, hedging.wins), (2, 1, 1))
+
+        db = AsyncDatabase(self.db.db_url, hedging=Hedging(delay=0, budget=1))
+        await db.set_bulk({"hedged/a": 1, "hedged/b": 2})
+        self.assertEqual(await db.get("hedged/b"), 2)
+        self.assertEqual(await db.list("hedged/"), ("hedged/a", "hedged/b"))
+        with self.assertRaises(KeyError):
+            await db.get("hedged/c")
+        self.assertEqual(db.hedging.reads, 3)
+        self.assertEqual(db.hedging.hedges, 3)
+        await db.close()
+
+        hedging = Hedging(min_samples=2)
+        self.assertIsNone(hedging.hedge_delay())
+        await hedging.run(read)
+        await hedging.run(read)
+        self.assertEqual(hedging.hedge_delay(), 0.001)
+
+    async def test_hedge_delay_is_stable(self) -> None:
+        """Test that hedges that win don't lower the hedge delay."""
+        hedging = Hedging(percentile=85, budget=1, min_samples=10)
+
+        def copies(latency: float) -> Callable[[], Awaitable[None]]:
+            # The first copy takes latency seconds, hedges answer at once.
+            sent = []
+
+            async def read() -> None:
+                sent.append(latency)
+                await asyncio.sleep(latency if len(sent) == 1 else 0)
+
+            return read
+
+        # Most reads are fast, one in ten a bit slower and one in ten slow enough
+        # to be hedged once the delay is known.
+        for _ in range(4):
+            for latency in [0.2, 0.012] + [0.003] * 8:
+                await hedging.run(copies(latency))
+            self.assertEqual(hedging.hedge_delay(), 0.025)
+        self.assertEqual(hedging.hedges, 3)
+
+    async def test_hedge_budget_does_not_save_up(self) -> None:
+        """Test that a long healthy period doesn't let a slow server be hedged."""
+        hedging = Hedging(delay=0.01, budget=0.1)
+
+        async def fast() -> None:
+            pass
+
+        async def slow() -> None:
+            await asyncio.sleep(0.03)
+
+        for _ in range(100):
+            await hedging.run(fast)
+        for _ in range(20):
+            await hedging.run(slow)
+        # At most the one saved up hedge, then one in ten reads.
+        self.assertGreaterEqual(hedging.hedges, 1)
+        self.assertLessEqual(hedging.hedges, 2)
+
+    async def test_single_flight(self) -> None:
+        """Test that concurrent identical reads share one request."""
+        with LocalDatabaseServer(faults=Faults(latency=0.1)) as server:
+            metrics = Metrics()
+            db = AsyncDatabase(server.url, metrics=metrics)
+            await db.set_bulk({"flight/a": 1, "flight/b": 2})
+            metrics.reset()
+            values = await asyncio.gather(*(db.get("flight/a") for _ in range(20)))
+            self.assertEqual(values, [1] * 20)
+            listings = await asyncio.gather(*(db.list("flight/") for _ in range(5)))
+            self.assertEqual(set(listings), {("flight/a", "flight/b")})
+            ops = metrics.snapshot()["ops"]
+            self.assertEqual(ops["get"]["requests"], 1)
+            self.assertEqual(ops["list"]["requests"], 1)
+
+            # Reads that start after a write don't share a read made before it.
+            stale = asyncio.ensure_future(db.get("flight/a"))
+            await asyncio.sleep(0.01)
+            await db.set("flight/a", 3)
+            self.assertEqual(await db.get("flight/a"), 3)
+            self.assertEqual(await stale, 1)
+            await db.close()
+
+        # Tasks that join a read wait for it only until their own deadline.
+        with LocalDatabaseServer(faults=Faults(latency=0.9)) as slow:
+            db = AsyncDatabase(slow.url)
+            leader = asyncio.ensure_future(db.get_raw("slow"))
+            await asyncio.sleep(0.05)
+            start = time.monotonic()
+            with self.assertRaises(DeadlineExceeded):
+                with db.deadline(0.2):
+                    await db.get_raw("slow")
+            self.assertLess(time.monotonic() - start, 0.3)
+            with self.assertRaises(KeyError):
+                await leader
+            await db.close()
+
+    async def test_rate_limit(self) -> None:
+        """Test that throttled requests are retried and slow the limiter down."""
+        faults = Faults(throttle_rate=0.3, retry_after=0.01, seed=1)
+        with LocalDatabaseServer(faults=faults) as server:
+            limiter = RateLimiter(ops_per_sec=500)
+            db = AsyncDatabase(server.url, rate_limiter=limiter)
+            for i in range(20):
+                await db.set(f"limited{i}", i)
+            self.assertEqual(await db.get("limited19"), 19)
+            self.assertEqual(limiter.throttles, faults.injected[429])
+            self.assertLess(limiter.scale, 1)
+            await db.close()
+
     async def test_raw(self) -> None:
         """Test that get_raw and set_raw do not use JSON."""
         k = "raw_test"
@@ -185,13 +522,15 @@ class TestDatabase(unittest.TestCase):
             )
             url = req.text
             self.db = Database(url)
-        else:
+        elif "JWT_PASSWORD" in os.environ:
             password = os.environ["JWT_PASSWORD"]
             req = requests.get(
                 "https://database-test-jwt-util.replit.app", auth=("test", password)
             )
             url = req.text
             self.db = Database(url)
+        else:
+            self.db = Database(local_db_url())
 
         # nuke whatever is already here
         for k in self.db.keys():
@@ -236,12 +575,188 @@ class TestDatabase(unittest.TestCase):
         with self.assertRaises(KeyError):
             val = self.db[key]
 
+    def test_prefix_pages(self) -> None:
+        """Test that streamed listings page and resume from a cursor."""
+        self.db.set_bulk({f"page{i}": i for i in range(5)})
+        self.assertEqual(
+            list(self.db.iter_prefix("page")), [f"page{i}" for i in range(5)]
+        )
+
+        pages = list(self.db.prefix_pages("page", page_size=2))
+        self.assertEqual([len(p.keys) for p in pages], [2, 2, 1])
+
+        resumed = list(
+            self.db.prefix_pages("page", page_size=2, cursor=pages[1].cursor)
+        )
+        self.assertEqual(resumed, pages[2:])
+
+        # the server doesn't promise to list keys in order
+        unsorted = iter([b"page2", b"page1"])
+        with mock.patch.object(requests.Response, "iter_lines", return_value=unsorted):
+            self.assertEqual(
+                list(self.db.iter_prefix("page", after="page2")), ["page1"]
+            )
+
+    def test_get_many(self) -> None:
+        """Test parallel bulk reads in key order."""
+        values = {f"many{i:03}": [i] for i in range(40)}
+        self.db.set_bulk(values)
+        self.assertEqual(
+            self.db.get_many(["many001", "nope", "many000"]),
+            {"many001": [1], "many000": [0]},
+        )
+
+        # the keys are streamed rather than listed in full first
+        with mock.patch.object(Database, "prefix", side_effect=AssertionError):
+            items = list(self.db.iter_items("many", prefetch=3))
+        self.assertEqual(items, list(values.items()))
+
+    def test_delete_many(self) -> None:
+        """Test bulk deletion with progress and missing keys."""
+        self.db.set_bulk({f"del{i}": i for i in range(30)})
+        calls = []
+        summary = self.db.delete_many(
+            ["del0", "nope", "del1"], progress=lambda *a: calls.append(a)
+        )
+        self.assertEqual((summary.deleted, summary.missing), (2, ("nope",)))
+        self.assertEqual(calls, [(1, 3), (2, 3), (3, 3)])
+
+        # at most concurrency deletes are in flight
+        in_flight, peak = [], []
+        delete = Database._delete
+
+        def tracked(db: Database, key: str) -> None:
+            in_flight.append(key)
+            peak.append(len(in_flight))
+            try:
+                delete(db, key)
+            finally:
+                in_flight.remove(key)
+
+        with mock.patch.object(Database, "_delete", tracked):
+            summary = self.db.delete_prefix("del", concurrency=2)
+        self.assertEqual(summary.deleted, 28)
+        self.assertLessEqual(max(peak), 2)
+        self.assertEqual(self.db.prefix("del"), ())
+
+    def test_parallel_from_any_thread(self) -> None:
+        """Test that per-key work runs in parallel unless already in the pool."""
+
+        def name(key: str) -> str:
+            return threading.current_thread().name
+
+        keys = ["a", "b", "c"]
+        names = []
+        scheduled = threading.Thread(
+            target=lambda: names.extend(self.db._map_keys(name, keys)),
+            name="replit-db-scheduler-worker",
+        )
+        scheduled.start()
+        scheduled.join()
+        self.assertNotIn("replit-db-scheduler-worker", names)
+
+        executor = self.db._get_executor()
+        names = executor.submit(self.db._map_keys, name, keys).result()
+        self.assertEqual(len(set(names)), 1)
+
+    def test_contains(self) -> None:
+        """Test membership tests, which don't download values."""
+        self.db["contained"] = "value"
+        self.db["contained-too"] = "value"
+        self.assertIn("contained", self.db)
+        self.assertIn("contained-too", self.db.keys())
+        self.assertNotIn("contain", self.db)
+        self.assertNotIn(1, self.db)
+
+        # the server doesn't promise to list keys in order
+        unsorted = iter(["contained-too", "contained"])
+        with mock.patch.object(Database, "iter_prefix", return_value=unsorted):
+            self.assertIn("contained", self.db)
+
+    def test_key_index(self) -> None:
+        """Test that the key index is seeded once and follows our writes."""
+        self.db.set_bulk({"idx1": 1, "idx2": 2, "other": 3})
+        index = KeyIndex()
+        self.db.key_index = index
+        self.assertEqual(len(self.db), 3)
+        self.assertFalse(index.stale)
+
+        self.db["idx0"] = 0
+        del self.db["idx2"]
+        self.assertEqual(self.db.prefix("idx"), ("idx0", "idx1"))
+        self.assertEqual(list(self.db), ["idx0", "idx1", "other"])
+        self.assertIn("idx0", self.db)
+        self.assertNotIn("idx2", self.db)
+
+        # writes from elsewhere are only seen after a refresh
+        self.db.key_index = None
+        self.db["idx3"] = 3
+        self.db.key_index = index
+        self.assertNotIn("idx3", self.db)
+        index.invalidate()
+        self.assertIn("idx3", self.db)
+        self.assertEqual(self.db.prefix("idx"), tuple(self.db.iter_prefix("idx")))
+
     def test_delete_nonexistent_key(self) -> None:
         """Test that deleting a non-existent key returns 404."""
         key = "this-doesn't-exist"
         with self.assertRaises(KeyError):
             self.db[key]
 
+    def test_cache(self) -> None:
+        """Test that the cache expires, evicts and caches missing keys."""
+        cache = ReadCache(maxsize=2, ttl=60, negative_ttl=0)
+        self.db.cache = cache
+        self.db.set_bulk({"c1": 1, "c2": 2, "c3": 3})
+        for k in ("c1", "c2", "c3", "c3"):
+            self.db[k]
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 3, "size": 2})
+
+        # c1 was evicted, so this is a miss
+        self.db["c1"]
+        self.assertEqual(cache.misses, 4)
+
+        # missing keys are not cached with negative_ttl=0
+        for _ in range(2):
+            with self.assertRaises(KeyError):
+                self.db["nope"]
+        self.assertEqual(cache.misses, 6)
+
+        cache.ttl = 0
+        cache.clear()
+        self.db["c1"]
+        self.db["c1"]
+        self.assertEqual(cache.misses, 8)
+
+    def test_write_buffer(self) -> None:
+        """Test that buffered writes coalesce and are readable before a flush."""
+        self.db.write_buffer = WriteBuffer(max_keys=3, max_delay=60)
+        self.db["wb1"] = 1
+        self.db["wb1"] = 2
+        self.db["wb2"] = {"a": 1}
+        self.assertEqual(len(self.db.write_buffer), 2)
+        self.assertEqual(self.db["wb1"], 2)
+        self.db["wb2"]["a"] = 5
+        self.assertEqual(self.db["wb2"], {"a": 5})
+
+        # the third key reaches max_keys and flushes everything
+        self.db["wb3"] = 3
+        self.assertEqual(len(self.db.write_buffer), 0)
+
+        self.db["wb4"] = 4
+        del self.db["wb4"]
+        with self.assertRaises(KeyError):
+            self.db["wb4"]
+        self.db["wb5"] = 5
+        self.assertEqual(self.db.prefix("wb"), ("wb1", "wb2", "wb3", "wb5"))
+
+        self.db.write_buffer = WriteBuffer(max_delay=0.01)
+        self.db["wb6"] = 6
+        time.sleep(0.5)
+        self.assertEqual(len(self.db.write_buffer), 0)
+        self.db.write_buffer = None
+        self.assertEqual(self.db["wb6"], 6)
+
     def test_get_set_fancy_object(self) -> None:
         """Test that we can get/set/delete something that's more than a string."""
         key = "big-ol-list"
@@ -281,6 +796,399 @@ class TestDatabase(unittest.TestCase):
         db[key][1][1][1] *= 2
         self.assertEqual(db[key], [1, [2, [3, 8]]])
 
+    def test_batch(self) -> None:
+        """Test that batched mutations are written back once."""
+        key = "batched"
+        self.db[key] = {"list": [], "n": 0}
+
+        with mock.patch.object(
+            Database, "set_bulk_raw", autospec=True, side_effect=Database.set_bulk_raw
+        ) as set_bulk_raw:
+            with self.db.batch(key) as val:
+                for i in range(10):
+                    val["list"].append(i)
+                    val["n"] += 1
+            self.assertEqual(set_bulk_raw.call_count, 1)
+        self.assertEqual(self.db[key], {"list": list(range(10)), "n": 10})
+
+        with self.assertRaises(RuntimeError):
+            with self.db.batch(key) as val:
+                val["n"] = 0
+                raise RuntimeError()
+        self.assertEqual(self.db[key]["n"], 10)
+
+    def test_fast_json_codec(self) -> None:
+        """Test that the fast JSON codec writes plain JSON."""
+        self.db.codec = FastJSONCodec()
+        self.db["fast"] = {"a": [1, "é"], 2: None}
+        self.db["fast"]["a"].append(3)
+        self.db.codec = JSONCodec()
+        self.assertEqual(self.db["fast"], {"a": [1, "é", 3], "2": None})
+
+        class _EncodeOnly(Codec):
+            def encode(self, value: object) -> str:
+                return str(value)
+
+        with self.assertRaises(TypeError):
+            _EncodeOnly()  # type: ignore[abstract]
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_msgpack_codec(self) -> None:
+        """Test that values written with different codecs can be read back."""
+        self.db["json"] = {"a": [1]}
+        self.db.codec = MsgpackCodec()
+        self.db["mp"] = {"a": [1], 1: b"bytes"}
+        self.assertTrue(self.db.get_raw("mp").startswith("~mp:"))
+        self.assertEqual(self.db["json"], {"a": [1]})
+        self.assertEqual(self.db.get_many(["mp"]), {"mp": {"a": [1], 1: b"bytes"}})
+
+        self.db.codec = JSONCodec()
+        self.assertEqual(self.db["mp"], {"a": [1], 1: b"bytes"})
+        self.db.set_raw("unknown", "~nope:1")
+        with self.assertRaises(ValueError):
+            self.db["unknown"]
+
+    def test_compression(self) -> None:
+        """Test compressed values with both algorithms and mixed readers."""
+        big = ["compress me"] * 200
+        for algorithm in ("zlib", "lzma"):
+            self.db.compression = Compression(algorithm, threshold=100)
+            self.db["big"] = big
+            raw = self.db.get_raw("big")
+            self.assertTrue(raw.startswith(f"~{algorithm}:"))
+            self.assertLess(len(raw), len(self.db.dumps(big)))
+            self.db["big"].append("more")
+
+            self.db.compression = None
+            self.assertEqual(self.db["big"], big + ["more"])
+
+        with self.assertRaises(ValueError):
+            Compression("snappy")
+
+    def test_chunking(self) -> None:
+        """Test chunked values through overwrites and deletes."""
+        self.db.chunking = Chunking(chunk_size=10)
+        self.db.set_bulk({"big": list(range(20)), "small": 1})
+        self.assertEqual(self.db["big"], list(range(20)))
+        self.assertEqual(set(self.db.keys()), {"big", "small"})
+        chunks = self.db.prefix("~chunk/")
+        self.assertEqual(len(chunks), 6)
+
+        self.db["big"] = list(range(10))
+        self.assertEqual(self.db.get_many(["big", "small"])["big"], list(range(10)))
+        self.assertEqual(len(self.db.prefix("~chunk/")), 3)
+        self.assertFalse(set(chunks) & set(self.db.prefix("~chunk/")))
+
+        self.db.chunking = None
+        self.assertEqual(self.db["big"], list(range(10)))
+        self.db.chunking = Chunking(chunk_size=10)
+        self.db["big"] = 1
+        self.assertEqual(self.db.prefix("~chunk/"), ())
+
+        self.db["big"] = "x" * 100
+        del self.db["big"]
+        self.assertEqual(self.db.prefix("~chunk/"), ())
+
+        # Databases that don't chunk values leave the chunks they replace, until
+        # a database that does writes or deletes the key.
+        self.db["big"] = "x" * 100
+        self.db.chunking = None
+        self.db["big"] = "small"
+        self.assertEqual(len(self.db.prefix("~chunk/")), 11)
+        self.db.chunking = Chunking(chunk_size=10)
+        del self.db["big"]
+        self.assertEqual(self.db.prefix("~chunk/"), ())
+
+    def test_chunking_concurrent_writes(self) -> None:
+        """Test that concurrent writers don't delete the chunks of the winner."""
+        with LocalDatabaseServer() as server:
+            db = Database(server.url, chunking=Chunking(chunk_size=10))
+            db["big"] = "x" * 100
+            barrier = threading.Barrier(4)
+
+            def writer(n: int) -> None:
+                barrier.wait()
+                for i in range(5):
+                    db["big"] = str(n) * (50 + i)
+
+            threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(len(db["big"]), 54)
+            db.close()
+
+    def test_write_buffer_in_flight(self) -> None:
+        """Test that writes being flushed are read from the buffer."""
+        with LocalDatabaseServer(faults=Faults(latency=0.2)) as server:
+            db = Database(server.url, write_buffer=WriteBuffer(max_delay=60))
+            db["key"] = "old"
+            db.flush()
+            db["key"] = "new"
+            flush = threading.Thread(target=db.flush)
+            flush.start()
+            time.sleep(0.05)
+            self.assertEqual(len(db.write_buffer), 0)
+            self.assertEqual(db["key"], "new")
+            self.assertIn("key", db)
+            flush.join()
+            self.assertNotIn("key", db.write_buffer)
+            self.assertEqual(db["key"], "new")
+
+            # Deletes wait for the flush sending their keys, not for each other.
+            keys = [f"del{i}" for i in range(8)]
+            db.set_bulk(dict.fromkeys(keys, 1))
+            flush = threading.Thread(target=db.flush)
+            flush.start()
+            time.sleep(0.05)
+            start = time.monotonic()
+            self.assertEqual(db.delete_many(keys, concurrency=8).deleted, 8)
+            self.assertLess(time.monotonic() - start, 0.6)
+            flush.join()
+            self.assertEqual(db.prefix("del"), ())
+            db.close()
+
+    def test_chunking_write_buffer(self) -> None:
+        """Test that chunked writes stay buffered in write-behind mode."""
+        self.db.chunking = Chunking(chunk_size=10)
+        self.db.write_buffer = WriteBuffer(max_delay=60)
+        self.db.set_raw("big", "x" * 30)
+        self.db.set_raw("big", "y" * 30)
+        self.assertEqual(self.db.get_raw("big"), "y" * 30)
+        # The first version's chunks were dropped from the buffer, unsent.
+        self.assertEqual(len(self.db.write_buffer), 4)
+        self.db.flush()
+        self.assertEqual(len(self.db.prefix("~chunk/")), 3)
+        del self.db["big"]
+        self.assertEqual(self.db.prefix("~chunk/"), ())
+
+    def test_metrics(self) -> None:
+        """Test request counters, byte totals and the exporter hook."""
+        exported = []
+        metrics = Metrics(exporter=exported.append)
+        db = Database(self.db.db_url, metrics=metrics)
+        db["key"] = "value"
+        self.assertEqual(db["key"], "value")
+        self.assertNotIn("missing", db)
+        del db["key"]
+        db.close()
+
+        snapshot = metrics.export()
+        self.assertEqual(exported, [snapshot])
+        ops = snapshot["ops"]
+        self.assertEqual(ops["get"]["requests"], 1)
+        self.assertEqual(ops["set"]["requests"], 1)
+        self.assertEqual(ops["delete"]["requests"], 1)
+        self.assertEqual(ops["list"]["requests"], 1)
+        self.assertEqual(snapshot["bytes_received"], len('"value"'))
+        self.assertEqual(sum(ops["get"]["latency"]["counts"]), 1)
+
+        metrics.reset()
+        self.assertEqual(metrics.snapshot()["ops"]["get"]["requests"], 0)
+
+    def test_auth_failure_replay(self) -> None:
+        """Test that requests rejected by an expired URL are replayed once."""
+        with LocalDatabaseServer(faults=Faults(error_rate=1, error_status=401)) as old:
+            db = Database(old.url, get_db_url=lambda: self.db.db_url)
+            db["rotated"] = 1
+            self.assertEqual(db.db_url, self.db.db_url)
+            self.assertEqual(db["rotated"], 1)
+            self.assertEqual(old.faults.injected, {401: 1})
+            db.close()
+
+            db = Database(old.url, get_db_url=lambda: old.url)
+            with self.assertRaises(requests.HTTPError):
+                db["rotated"]
+            db.close()
+
+    def test_namespace(self) -> None:
+        """Test that a namespace maps the keys under its prefix."""
+        self.db.set_bulk({"users:alice": 1, "users:bob": 2, "usersx": 3, "other": 4})
+        users = self.db.namespace("users:")
+        self.assertEqual(list(users), ["alice", "bob"])
+        self.assertEqual(len(users), 2)
+        self.assertEqual(users["alice"], 1)
+        self.assertIn("bob", users)
+        self.assertNotIn("usersx", users)
+        self.assertEqual(users.get_many(["alice", "carol"]), {"alice": 1})
+
+        users["carol"] = 3
+        del users["alice"]
+        self.assertEqual(self.db.prefix("users:"), ("users:bob", "users:carol"))
+
+        cached = self.db.namespace("users:", key_index=KeyIndex())
+        self.assertEqual(len(cached), 2)
+        with mock.patch.object(Database, "prefix") as prefix:
+            cached.set_bulk({"dave": 4})
+            self.assertEqual(list(cached), ["bob", "carol", "dave"])
+            prefix.assert_not_called()
+
+        cached.clear()
+        self.assertEqual(len(users), 0)
+        self.assertEqual(self.db.prefix(""), ("other", "usersx"))
+
+    def test_deadline(self) -> None:
+        """Test that timeouts and deadlines bound requests and their retries."""
+        with LocalDatabaseServer(faults=Faults(latency=0.5)) as slow:
+            db = Database(slow.url, timeout=0.1, retry_count=1)
+            start = time.monotonic()
+            with self.assertRaises(requests.ConnectionError):
+                db["key"]
+            self.assertLess(time.monotonic() - start, 0.45)
+            db.close()
+
+            db = Database(slow.url)
+            start = time.monotonic()
+            with self.assertRaises(DeadlineExceeded):
+                with db.deadline(1), db.deadline(0.2):
+                    db["key"]
+            self.assertLess(time.monotonic() - start, 0.45)
+            db.close()
+
+        # Every retry's timeout is capped by what is left of the deadline.
+        with LocalDatabaseServer(faults=Faults(latency=0.1, error_rate=1)) as failing:
+            db = Database(failing.url)
+            for seconds in (0.3, 0.45):
+                start = time.monotonic()
+                with self.assertRaises((DeadlineExceeded, requests.ConnectionError)):
+                    with db.deadline(seconds):
+                        db["key"]
+                self.assertLess(time.monotonic() - start, seconds + 0.05)
+            db.close()
+
+    def test_single_flight(self) -> None:
+        """Test that threads reading the same key at once share one request."""
+        with LocalDatabaseServer(faults=Faults(latency=0.2)) as server:
+            metrics = Metrics()
+            db = Database(server.url, metrics=metrics)
+            db["flight"] = {"a": 1}
+            metrics.reset()
+            barrier = threading.Barrier(8)
+            values = []
+
+            def worker() -> None:
+                barrier.wait()
+                values.append(db["flight"])
+
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(values, [{"a": 1}] * 8)
+            # Each caller gets a value of its own to mutate.
+            self.assertEqual(len({id(v) for v in values}), 8)
+            self.assertEqual(metrics.snapshot()["ops"]["get"]["requests"], 1)
+
+            with LocalDatabaseServer(faults=Faults(error_rate=1)) as failing:
+                db2 = Database(failing.url, retry_count=0)
+                errors = []
+
+                def fail() -> None:
+                    try:
+                        db2.prefix("flight")
+                    except requests.RequestException as e:
+                        errors.append(e)
+
+                threads = [threading.Thread(target=fail) for _ in range(4)]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+                self.assertEqual(len(errors), 4)
+                db2.close()
+            db.close()
+
+        # Threads that join a read wait for it only until their own deadline.
+        with LocalDatabaseServer(faults=Faults(latency=0.9)) as slow:
+            db = Database(slow.url)
+            leader = threading.Thread(target=db.get, args=("slow",))
+            leader.start()
+            time.sleep(0.05)
+            start = time.monotonic()
+            with self.assertRaises(DeadlineExceeded):
+                with db.deadline(0.2):
+                    db.get_raw("slow")
+            self.assertLess(time.monotonic() - start, 0.3)
+            self.assertEqual(db._get_flights.shared, 1)
+            leader.join()
+            db.close()
+
+    def test_rate_limit(self) -> None:
+        """Test that the limiter paces requests and backs off on 429 responses."""
+        limiter = RateLimiter(ops_per_sec=100, bytes_per_sec=1000)
+        self.assertEqual(limiter.reserve(), 0)
+        self.assertGreater(limiter.reserve(2000), 0.5)
+
+        faults = Faults(throttle_rate=0.3, retry_after=0.01, seed=1)
+        with LocalDatabaseServer(faults=faults) as server:
+            limiter = RateLimiter(ops_per_sec=500)
+            db = Database(server.url, rate_limiter=limiter)
+            for i in range(20):
+                db[f"limited{i}"] = i
+            self.assertEqual(db["limited19"], 19)
+            self.assertEqual(limiter.throttles, faults.injected[429])
+            self.assertLess(limiter.scale, 1)
+
+            with self.assertRaises(DeadlineExceeded):
+                with db.deadline(0.05):
+                    limiter.throttled(1)
+                    db["limited0"]
+            db.close()
+
+    def test_threads(self) -> None:
+        """Test that threads can share a database with a blocking pool."""
+        db = Database(self.db.db_url, pool_size=2, pool_block=True)
+        adapter = db.sess.get_adapter(db.db_url)
+        self.assertEqual(adapter._pool_maxsize, 2)
+        self.assertTrue(adapter._pool_block)
+
+        errors = []
+
+        def worker(n: int) -> None:
+            try:
+                for i in range(10):
+                    db[f"thread{n}/{i}"] = i
+                    self.assertEqual(db[f"thread{n}/{i}"], i)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(db.prefix("thread")), 80)
+        db.close()
+
+    def test_profiler(self) -> None:
+        """Test that hot keys and large values are found."""
+        profiler = KeyProfiler(capacity=3)
+        db = Database(self.db.db_url, profiler=profiler)
+        db.set_bulk({"hot": 1, "big": "x" * 1000, "cold": 2})
+        for _ in range(5):
+            db["hot"]
+        for i in range(3):
+            db.get(f"missing{i}")
+        del db["cold"]
+        db.close()
+
+        report = profiler.report(2)
+        self.assertEqual(report["operations"], 12)
+        self.assertEqual(report["accesses"][0], ["hot", 6, 0])
+        self.assertEqual(report["bytes"][0][0], "big")
+        self.assertEqual(report["largest"], [["big", 1002], ["hot", 1]])
+        self.assertIn("'hot'", profiler.format(2))
+
+        counter = SpaceSaving(2)
+        for key in "abacadaeaf":
+            counter.add(key)
+        key, count, error = counter.top(1)[0]
+        self.assertEqual(key, "a")
+        self.assertLessEqual(count - error, 5)
+
     def test_raw(self) -> None:
         """Test that get_raw and set_raw do not use JSON."""
         k = "raw_test"
@@ -349,3 +1257,29 @@ class TestDatabase(unittest.TestCase):
         #       KeyError is the same though, so it can stay.
         with self.assertRaises(KeyError):
             self.db[k]
+
+
+class TestObserved(unittest.TestCase):
+    """Tests for the observed values returned by replit.database.Database."""
+
+    def test_lazy_wrapping(self) -> None:
+        """Test that nested values are wrapped on access and report mutations."""
+        writes = []
+        doc = {"a": {"b": [1, {"c": 2}]}, "d": [[3]]}
+        val = item_to_observed(writes.append, doc)
+
+        self.assertIsInstance(val, ObservedDict)
+        self.assertIs(type(val.value["a"]), dict)
+        self.assertIsInstance(val["a"]["b"], ObservedList)
+
+        val["a"]["b"][1]["c"] = 5
+        self.assertEqual(writes, [doc])
+        self.assertEqual(doc["a"]["b"][1], {"c": 5})
+
+        for inner in val["d"]:
+            inner.append(4)
+        val["d"][:1][0].append(5)
+        val.get("e", []).append(6)
+        self.assertEqual(len(writes), 4)
+        self.assertEqual(doc, {"a": {"b": [1, {"c": 5}]}, "d": [[3, 4, 5]], "e": [6]})
+        self.assertIn([3, 4, 5], val["d"])
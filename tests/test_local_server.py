@@ -0,0 +1,78 @@
+"""Tests for replit.database.local_server."""
+
+import os
+import tempfile
+import unittest
+
+from replit.database import (
+    Database,
+    Faults,
+    LocalDatabaseServer,
+    MemoryStorage,
+    SQLiteStorage,
+)
+from replit.database.local_server import Storage
+import requests
+
+
+class TestLocalServer(unittest.TestCase):
+    """Tests for replit.database.LocalDatabaseServer."""
+
+    def test_protocol(self) -> None:
+        """Test the requests the clients make, with keys that need quoting."""
+        with LocalDatabaseServer() as server, requests.Session() as sess:
+            sess.post(server.url, data={"a/b\nc": "1", "a b": "2", "c": "3"})
+            listing = sess.get(server.url, params={"prefix": "a", "encode": "1"})
+            self.assertEqual(listing.text, "a%20b\na/b%0Ac")
+            self.assertEqual(sess.get(server.url + "/a/b%0Ac").text, "1")
+
+            self.assertEqual(sess.delete(server.url + "/c").status_code, 200)
+            self.assertEqual(sess.get(server.url + "/c").status_code, 404)
+            self.assertEqual(sess.delete(server.url + "/c").status_code, 404)
+
+    def test_sqlite_storage(self) -> None:
+        """Test that data on disk outlives the server."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "db.sqlite")
+            with LocalDatabaseServer(SQLiteStorage(path)) as server:
+                db = Database(server.url)
+                db.set_bulk({"k1": 1, "k2": 2, "l": 3})
+                del db["k2"]
+                db.close()
+            with LocalDatabaseServer(SQLiteStorage(path)) as server:
+                db = Database(server.url)
+                self.assertEqual(db.prefix("k"), ("k1",))
+                self.assertEqual(db["l"], 3)
+                db.close()
+
+    def test_storage_is_abstract(self) -> None:
+        """Test that a storage must implement every method to be created."""
+
+        class _NoKeys(Storage):
+            get = MemoryStorage.get
+            set_many = MemoryStorage.set_many
+            delete = MemoryStorage.delete
+
+        with self.assertRaises(TypeError):
+            _NoKeys()  # type: ignore[abstract]
+
+    def test_faults(self) -> None:
+        """Test that injected errors are retried and throttling is reported."""
+        faults = Faults(seed=0)
+        with LocalDatabaseServer(faults=faults) as server:
+            db = Database(server.url)
+            db.set_bulk({str(i): i for i in range(10)})
+            faults.error_rate = 0.5
+            self.assertEqual([db[str(i)] for i in range(10)], list(range(10)))
+            self.assertGreater(faults.injected[503], 0)
+            db.close()
+
+        faults = Faults(throttle_rate=1, retry_after=2)
+        with LocalDatabaseServer(faults=faults) as server:
+            response = requests.get(server.url + "/k", timeout=5)
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response.headers["Retry-After"], "2")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""Tests for replit.database.scheduler."""
+
+import gc
+import threading
+import unittest
+
+from replit.database import Database, LocalDatabaseServer
+from replit.database.scheduler import Scheduler
+
+
+class _Counter:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.called = threading.Event()
+
+    def tick(self) -> None:
+        self.calls += 1
+        self.called.set()
+
+
+class TestScheduler(unittest.TestCase):
+    """Tests for replit.database.scheduler.Scheduler."""
+
+    def test_call_later(self) -> None:
+        """Test that tasks run in order of their delay, unless cancelled."""
+        scheduler = Scheduler()
+        order = []
+        done = threading.Event()
+        scheduler.call_later(0.05, lambda: order.append("late"))
+        scheduler.call_later(0.01, lambda: order.append("early"))
+        scheduler.call_later(0.02, lambda: 1 / 0)  # Errors don't stop the thread.
+        scheduler.call_later(0.03, lambda: order.append("cancelled")).cancel()
+        scheduler.call_later(0.1, done.set)
+        self.assertTrue(done.wait(5))
+        self.assertEqual(order, ["early", "late"])
+        scheduler.shutdown()
+
+    def test_call_every(self) -> None:
+        """Test that repeating tasks repeat and don't keep their object alive."""
+        scheduler = Scheduler()
+        counter = _Counter()
+        task = scheduler.call_every(0.01, counter.tick)
+        self.assertTrue(counter.called.wait(5))
+        counter.called.clear()
+        self.assertTrue(counter.called.wait(5))
+        task.cancel()
+        self.assertGreaterEqual(counter.calls, 2)
+
+        counter = _Counter()
+        task = scheduler.call_every(3600, counter.tick)
+        self.assertEqual(len(scheduler), 1)
+        del counter
+        gc.collect()
+        self.assertFalse(task.run())
+        scheduler.shutdown()
+
+    def test_blocking_callback(self) -> None:
+        """Test that a callback that blocks doesn't delay the others."""
+        scheduler = Scheduler(max_workers=2)
+        release = threading.Event()
+        counter = _Counter()
+        scheduler.call_later(0, release.wait)
+        task = scheduler.call_every(0.01, counter.tick)
+        self.assertTrue(counter.called.wait(5))
+        counter.called.clear()
+        self.assertTrue(counter.called.wait(5))
+        task.cancel()
+        release.set()
+        scheduler.shutdown()
+
+    def test_no_threads_per_database(self) -> None:
+        """Test that databases don't start a thread each."""
+        with LocalDatabaseServer() as server:
+            before = threading.active_count()
+            dbs = [
+                Database(server.url, get_db_url=lambda: server.url) for _ in range(10)
+            ]
+            self.assertLessEqual(threading.active_count(), before + 1)
+            for db in dbs:
+                db.close()